@@ -7,7 +7,9 @@ import secrets
 from flask import Flask, render_template, session
 
 from models.database import init_app
+from models.pool import cerrar_pools
 from routes import auth_bp, dashboard_bp, vehiculos_bp, admin_bp
+from utils.placas import cargar_placas
 
 
 def create_app():
@@ -17,9 +19,49 @@ def create_app():
     app.config['DATABASE_PATH'] = os.environ.get('DATABASE_PATH', 'database.db')
     app.config['PERMANENT_SESSION_LIFETIME'] = 28800  # 8 horas
 
+    # SQLite: pool de conexiones por worker y PRAGMAs (modo WAL)
+    app.config['SQLITE_POOL_SIZE'] = int(os.environ.get('SQLITE_POOL_SIZE', 8))
+    app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_CACHE_SIZE'] = int(os.environ.get('SQLITE_CACHE_SIZE', -20000))  # 20 MB
+    app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 268435456))  # 256 MB
+    app.config['SQLITE_TEMP_STORE'] = os.environ.get('SQLITE_TEMP_STORE', 'MEMORY')
+    app.config['SQLITE_WAL_AUTOCHECKPOINT'] = int(os.environ.get('SQLITE_WAL_AUTOCHECKPOINT', 1000))
+    app.config['SQLITE_CHECKPOINT_SEGUNDOS'] = int(os.environ.get('SQLITE_CHECKPOINT_SEGUNDOS', 300))
+
+    # Arranque rápido: quick_check o marca de cierre limpio en vez de
+    # integrity_check completo (que corre después en segundo plano)
+    app.config['ARRANQUE_RAPIDO'] = os.environ.get('ARRANQUE_RAPIDO', '1') == '1'
+    app.config['INTEGRIDAD_COMPLETA_HORAS'] = int(os.environ.get('INTEGRIDAD_COMPLETA_HORAS', 24))
+
+    # Backups automáticos (API de backup de SQLite en segundo plano)
+    app.config['BACKUP_DIR'] = os.environ.get('BACKUP_DIR')  # Por defecto: backups/ junto a la DB
+    app.config['BACKUP_INTERVALO_DIAS'] = int(os.environ.get('BACKUP_INTERVALO_DIAS', 2))
+    app.config['BACKUP_MAX_ARCHIVOS'] = int(os.environ.get('BACKUP_MAX_ARCHIVOS', 5))
+    app.config['BACKUP_COMPRIMIR'] = os.environ.get('BACKUP_COMPRIMIR', '1') == '1'
+    app.config['BACKUP_PAGINAS_POR_PASO'] = int(os.environ.get('BACKUP_PAGINAS_POR_PASO', 256))
+
+    # Canal de eventos en vivo (SSE): cada conexión se cierra a los N
+    # segundos y el navegador reconecta con Last-Event-ID. Cada conexión
+    # ocupa un hilo del worker (--threads 8 en el Procfile): por encima del
+    # máximo los dashboards siguen con polling
+    app.config['EVENTOS_DURACION_SEGUNDOS'] = int(os.environ.get('EVENTOS_DURACION_SEGUNDOS', 60))
+    app.config['EVENTOS_MAX_CONEXIONES'] = int(os.environ.get('EVENTOS_MAX_CONEXIONES', 2))
+
+    # Exportaciones en segundo plano: hilos por worker y minutos que se
+    # conserva cada archivo generado
+    app.config['EXPORTACIONES_DIR'] = os.environ.get('EXPORTACIONES_DIR')  # Por defecto: exports/ junto a la DB
+    app.config['EXPORTACIONES_HILOS'] = int(os.environ.get('EXPORTACIONES_HILOS', 1))
+    app.config['EXPORTACIONES_TTL_MINUTOS'] = int(os.environ.get('EXPORTACIONES_TTL_MINUTOS', 60))
+
     # Inicializar base de datos
     init_app(app)
 
+    # Placas para el autocompletado: con --preload los workers heredan el
+    # índice ya cargado (sin heredar conexiones abiertas)
+    with app.app_context():
+        print(f"[PLACAS] {cargar_placas()} placas cargadas para el autocompletado")
+    cerrar_pools()
+
     # Registrar blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(dashboard_bp)
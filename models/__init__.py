@@ -1,6 +1,6 @@
 """
 Módulo de modelos
 """
-from .database import get_db, init_app, init_db
+from .database import get_db, init_app, init_db, estadisticas_db
 
-__all__ = ['get_db', 'init_app', 'init_db']
+__all__ = ['get_db', 'init_app', 'init_db', 'estadisticas_db']
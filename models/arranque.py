@@ -0,0 +1,151 @@
+"""
+Arranque de la Base de Datos
+============================
+Verificación rápida al iniciar y verificación completa diferida.
+
+`PRAGMA integrity_check` lee la base entera, así que no se ejecuta al
+arrancar. Se confía en la huella (tamaño y fecha de modificación) que quedó
+del último cierre limpio o de la última verificación. Si no coincide se usa
+`PRAGMA quick_check`. La verificación completa corre después en un hilo de
+fondo, como mucho una vez cada INTEGRIDAD_COMPLETA_HORAS. Si encuentra un
+problema deja una marca y el siguiente arranque recupera el último backup.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from .backup import restaurar_ultimo_backup
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin candado entre procesos
+    fcntl = None
+
+
+def _ruta_marca(db_path):
+    return db_path + '.verificada'
+
+
+def _ruta_corrupta(db_path):
+    return db_path + '.corrupta'
+
+
+def huella_db(db_path):
+    """Tamaño y fecha de modificación de la DB y su WAL"""
+    huella = []
+    for ruta in (db_path, db_path + '-wal'):
+        try:
+            st = os.stat(ruta)
+            huella.append([st.st_size, st.st_mtime_ns])
+        except FileNotFoundError:
+            huella.append(None)
+    return huella
+
+
+def _leer_marca(db_path):
+    try:
+        with open(_ruta_marca(db_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def guardar_marca(db_path, completa=False):
+    """Registra que la DB, tal como está ahora, se verificó sin errores"""
+    marca = _leer_marca(db_path)
+    marca['huella'] = huella_db(db_path)
+    if completa:
+        marca['verificacion_completa'] = time.time()
+    temporal = _ruta_marca(db_path) + '.tmp'
+    try:
+        with open(temporal, 'w') as f:
+            json.dump(marca, f)
+        os.replace(temporal, _ruta_marca(db_path))
+    except OSError as e:
+        print(f"[ARRANQUE] No se pudo guardar la marca de verificación: {e}")
+
+
+@contextmanager
+def candado_arranque(db_path):
+    """Serializa el arranque entre workers que arrancan a la vez"""
+    if fcntl is None:
+        yield
+        return
+    with open(db_path + '.arranque.lock', 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _chequeo(db_path, pragma):
+    try:
+        conn = sqlite3.connect(db_path)
+        try:
+            return conn.execute(f"PRAGMA {pragma}").fetchone()[0] == 'ok'
+        finally:
+            conn.close()
+    except Exception:
+        return False
+
+
+def marcar_corrupta(db_path):
+    with open(_ruta_corrupta(db_path), 'w') as f:
+        f.write(time.strftime('%Y-%m-%d %H:%M:%S'))
+
+
+def db_sana(db_path):
+    """False si hay una verificación fallida pendiente de recuperar"""
+    return not os.path.exists(_ruta_corrupta(db_path))
+
+
+def recuperar_db(db_path, backups_dir=None, rapido=True):
+    """
+    Si la DB no existe o está corrupta, recupera del último backup.
+
+    Args:
+        rapido: Confiar en la marca de verificación o usar quick_check en
+                vez de integrity_check
+
+    Returns:
+        bool: True si se restauró un backup
+    """
+    if not os.path.exists(db_path):
+        return restaurar_ultimo_backup(db_path, backups_dir)
+
+    if not db_sana(db_path):
+        print("[ARRANQUE] La última verificación encontró errores")
+    elif rapido and _leer_marca(db_path).get('huella') == huella_db(db_path):
+        return False
+    elif not _chequeo(db_path, 'quick_check' if rapido else 'integrity_check'):
+        marcar_corrupta(db_path)
+    else:
+        return False
+
+    if not restaurar_ultimo_backup(db_path, backups_dir):
+        return False
+    os.remove(_ruta_corrupta(db_path))
+    return True
+
+
+def verificar_integridad_en_segundo_plano(db_path, horas=24):
+    """Lanza PRAGMA integrity_check en un hilo si toca hacerlo"""
+    ultima = _leer_marca(db_path).get('verificacion_completa', 0)
+    if time.time() - ultima < horas * 3600:
+        return None
+
+    def tarea():
+        if _chequeo(db_path, 'integrity_check'):
+            guardar_marca(db_path, completa=True)
+            return
+        print("[ARRANQUE] ERROR: integrity_check falló; se recuperará el "
+              "último backup en el próximo arranque")
+        marcar_corrupta(db_path)
+
+    hilo = threading.Thread(target=tarea, name="integridad-db", daemon=True)
+    hilo.start()
+    return hilo
@@ -0,0 +1,253 @@
+"""
+Backups de la Base de Datos
+===========================
+Copias en línea con la API de backup de SQLite (sqlite3.Connection.backup).
+
+A diferencia de copiar el archivo, la API de backup produce siempre una copia
+consistente aunque haya escrituras en curso (y en modo WAL incluye lo que aún
+no pasó al archivo principal). Los backups periódicos se copian por bloques
+de páginas en un hilo de fondo para no demorar el arranque ni las peticiones.
+
+Si alguien escribe mientras se copia por bloques, SQLite vuelve a empezar la
+copia. Con mucho movimiento podría no terminar nunca, así que después de
+MAX_REINICIOS la copia se aborta con error.
+"""
+import glob
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+PREFIJO = "cochera_backup_"
+EXTENSIONES = (".db.gz", ".db")
+MAX_REINICIOS = 20
+
+_hilo_backup = None
+_hilo_lock = threading.Lock()
+
+
+def directorio_backups(db_path):
+    return os.path.join(os.path.dirname(db_path) or '.', 'backups')
+
+
+def listar_backups(backups_dir):
+    """Backups existentes, del más reciente al más antiguo"""
+    archivos = []
+    for ext in EXTENSIONES:
+        archivos.extend(glob.glob(os.path.join(backups_dir, f"{PREFIJO}*{ext}")))
+    return sorted(set(archivos), key=_fecha_backup, reverse=True)
+
+
+def _fecha_backup(ruta):
+    nombre = os.path.basename(ruta)
+    fecha_str = nombre[len(PREFIJO):].split('.')[0]
+    for formato in ('%Y%m%d_%H%M%S', '%Y%m%d'):
+        try:
+            return datetime.strptime(fecha_str, formato)
+        except ValueError:
+            continue
+    return datetime.fromtimestamp(os.path.getmtime(ruta))
+
+
+# ============================================
+# COPIA EN LÍNEA
+# ============================================
+
+def copiar_en_linea(db_path, destino, paginas=-1, pausa=0, max_reinicios=MAX_REINICIOS):
+    """
+    Copia la base de datos a `destino` con la API de backup de SQLite.
+
+    Args:
+        paginas: Páginas por paso (-1 copia todo en un solo paso)
+        pausa: Segundos de espera entre pasos para ceder el disco
+        max_reinicios: Veces que una escritura puede reiniciar la copia
+            por bloques antes de abortarla
+
+    Raises:
+        RuntimeError: Si la copia se reinició más de `max_reinicios` veces
+    """
+    estado = {"restantes": None, "reinicios": 0}
+
+    def progreso(status, restantes, total):
+        # Una escritura durante la copia la reinicia: vuelven a faltar más
+        # páginas que en el paso anterior
+        if estado["restantes"] is not None and restantes > estado["restantes"]:
+            estado["reinicios"] += 1
+            if estado["reinicios"] > max_reinicios:
+                raise RuntimeError(
+                    f"Backup abortado: la copia se reinició {estado['reinicios']} "
+                    f"veces por escrituras concurrentes"
+                )
+        estado["restantes"] = restantes
+
+    origen = sqlite3.connect(db_path, timeout=10)
+    copia = sqlite3.connect(destino)
+    try:
+        origen.backup(copia, pages=paginas, progress=progreso, sleep=pausa)
+    except RuntimeError as e:
+        print(f"[BACKUP] {e}")
+        raise
+    finally:
+        copia.close()
+        origen.close()
+
+
+def _comprimir(origen, destino):
+    with open(origen, 'rb') as entrada, gzip.open(destino, 'wb', compresslevel=6) as salida:
+        shutil.copyfileobj(entrada, salida, 1024 * 1024)
+
+
+def snapshot_temporal(db_path, comprimir=False):
+    """
+    Crea una copia consistente en un archivo temporal y devuelve su ruta.
+    Quien la pida es responsable de borrarla.
+    """
+    fd, ruta = tempfile.mkstemp(suffix='.db', prefix=PREFIJO)
+    os.close(fd)
+    copiar_en_linea(db_path, ruta)
+    if not comprimir:
+        return ruta
+
+    ruta_gz = ruta + '.gz'
+    try:
+        _comprimir(ruta, ruta_gz)
+    finally:
+        os.remove(ruta)
+    return ruta_gz
+
+
+# ============================================
+# BACKUPS PERIÓDICOS
+# ============================================
+
+def backup_pendiente(backups_dir, intervalo_dias):
+    """True si el último backup tiene `intervalo_dias` o más"""
+    archivos = listar_backups(backups_dir)
+    if not archivos:
+        return True
+    return datetime.now() - _fecha_backup(archivos[0]) >= timedelta(days=intervalo_dias)
+
+
+def aplicar_retencion(backups_dir, max_archivos):
+    """Borra los backups más antiguos dejando `max_archivos`"""
+    for antiguo in listar_backups(backups_dir)[max_archivos:]:
+        os.remove(antiguo)
+
+
+def crear_backup(db_path, backups_dir=None, comprimir=True, paginas=256,
+                 pausa=0.005, max_archivos=5):
+    """
+    Crea un backup fechado copiando `paginas` páginas por paso.
+
+    Returns:
+        str: Ruta del backup creado, o None si otro proceso ya lo está creando
+    """
+    backups_dir = backups_dir or directorio_backups(db_path)
+    os.makedirs(backups_dir, exist_ok=True)
+
+    hoy = datetime.now().strftime('%Y%m%d')
+    temporal = os.path.join(backups_dir, f".{PREFIJO}{hoy}.tmp")
+
+    # El archivo temporal hace de candado entre workers
+    try:
+        fd = os.open(temporal, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        os.close(fd)
+    except FileExistsError:
+        if time.time() - os.path.getmtime(temporal) < 3600:
+            return None
+        os.remove(temporal)  # Quedó de un proceso que murió a la mitad
+        return crear_backup(db_path, backups_dir, comprimir, paginas, pausa, max_archivos)
+
+    try:
+        copiar_en_linea(db_path, temporal, paginas=paginas, pausa=pausa)
+
+        extension = '.db.gz' if comprimir else '.db'
+        destino = os.path.join(backups_dir, f"{PREFIJO}{hoy}{extension}")
+        if comprimir:
+            _comprimir(temporal, destino + '.parcial')
+            os.replace(destino + '.parcial', destino)
+            os.remove(temporal)
+        else:
+            os.replace(temporal, destino)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+    print(f"[BACKUP] Backup creado: {os.path.basename(destino)}")
+    aplicar_retencion(backups_dir, max_archivos)
+    return destino
+
+
+def iniciar_backup_en_segundo_plano(db_path, config):
+    """
+    Lanza el backup periódico en un hilo de fondo si corresponde.
+
+    Config:
+        BACKUP_INTERVALO_DIAS, BACKUP_MAX_ARCHIVOS, BACKUP_COMPRIMIR,
+        BACKUP_PAGINAS_POR_PASO, BACKUP_DIR
+    """
+    global _hilo_backup
+
+    if not os.path.exists(db_path):
+        return None
+
+    backups_dir = config.get('BACKUP_DIR') or directorio_backups(db_path)
+    if not backup_pendiente(backups_dir, config.get('BACKUP_INTERVALO_DIAS', 2)):
+        return None
+
+    def tarea():
+        try:
+            crear_backup(
+                db_path,
+                backups_dir=backups_dir,
+                comprimir=config.get('BACKUP_COMPRIMIR', True),
+                paginas=config.get('BACKUP_PAGINAS_POR_PASO', 256),
+                max_archivos=config.get('BACKUP_MAX_ARCHIVOS', 5),
+            )
+        except Exception as e:
+            print(f"[BACKUP] Error creando backup: {e}")
+
+    with _hilo_lock:
+        if _hilo_backup is not None and _hilo_backup.is_alive():
+            return _hilo_backup
+        _hilo_backup = threading.Thread(target=tarea, name="backup-db", daemon=True)
+        _hilo_backup.start()
+        return _hilo_backup
+
+
+# ============================================
+# RECUPERACIÓN
+# ============================================
+
+def restaurar_backup(origen, db_path):
+    """Restaura `origen` (.db o .db.gz) sobre `db_path`"""
+    # Un WAL o SHM viejo no corresponde a la copia restaurada
+    for sufijo in ('-wal', '-shm'):
+        if os.path.exists(db_path + sufijo):
+            os.remove(db_path + sufijo)
+
+    if origen.endswith('.gz'):
+        with gzip.open(origen, 'rb') as entrada, open(db_path, 'wb') as salida:
+            shutil.copyfileobj(entrada, salida, 1024 * 1024)
+    else:
+        shutil.copy2(origen, db_path)
+
+
+def restaurar_ultimo_backup(db_path, backups_dir=None):
+    """Restaura el backup más reciente. False si no hay ninguno."""
+    backups_dir = backups_dir or directorio_backups(db_path)
+    if not os.path.isdir(backups_dir):
+        return False
+
+    archivos = listar_backups(backups_dir)
+    if not archivos:
+        return False
+
+    restaurar_backup(archivos[0], db_path)
+    print(f"[BACKUP] Base de datos recuperada desde {os.path.basename(archivos[0])}")
+    return True
@@ -0,0 +1,55 @@
+"""
+Montos en Céntimos
+==================
+El dinero se guarda como entero en céntimos (columnas *_centimos, migración
+5): las sumas en SQLite son sumas de enteros, exactas y más baratas que
+las de REAL, y el cierre de turno no arrastra diferencias de 0.01.
+
+Las rutas y las pantallas siguen trabajando en soles. La conversión se hace
+solo al escribir (a_centimos) y al leer (a_soles o `/ 100.0` en el SELECT).
+Las columnas REAL de siempre se escriben con el mismo monto ya redondeado
+para lo que todavía las lee (plantillas, exportaciones, reportes). Si algo
+escribe solo en soles, un trigger de la migración 5 recalcula los céntimos.
+"""
+import math
+
+
+# Columnas en soles de cada tabla; la de céntimos es `{columna}_centimos`
+COLUMNAS_DINERO = {
+    "entradas": ("precio_dia", "monto", "adelanto", "penalidad", "descuento"),
+    "movimientos_caja": ("monto",),
+    "turnos": ("total_efectivo", "total_yape", "efectivo_declarado", "yape_declarado"),
+}
+
+
+def a_centimos(soles):
+    """
+    Soles (número o texto) a céntimos enteros, redondeando al céntimo
+    igual que centimos_sql (la mitad se aleja del cero).
+
+    Raises:
+        ValueError, TypeError: Si no es un monto válido (igual que float())
+    """
+    valor = float(soles)
+    if not math.isfinite(valor):
+        raise ValueError(f"Monto inválido: {soles}")
+    # Las mismas operaciones en double que el SQL: el trigger de la
+    # migración 5 guarda lo mismo que las rutas (1.005 es 1.00499... y
+    # queda en 100 en los dos lados)
+    return int(valor * 100 + (-0.5 if valor < 0 else 0.5))
+
+
+def a_soles(centimos):
+    """Céntimos enteros a soles (float para JSON y plantillas). None queda None"""
+    if centimos is None:
+        return None
+    return centimos / 100
+
+
+def centimos_sql(columna):
+    """
+    Expresión SQL que pasa una columna en soles a céntimos (backfill y
+    triggers), con el mismo redondeo que a_centimos. CAST trunca hacia el
+    cero; no se usa ROUND() para no depender de cómo lo hace cada versión
+    """
+    return f"CAST({columna} * 100 + (CASE WHEN {columna} < 0 THEN -0.5 ELSE 0.5 END) AS INTEGER)"
@@ -0,0 +1,76 @@
+"""
+Fechas como Segundos
+====================
+Las fechas se guardan como texto en hora local ('YYYY-MM-DD HH:MM:SS').
+Filtrar con date(), strftime() o julianday() sobre la columna obliga a
+calcular la función fila por fila y deja sin uso los índices.
+
+La migración 11 agrega al lado columnas generadas (*_epoch) con los
+segundos de cada fecha, la hora local tratada como UTC (igual que
+calendar.timegm), e índices sobre ellas. SQLite las calcula solo (al
+escribir la fila para los índices), así que las rutas siguen escribiendo
+solo el texto. Los filtros por fecha se hacen sobre esas columnas con
+rangos semiabiertos [desde 00:00, hasta + 1 día 00:00), que recorren un
+tramo del índice.
+"""
+import calendar
+from datetime import date, datetime
+
+
+SEGUNDOS_DIA = 24 * 3600
+
+
+# Columnas generadas de cada tabla: (columna, expresión). Las que se usan
+# para ordenar la paginación valen 0 si la fecha está vacía o no se
+# entiende (la paginación no admite NULL); la salida y el movimiento
+# quedan NULL (sin salida / sin fecha). Una entrada sin hora cuenta desde
+# las 00:00
+COLUMNAS_EPOCH = {
+    "turnos": (
+        ("inicio_epoch",
+         "IFNULL(CAST(strftime('%s', fecha_inicio) AS INTEGER), 0)"),
+    ),
+    "entradas": (
+        ("entrada_epoch",
+         "IFNULL(CAST(strftime('%s', trim(fecha_entrada || ' ' || IFNULL(hora_entrada, ''))) AS INTEGER), 0)"),
+        ("salida_epoch",
+         "CAST(strftime('%s', fecha_salida) AS INTEGER)"),
+    ),
+    "movimientos_caja": (
+        ("movimiento_epoch",
+         "CAST(strftime('%s', fecha_movimiento) AS INTEGER)"),
+    ),
+}
+
+
+def a_epoch(fecha):
+    """
+    Fecha ('YYYY-MM-DD', date o datetime, hora local) a segundos, igual que
+    las columnas *_epoch.
+
+    Raises:
+        ValueError: Si el texto no es una fecha válida
+    """
+    if isinstance(fecha, str):
+        fecha = date.fromisoformat(fecha)
+    if not isinstance(fecha, datetime):
+        fecha = datetime(fecha.year, fecha.month, fecha.day)
+    return calendar.timegm(fecha.timetuple())
+
+
+def filtro_fechas(columna, desde="", hasta=""):
+    """
+    Condición para filtrar `columna` (*_epoch) entre dos fechas inclusive
+    (YYYY-MM-DD; vacío = sin límite).
+
+    Returns:
+        tuple: (condición SQL que empieza con " AND " o "", params)
+    """
+    condicion, params = "", []
+    if desde:
+        condicion += f" AND {columna} >= ?"
+        params.append(a_epoch(desde))
+    if hasta:
+        condicion += f" AND {columna} < ?"
+        params.append(a_epoch(hasta) + SEGUNDOS_DIA)
+    return condicion, params
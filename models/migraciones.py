@@ -0,0 +1,766 @@
+"""
+Migraciones de Base de Datos
+============================
+Migraciones numeradas y versionadas con PRAGMA user_version.
+
+Cada migración se registra con el decorador @migracion(version, descripcion)
+y se aplica una sola vez, dentro de su propia transacción, en orden
+ascendente. Para ver el estado y los planes de consulta:
+
+    python -m models.migraciones
+"""
+import sqlite3
+import sys
+
+from .dinero import COLUMNAS_DINERO, a_centimos, centimos_sql
+from .fechas import COLUMNAS_EPOCH
+from .resumenes import (
+    crear_triggers_cliente_stats, reconstruir_cliente_stats,
+    crear_triggers_turno_totales, reconstruir_turno_totales,
+    crear_triggers_ingresos_diarios, reconstruir_ingresos_diarios
+)
+
+
+MIGRACIONES = []
+
+
+def migracion(version, descripcion):
+    """Registra una función como migración número `version`"""
+    def decorador(funcion):
+        MIGRACIONES.append((version, descripcion, funcion))
+        MIGRACIONES.sort(key=lambda m: m[0])
+        return funcion
+    return decorador
+
+
+def version_actual(db):
+    """Versión del esquema guardada en la base de datos"""
+    return db.execute("PRAGMA user_version").fetchone()[0]
+
+
+def version_objetivo():
+    """Última versión conocida por el código"""
+    return MIGRACIONES[-1][0] if MIGRACIONES else 0
+
+
+def _columnas(cursor, tabla):
+    cursor.execute(f"PRAGMA table_info({tabla})")
+    return [col[1] for col in cursor.fetchall()]
+
+
+def _agregar_columna(cursor, tabla, columna, definicion):
+    """ALTER TABLE ADD COLUMN solo si la columna no existe"""
+    if columna not in _columnas(cursor, tabla):
+        cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+
+
+# ============================================
+# MIGRACIONES
+# ============================================
+
+@migracion(1, "Esquema base")
+def _esquema_base(cursor):
+    # Tabla de trabajadores
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS trabajadores (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nombre TEXT NOT NULL,
+        usuario TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        rol TEXT DEFAULT 'trabajador',
+        activo INTEGER DEFAULT 1,
+        fecha_creacion TEXT DEFAULT (datetime('now', 'localtime'))
+    )
+    """)
+
+    # Tabla de clientes
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS clientes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        placa TEXT UNIQUE NOT NULL,
+        nombre TEXT,
+        celular TEXT,
+        precio_dia REAL,
+        fecha_actualizacion TEXT
+    )
+    """)
+
+    # Tabla de entradas
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS entradas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        cliente_id INTEGER,
+        fecha_entrada TEXT,
+        hora_entrada TEXT,
+        fecha_hasta TEXT,
+        hora_salida_esperada TEXT,
+        hora_salida_real TEXT,
+        dias INTEGER,
+        precio_dia REAL,
+        monto REAL,
+        adelanto REAL DEFAULT 0,
+        penalidad REAL DEFAULT 0,
+        descuento REAL DEFAULT 0,
+        metodo_pago TEXT DEFAULT 'efectivo',
+        dejo_llave INTEGER DEFAULT 0,
+        pagado INTEGER DEFAULT 0,
+        pago_completo_adelantado INTEGER DEFAULT 0,
+        salio INTEGER DEFAULT 0,
+        observaciones TEXT,
+        trabajador_id INTEGER,
+        trabajador_salida_id INTEGER,
+        fecha_registro TEXT,
+        fecha_salida TEXT,
+        FOREIGN KEY (cliente_id) REFERENCES clientes(id),
+        FOREIGN KEY (trabajador_id) REFERENCES trabajadores(id),
+        FOREIGN KEY (trabajador_salida_id) REFERENCES trabajadores(id)
+    )
+    """)
+
+    # Tabla de turnos
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS turnos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        trabajador_id INTEGER,
+        fecha_inicio TEXT,
+        fecha_fin TEXT,
+        estado TEXT DEFAULT 'abierto',
+        tipo_turno TEXT DEFAULT '',
+        total_efectivo REAL DEFAULT 0,
+        total_yape REAL DEFAULT 0,
+        efectivo_declarado REAL,
+        observaciones TEXT,
+        FOREIGN KEY (trabajador_id) REFERENCES trabajadores(id)
+    )
+    """)
+
+    # Columnas agregadas después de la primera versión
+    _agregar_columna(cursor, "turnos", "tipo_turno", "TEXT DEFAULT ''")
+    _agregar_columna(cursor, "turnos", "yape_declarado", "REAL")
+    _agregar_columna(cursor, "entradas", "dias_pactados", "INTEGER DEFAULT 1")
+
+    # Tabla de movimientos de caja
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS movimientos_caja (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        turno_id INTEGER,
+        entrada_id INTEGER,
+        trabajador_id INTEGER,
+        tipo TEXT NOT NULL,
+        monto REAL NOT NULL,
+        metodo_pago TEXT DEFAULT 'efectivo',
+        descripcion TEXT,
+        fecha_movimiento TEXT DEFAULT (datetime('now', 'localtime')),
+        FOREIGN KEY (turno_id) REFERENCES turnos(id),
+        FOREIGN KEY (entrada_id) REFERENCES entradas(id),
+        FOREIGN KEY (trabajador_id) REFERENCES trabajadores(id)
+    )
+    """)
+
+    # Tabla de configuración
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS configuracion (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        clave TEXT UNIQUE NOT NULL,
+        valor TEXT,
+        descripcion TEXT
+    )
+    """)
+
+    # Configuraciones por defecto
+    configuraciones_default = [
+        ('tolerancia_minutos', '60', 'Minutos de tolerancia antes de cobrar penalidad'),
+        ('capacidad_maxima', '50', 'Capacidad máxima de la cochera'),
+        ('precio_default', '10', 'Precio por día por defecto')
+    ]
+
+    for clave, valor, desc in configuraciones_default:
+        cursor.execute("""
+            INSERT OR IGNORE INTO configuracion (clave, valor, descripcion)
+            VALUES (?, ?, ?)
+        """, (clave, valor, desc))
+
+
+@migracion(2, "Índices para las consultas frecuentes")
+def _indices_consultas_frecuentes(cursor):
+    # Autos en cochera, ocupación y placa duplicada (parcial: solo activos)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_entradas_activas
+        ON entradas(fecha_entrada) WHERE salio = 0
+    """)
+    # Historial de un cliente y eliminar_cliente
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_entradas_cliente
+        ON entradas(cliente_id, fecha_registro)
+    """)
+    # Autos ingresados en el turno
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_entradas_trabajador
+        ON entradas(trabajador_id, fecha_registro)
+    """)
+    # Historial de vehículos ordenado y filtrado por fecha
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_entradas_fecha
+        ON entradas(fecha_entrada, hora_entrada)
+    """)
+    # Movimientos, totales y salidas de un turno
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_movimientos_turno
+        ON movimientos_caja(turno_id, fecha_movimiento)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_movimientos_entrada
+        ON movimientos_caja(entrada_id)
+    """)
+    # Ingresos por rango de fechas (dashboard admin)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_movimientos_fecha
+        ON movimientos_caja(fecha_movimiento)
+    """)
+    # Turno activo de un trabajador y mis_reportes
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_turnos_trabajador
+        ON turnos(trabajador_id, fecha_inicio)
+    """)
+    # Turno abierto de cualquier trabajador (parcial: solo abiertos)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_turnos_abiertos
+        ON turnos(fecha_inicio) WHERE estado = 'abierto'
+    """)
+    # Reportes de turnos ordenados por fecha
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_turnos_fecha
+        ON turnos(fecha_inicio)
+    """)
+    # Listado de clientes, paginado por (fecha_actualizacion, id). La fecha
+    # puede ser NULL y una comparación con NULL no es verdadera: la
+    # paginación ordena por IFNULL(fecha_actualizacion, '') (ordena igual
+    # que NULL) y el índice es sobre esa misma expresión
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_clientes_actualizacion
+        ON clientes(IFNULL(fecha_actualizacion, ''), id)
+    """)
+    cursor.execute("ANALYZE")
+
+
+@migracion(3, "Tabla de eventos para el canal en vivo")
+def _tabla_eventos(cursor):
+    # AUTOINCREMENT: los ids nunca se reutilizan aunque se borren los
+    # eventos viejos, así Last-Event-ID sigue siendo válido
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS eventos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tipo TEXT NOT NULL,
+        turno_id INTEGER,
+        datos TEXT,
+        fecha TEXT DEFAULT (datetime('now', 'localtime'))
+    )
+    """)
+
+
+@migracion(4, "Búsqueda de texto completo (FTS5 trigram)")
+def _busqueda_texto(cursor):
+    # Índices externos (content=): no duplican los datos, solo los trigramas.
+    # Trigram permite buscar cualquier fragmento de 3+ caracteres, como
+    # LIKE '%X%' pero usando índice.
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS busqueda_clientes USING fts5(
+                placa, nombre, celular,
+                content = 'clientes', content_rowid = 'id', tokenize = 'trigram'
+            )
+        """)
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS busqueda_entradas USING fts5(
+                observaciones,
+                content = 'entradas', content_rowid = 'id', tokenize = 'trigram'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        # SQLite sin FTS5 o anterior a 3.34: las búsquedas siguen con LIKE y
+        # aplicar_migraciones lo vuelve a intentar en cada arranque
+        print(f"[MIGRACION] Búsqueda FTS5 no disponible ({e}); se usará LIKE")
+        return
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS busqueda_clientes_ai AFTER INSERT ON clientes BEGIN
+            INSERT INTO busqueda_clientes (rowid, placa, nombre, celular)
+            VALUES (new.id, new.placa, new.nombre, new.celular);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS busqueda_clientes_ad AFTER DELETE ON clientes BEGIN
+            INSERT INTO busqueda_clientes (busqueda_clientes, rowid, placa, nombre, celular)
+            VALUES ('delete', old.id, old.placa, old.nombre, old.celular);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS busqueda_clientes_au
+        AFTER UPDATE OF placa, nombre, celular ON clientes BEGIN
+            INSERT INTO busqueda_clientes (busqueda_clientes, rowid, placa, nombre, celular)
+            VALUES ('delete', old.id, old.placa, old.nombre, old.celular);
+            INSERT INTO busqueda_clientes (rowid, placa, nombre, celular)
+            VALUES (new.id, new.placa, new.nombre, new.celular);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS busqueda_entradas_ai AFTER INSERT ON entradas BEGIN
+            INSERT INTO busqueda_entradas (rowid, observaciones)
+            VALUES (new.id, new.observaciones);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS busqueda_entradas_ad AFTER DELETE ON entradas BEGIN
+            INSERT INTO busqueda_entradas (busqueda_entradas, rowid, observaciones)
+            VALUES ('delete', old.id, old.observaciones);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS busqueda_entradas_au
+        AFTER UPDATE OF observaciones ON entradas BEGIN
+            INSERT INTO busqueda_entradas (busqueda_entradas, rowid, observaciones)
+            VALUES ('delete', old.id, old.observaciones);
+            INSERT INTO busqueda_entradas (rowid, observaciones)
+            VALUES (new.id, new.observaciones);
+        END
+    """)
+
+    # Indexar lo que ya existe
+    cursor.execute("INSERT INTO busqueda_clientes (busqueda_clientes) VALUES ('rebuild')")
+    cursor.execute("INSERT INTO busqueda_entradas (busqueda_entradas) VALUES ('rebuild')")
+
+
+@migracion(5, "Montos en céntimos enteros")
+def _montos_en_centimos(cursor):
+    # Cada monto en soles (REAL) tiene al lado su columna entera en
+    # céntimos (models/dinero.py), con el mismo valor por defecto. Las
+    # rutas escriben las dos y todas las sumas usan la de céntimos
+    for tabla, columnas in COLUMNAS_DINERO.items():
+        cursor.execute(f"PRAGMA table_info({tabla})")
+        por_defecto = {col[1]: col[4] for col in cursor.fetchall()}
+        for columna in columnas:
+            defecto = por_defecto.get(columna)
+            definicion = "INTEGER" if defecto is None else f"INTEGER DEFAULT {a_centimos(defecto)}"
+            _agregar_columna(cursor, tabla, f"{columna}_centimos", definicion)
+        asignaciones = ", ".join(f"{c}_centimos = {centimos_sql(c)}" for c in columnas)
+        cursor.execute(f"UPDATE {tabla} SET {asignaciones}")
+
+        # Quien escriba solo en soles (scripts, ediciones a mano) no descuadra
+        # los totales: si los céntimos no corresponden, se recalculan. Lo que
+        # escriben las rutas ya corresponde y el trigger no hace nada
+        descuadre = " OR ".join(
+            f"NEW.{c}_centimos IS NOT {centimos_sql(f'NEW.{c}')}" for c in columnas
+        )
+        asignaciones_new = ", ".join(f"{c}_centimos = {centimos_sql(f'NEW.{c}')}" for c in columnas)
+        for nombre, evento in (("ai", "INSERT"), ("au", f"UPDATE OF {', '.join(columnas)}")):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS centimos_{tabla}_{nombre}
+                AFTER {evento} ON {tabla}
+                WHEN {descuadre}
+                BEGIN
+                    UPDATE {tabla} SET {asignaciones_new} WHERE id = NEW.id;
+                END
+            """)
+
+
+@migracion(6, "Estadísticas por cliente (cliente_stats)")
+def _cliente_stats(cursor):
+    # Mantenida por triggers (models/resumenes.py): el listado de clientes
+    # y su historial ya no recorren todas las entradas
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS cliente_stats (
+        cliente_id INTEGER PRIMARY KEY,
+        total_visitas INTEGER NOT NULL DEFAULT 0,
+        total_gastado_centimos INTEGER NOT NULL DEFAULT 0,
+        deuda_actual_centimos INTEGER NOT NULL DEFAULT 0,
+        total_dias INTEGER NOT NULL DEFAULT 0,
+        dias_contados INTEGER NOT NULL DEFAULT 0,
+        entradas_activas INTEGER NOT NULL DEFAULT 0,
+        ultima_visita TEXT
+    )
+    """)
+    crear_triggers_cliente_stats(cursor)
+    reconstruir_cliente_stats(cursor)
+
+
+@migracion(7, "Totales por turno (turno_totales)")
+def _turno_totales(cursor):
+    # Una fila por turno mantenida por triggers (models/resumenes.py): el
+    # dashboard, el cierre y el reporte la leen por clave primaria
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS turno_totales (
+        turno_id INTEGER PRIMARY KEY,
+        total_cobrado_centimos INTEGER NOT NULL DEFAULT 0,
+        total_efectivo_centimos INTEGER NOT NULL DEFAULT 0,
+        total_yape_centimos INTEGER NOT NULL DEFAULT 0,
+        total_adelantos_centimos INTEGER NOT NULL DEFAULT 0,
+        total_cobros_centimos INTEGER NOT NULL DEFAULT 0,
+        total_penalidades_centimos INTEGER NOT NULL DEFAULT 0,
+        num_movimientos INTEGER NOT NULL DEFAULT 0,
+        autos_salieron INTEGER NOT NULL DEFAULT 0,
+        autos_ingresados INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+
+    # Turno en que se registró cada entrada. Las existentes se asignan al
+    # último turno que su trabajador abrió antes de registrarlas
+    _agregar_columna(cursor, "entradas", "turno_id", "INTEGER REFERENCES turnos(id)")
+    cursor.execute("""
+        UPDATE entradas SET turno_id = (
+            SELECT t.id FROM turnos t
+            WHERE t.trabajador_id = entradas.trabajador_id
+              AND t.fecha_inicio <= entradas.fecha_registro
+            ORDER BY t.fecha_inicio DESC, t.id DESC
+            LIMIT 1
+        )
+        WHERE turno_id IS NULL
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_entradas_turno ON entradas(turno_id)")
+
+    crear_triggers_turno_totales(cursor)
+    reconstruir_turno_totales(cursor)
+
+
+@migracion(8, "Archivo de reportes de turnos cerrados")
+def _reportes_turno(cursor):
+    # Un turno cerrado ya no cambia: al cerrarlo se guarda su reporte
+    # completo (utils/reportes.py). Los turnos cerrados antes de esta
+    # migración se arman en vivo hasta correr `python -m utils.reportes`
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS reportes_turno (
+        turno_id INTEGER PRIMARY KEY REFERENCES turnos(id),
+        fecha_generacion TEXT NOT NULL,
+        etag TEXT NOT NULL,
+        etag_admin TEXT NOT NULL,
+        datos BLOB NOT NULL,
+        html BLOB NOT NULL,
+        html_admin BLOB NOT NULL
+    )
+    """)
+
+
+@migracion(9, "Ingresos por día (ingresos_diarios)")
+def _ingresos_diarios(cursor):
+    # Una fila por día, método de pago y tipo de movimiento mantenida por
+    # triggers (models/resumenes.py): el dashboard del admin suma unas
+    # pocas filas por rango de fechas en vez de recorrer movimientos_caja
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ingresos_diarios (
+        fecha TEXT NOT NULL,
+        metodo_pago TEXT NOT NULL,
+        tipo TEXT NOT NULL,
+        total_centimos INTEGER NOT NULL DEFAULT 0,
+        num_movimientos INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (fecha, metodo_pago, tipo)
+    ) WITHOUT ROWID
+    """)
+
+    crear_triggers_ingresos_diarios(cursor)
+    reconstruir_ingresos_diarios(cursor)
+
+
+# Día en que sale una entrada para la caché de ocupación: las que siguen en
+# la cochera no tienen fin, las salidas sin fecha (datos antiguos) no cuentan
+_DIA_SALIDA = """
+    CASE WHEN {e}.fecha_salida IS NOT NULL THEN date({e}.fecha_salida)
+         WHEN {e}.salio = 0 THEN '9999-12-31'
+         ELSE {e}.fecha_entrada END
+"""
+
+
+@migracion(10, "Caché de ocupación por hora de los días cerrados")
+def _ocupacion_horaria(cursor):
+    # utils/ocupacion_historica.py guarda aquí el resultado de cada día
+    # cerrado. Una entrada nueva, editada o borrada invalida los días en los
+    # que cambia su intervalo; registrar la salida hoy no toca días cerrados
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS ocupacion_horaria (
+        fecha TEXT NOT NULL,
+        hora INTEGER NOT NULL,
+        promedio REAL NOT NULL,
+        pico INTEGER NOT NULL,
+        PRIMARY KEY (fecha, hora)
+    ) WITHOUT ROWID
+    """)
+
+    salida_old = _DIA_SALIDA.format(e="OLD")
+    salida_new = _DIA_SALIDA.format(e="NEW")
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS ocupacion_horaria_entrada_ai AFTER INSERT ON entradas BEGIN
+            DELETE FROM ocupacion_horaria
+            WHERE fecha BETWEEN NEW.fecha_entrada AND {salida_new};
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS ocupacion_horaria_entrada_ad AFTER DELETE ON entradas BEGIN
+            DELETE FROM ocupacion_horaria
+            WHERE fecha BETWEEN OLD.fecha_entrada AND {salida_old};
+        END
+    """)
+    # Cambia la entrada: los días entre la vieja y la nueva
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS ocupacion_horaria_entrada_au
+        AFTER UPDATE OF fecha_entrada, hora_entrada ON entradas
+        WHEN OLD.fecha_entrada IS NOT NEW.fecha_entrada
+          OR OLD.hora_entrada IS NOT NEW.hora_entrada
+        BEGIN
+            DELETE FROM ocupacion_horaria
+            WHERE fecha BETWEEN min(OLD.fecha_entrada, NEW.fecha_entrada)
+                            AND max(OLD.fecha_entrada, NEW.fecha_entrada);
+        END
+    """)
+    # Cambia la salida: los días entre la vieja y la nueva (registrar la
+    # salida de un auto en cochera solo toca de hoy en adelante)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS ocupacion_horaria_salida_au
+        AFTER UPDATE OF fecha_salida, salio ON entradas
+        WHEN OLD.fecha_salida IS NOT NEW.fecha_salida
+          OR OLD.salio IS NOT NEW.salio
+        BEGIN
+            DELETE FROM ocupacion_horaria
+            WHERE fecha BETWEEN min({salida_old}, {salida_new})
+                            AND max({salida_old}, {salida_new});
+        END
+    """)
+
+
+@migracion(11, "Fechas en segundos (columnas *_epoch) para los filtros por rango")
+def _fechas_en_segundos(cursor):
+    # Columnas generadas virtuales (models/fechas.py): no ocupan lugar en la
+    # tabla y ALTER TABLE las agrega sin reescribirla. Indexadas, los
+    # filtros por fecha pasan a ser tramos del índice
+    for tabla, columnas in COLUMNAS_EPOCH.items():
+        for columna, expresion in columnas:
+            _agregar_columna(cursor, tabla, columna,
+                             f"INTEGER GENERATED ALWAYS AS ({expresion}) VIRTUAL")
+
+    # Reportes de turnos (todos y por trabajador), filtrados y paginados
+    # por (inicio_epoch, id)
+    cursor.execute("DROP INDEX IF EXISTS idx_turnos_fecha")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_turnos_inicio
+        ON turnos(inicio_epoch)
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_turnos_trabajador_inicio
+        ON turnos(trabajador_id, inicio_epoch)
+    """)
+    # Historial y barrido de ocupación (migración 10), en segundos: el
+    # barrido lee entrada y salida de todas las filas del rango y con la
+    # salida en el índice no va a la tabla por cada fila. El id va antes
+    # para que el historial siga ordenado por el índice (entrada, id). Sin
+    # `salio`: así los autos en cochera siguen usando el índice parcial
+    cursor.execute("DROP INDEX IF EXISTS idx_entradas_fecha")
+    cursor.execute("""
+        CREATE INDEX idx_entradas_fecha
+        ON entradas(entrada_epoch, id, salida_epoch)
+    """)
+    # Pagado hasta un momento: movimientos de una entrada hasta una fecha
+    cursor.execute("DROP INDEX IF EXISTS idx_movimientos_entrada")
+    cursor.execute("""
+        CREATE INDEX idx_movimientos_entrada
+        ON movimientos_caja(entrada_id, movimiento_epoch)
+    """)
+
+    cursor.execute("ANALYZE")
+
+
+# ============================================
+# PLANES DE CONSULTA
+# ============================================
+
+# Consultas calientes de routes/ (versión mínima de cada WHERE/ORDER BY)
+CONSULTAS_FRECUENTES = {
+    "autos_en_cochera": ("""
+        SELECT e.id FROM entradas e
+        JOIN clientes c ON e.cliente_id = c.id
+        WHERE e.salio = 0
+        ORDER BY e.fecha_entrada DESC
+    """, ()),
+    "ocupacion": ("SELECT COUNT(*) FROM entradas WHERE salio = 0", ()),
+    "placa_en_cochera": ("""
+        SELECT e.id FROM entradas e
+        JOIN clientes c ON e.cliente_id = c.id
+        WHERE c.placa = ? AND e.salio = 0
+    """, ("ABC123",)),
+    "historial_cliente": ("""
+        SELECT * FROM entradas WHERE cliente_id = ?
+        ORDER BY fecha_registro DESC
+    """, (1,)),
+    "totales_turno": ("SELECT * FROM turno_totales WHERE turno_id = ?", (1,)),
+    "movimientos_turno": ("""
+        SELECT * FROM movimientos_caja WHERE turno_id = ?
+        ORDER BY fecha_movimiento DESC
+    """, (1,)),
+    "ingresos_semana": ("""
+        SELECT fecha, SUM(total_centimos) FROM ingresos_diarios
+        WHERE fecha >= ?
+        GROUP BY fecha
+    """, ("2024-01-01",)),
+    "turno_activo_trabajador": ("""
+        SELECT * FROM turnos
+        WHERE trabajador_id = ? AND estado = 'abierto'
+        ORDER BY fecha_inicio DESC LIMIT 1
+    """, (1,)),
+    "turno_abierto": ("""
+        SELECT id FROM turnos WHERE estado = 'abierto'
+        ORDER BY fecha_inicio DESC LIMIT 1
+    """, ()),
+    "historial_vehiculos": ("""
+        SELECT e.id FROM entradas e
+        JOIN clientes c ON e.cliente_id = c.id
+        WHERE e.entrada_epoch >= ? AND e.entrada_epoch < ?
+        ORDER BY e.entrada_epoch DESC, e.id DESC
+        LIMIT 50
+    """, (1704067200, 1735689600)),
+    "reportes_turnos": ("""
+        SELECT t.id FROM turnos t
+        WHERE t.inicio_epoch >= ? AND t.inicio_epoch < ?
+        ORDER BY t.inicio_epoch DESC, t.id DESC LIMIT 20
+    """, (1704067200, 1735689600)),
+    "mis_reportes": ("""
+        SELECT t.id FROM turnos t
+        WHERE t.trabajador_id = ? AND t.inicio_epoch >= ? AND t.inicio_epoch < ?
+        ORDER BY t.inicio_epoch DESC, t.id DESC LIMIT 15
+    """, (1, 1704067200, 1735689600)),
+    "listado_clientes": ("""
+        SELECT c.id FROM clientes c
+        WHERE IFNULL(c.fecha_actualizacion, '') <= ?
+        AND (IFNULL(c.fecha_actualizacion, ''), c.id) < (?, ?)
+        ORDER BY IFNULL(c.fecha_actualizacion, '') DESC, c.id DESC LIMIT 50
+    """, ("2024-01-01", "2024-01-01", 1)),
+    "ocupacion_intervalos": ("""
+        SELECT entrada_epoch, salida_epoch FROM entradas
+        WHERE entrada_epoch >= ? AND entrada_epoch < ? AND salida_epoch IS NOT NULL
+    """, (1704067200, 1735689600)),
+    "pagado_al_momento": ("""
+        SELECT SUM(monto_centimos) FROM movimientos_caja
+        WHERE entrada_id = ? AND movimiento_epoch <= ?
+    """, (1, 1704067200)),
+    "ocupacion_horaria": ("""
+        SELECT fecha, promedio, pico FROM ocupacion_horaria
+        WHERE fecha BETWEEN ? AND ? ORDER BY fecha, hora
+    """, ("2024-01-01", "2024-12-31")),
+}
+
+
+def planes_de_consulta(db):
+    """Devuelve {consulta: [líneas de EXPLAIN QUERY PLAN]}"""
+    planes = {}
+    for nombre, (sql, params) in CONSULTAS_FRECUENTES.items():
+        try:
+            filas = db.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+            planes[nombre] = [fila[3] for fila in filas]
+        except sqlite3.OperationalError as e:
+            planes[nombre] = [f"(error: {e})"]
+    return planes
+
+
+def formatear_planes(antes, despues):
+    """Texto con los planes antes/después de las consultas que cambiaron"""
+    lineas = []
+    for nombre, plan in despues.items():
+        anterior = antes.get(nombre)
+        if anterior == plan:
+            continue
+        lineas.append(f"  {nombre}:")
+        for linea in anterior or ["(sin plan)"]:
+            lineas.append(f"    antes:   {linea}")
+        for linea in plan:
+            lineas.append(f"    después: {linea}")
+    return "\n".join(lineas)
+
+
+# ============================================
+# APLICAR MIGRACIONES
+# ============================================
+
+def _busqueda_creada(db):
+    return db.execute("""
+        SELECT COUNT(*) FROM sqlite_master
+        WHERE name IN ('busqueda_clientes', 'busqueda_entradas')
+    """).fetchone()[0] == 2
+
+
+def _reintentar_busqueda_texto(db):
+    """
+    La migración 4 no falla si el SQLite no trae FTS5, pero user_version
+    avanza igual. Mientras falten las tablas de búsqueda se vuelve a correr
+    (es idempotente) por si el SQLite ya se actualizó.
+    """
+    if _busqueda_creada(db):
+        return
+    cursor = db.cursor()
+    try:
+        cursor.execute("BEGIN")
+        _busqueda_texto(cursor)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if _busqueda_creada(db):
+        print("[MIGRACION] Búsqueda FTS5 creada (faltaba de la migración 4)")
+
+
+def aplicar_migraciones(db, reportar=True):
+    """
+    Aplica las migraciones pendientes en orden.
+
+    Returns:
+        list: Versiones aplicadas (vacía si el esquema ya estaba al día)
+    """
+    actual = version_actual(db)
+    if actual >= 4:
+        _reintentar_busqueda_texto(db)
+
+    pendientes = [m for m in MIGRACIONES if m[0] > actual]
+    if not pendientes:
+        return []
+
+    # En una base nueva todavía no hay tablas que consultar
+    existe = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'entradas'"
+    ).fetchone()
+    antes = planes_de_consulta(db) if existe else {}
+
+    aplicadas = []
+    for version, descripcion, funcion in pendientes:
+        cursor = db.cursor()
+        try:
+            cursor.execute("BEGIN")
+            funcion(cursor)
+            cursor.execute(f"PRAGMA user_version = {int(version)}")
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        aplicadas.append(version)
+        print(f"[MIGRACION] {version:03d} aplicada: {descripcion}")
+
+    if reportar and antes:
+        texto = formatear_planes(antes, planes_de_consulta(db))
+        if texto:
+            print("[MIGRACION] Planes de consulta modificados:\n" + texto)
+
+    return aplicadas
+
+
+def _main(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        print(f"Base de datos: {db_path}")
+        print(f"Versión del esquema: {version_actual(conn)} (código: {version_objetivo()})")
+        for version, descripcion, _ in MIGRACIONES:
+            estado = "aplicada" if version <= version_actual(conn) else "pendiente"
+            print(f"  {version:03d} {descripcion} [{estado}]")
+        print("\nPlanes de consulta:")
+        for nombre, plan in planes_de_consulta(conn).items():
+            print(f"  {nombre}:")
+            for linea in plan:
+                print(f"    {linea}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    _main(sys.argv[1] if len(sys.argv) > 1 else "database.db")
@@ -0,0 +1,196 @@
+"""
+Pool de Conexiones SQLite
+=========================
+Mantiene conexiones abiertas por proceso (worker de gunicorn) en modo WAL.
+
+Con WAL los lectores no bloquean al escritor ni viceversa, y reutilizar las
+conexiones evita abrir el archivo y aplicar los PRAGMAs en cada petición.
+"""
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+
+class PoolConexiones:
+    """Pool de conexiones SQLite de un solo proceso"""
+
+    def __init__(self, db_path, tamano=8, espera=10, synchronous="NORMAL",
+                 cache_size=-20000, mmap_size=268435456, temp_store="MEMORY",
+                 wal_autocheckpoint=1000, checkpoint_segundos=300):
+        self.db_path = db_path
+        self.tamano = tamano
+        self.espera = espera
+        self.pragmas = [
+            "PRAGMA journal_mode = WAL",
+            f"PRAGMA synchronous = {synchronous}",
+            f"PRAGMA cache_size = {int(cache_size)}",
+            f"PRAGMA mmap_size = {int(mmap_size)}",
+            f"PRAGMA temp_store = {temp_store}",
+            f"PRAGMA wal_autocheckpoint = {int(wal_autocheckpoint)}",
+            f"PRAGMA busy_timeout = {int(espera * 1000)}",
+        ]
+        self.checkpoint_segundos = checkpoint_segundos
+        self.pid = os.getpid()
+
+        self._libres = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._creadas = 0
+        self._ultimo_checkpoint = time.monotonic()
+        self._stats = {
+            "aciertos": 0,
+            "fallos": 0,
+            "esperas": 0,
+            "tiempo_espera_ms": 0.0,
+            "descartadas": 0,
+            "checkpoints": 0,
+        }
+
+    def _conectar(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.espera, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        return conn
+
+    def obtener(self):
+        """Toma una conexión libre o abre una nueva si hay cupo"""
+        try:
+            conn = self._libres.get_nowait()
+            with self._lock:
+                self._stats["aciertos"] += 1
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            crear = self._creadas < self.tamano
+            if crear:
+                self._creadas += 1
+                self._stats["fallos"] += 1
+
+        if crear:
+            try:
+                return self._conectar()
+            except Exception:
+                with self._lock:
+                    self._creadas -= 1
+                raise
+
+        # Pool agotado: esperar a que otra petición devuelva su conexión
+        inicio = time.monotonic()
+        try:
+            conn = self._libres.get(timeout=self.espera)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Pool de conexiones agotado")
+        with self._lock:
+            self._stats["esperas"] += 1
+            self._stats["tiempo_espera_ms"] += (time.monotonic() - inicio) * 1000
+        return conn
+
+    def devolver(self, conn):
+        """Devuelve la conexión al pool descartando cambios sin confirmar"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._descartar(conn)
+            return
+
+        if time.monotonic() - self._ultimo_checkpoint >= self.checkpoint_segundos:
+            self.checkpoint(conn=conn)
+
+        self._libres.put(conn)
+
+    def _descartar(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._creadas -= 1
+            self._stats["descartadas"] += 1
+
+    def checkpoint(self, modo="PASSIVE", conn=None):
+        """Ejecuta un checkpoint del WAL (PASSIVE no bloquea a nadie)"""
+        propia = conn is None
+        if propia:
+            conn = self._conectar()
+        try:
+            resultado = conn.execute(f"PRAGMA wal_checkpoint({modo})").fetchone()
+            with self._lock:
+                self._ultimo_checkpoint = time.monotonic()
+                self._stats["checkpoints"] += 1
+            return tuple(resultado) if resultado else None
+        except sqlite3.Error as e:
+            print(f"[DB] Error en checkpoint {modo}: {e}")
+            return None
+        finally:
+            if propia:
+                conn.close()
+
+    def cerrar(self):
+        """Cierra las conexiones libres y trunca el WAL"""
+        while True:
+            try:
+                conn = self._libres.get_nowait()
+            except queue.Empty:
+                break
+            self._descartar(conn)
+        self.checkpoint("TRUNCATE")
+
+    def estadisticas(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["abiertas"] = self._creadas
+        stats["libres"] = self._libres.qsize()
+        stats["tamano"] = self.tamano
+        stats["pid"] = self.pid
+        pedidas = stats["aciertos"] + stats["fallos"] + stats["esperas"]
+        stats["tasa_aciertos"] = round(stats["aciertos"] / pedidas, 3) if pedidas else 0
+        stats["tiempo_espera_ms"] = round(stats["tiempo_espera_ms"], 2)
+        return stats
+
+
+# ============================================
+# POOLS POR PROCESO
+# ============================================
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def obtener_pool(app):
+    """
+    Pool de la aplicación para el proceso actual.
+    Si el proceso es un fork (worker de gunicorn) crea uno nuevo: las
+    conexiones SQLite no se pueden compartir entre procesos.
+    """
+    db_path = app.config.get('DATABASE_PATH', 'database.db')
+    clave = (db_path, os.getpid())
+    pool = _pools.get(clave)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(clave)
+            if pool is None:
+                pool = PoolConexiones(
+                    db_path,
+                    tamano=app.config.get('SQLITE_POOL_SIZE', 8),
+                    synchronous=app.config.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+                    cache_size=app.config.get('SQLITE_CACHE_SIZE', -20000),
+                    mmap_size=app.config.get('SQLITE_MMAP_SIZE', 268435456),
+                    temp_store=app.config.get('SQLITE_TEMP_STORE', 'MEMORY'),
+                    wal_autocheckpoint=app.config.get('SQLITE_WAL_AUTOCHECKPOINT', 1000),
+                    checkpoint_segundos=app.config.get('SQLITE_CHECKPOINT_SEGUNDOS', 300),
+                )
+                _pools[clave] = pool
+    return pool
+
+
+def cerrar_pools():
+    """Cierra los pools del proceso actual (al apagar el worker)"""
+    pid = os.getpid()
+    with _pools_lock:
+        for clave in [c for c in _pools if c[1] == pid]:
+            _pools.pop(clave).cerrar()
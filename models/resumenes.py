@@ -0,0 +1,490 @@
+"""
+Tablas de Resumen
+=================
+Agregados que se mantienen con triggers dentro de la misma transacción
+que modifica los datos, para que las pantallas lean un resultado ya
+calculado en vez de recorrer todo el historial. Los montos se acumulan en
+céntimos enteros (models/dinero.py): las sumas son exactas.
+
+Los triggers los crean las migraciones. Para comparar con los datos
+originales o recalcular desde cero (por ejemplo después de editar la base
+a mano):
+
+    python -m models.resumenes verificar [database.db]
+    python -m models.resumenes reconstruir [database.db]
+"""
+import sqlite3
+import sys
+
+
+def _claves(clave, valor_clave):
+    """Clave simple o compuesta como listas paralelas (columnas, expresiones)"""
+    if isinstance(clave, str):
+        return [clave], [valor_clave]
+    return list(clave), list(valor_clave)
+
+
+def _sumar(tabla, clave, valor_clave, aportes, e, otras=None):
+    """
+    Sentencia de trigger que suma los aportes de la fila `e` (upsert).
+
+    Args:
+        clave, valor_clave: Columna y expresión de la clave (o tuplas si
+                            es compuesta); las filas con clave NULL no suman
+        aportes: {columna: expresión con {e}} que se acumulan
+        otras: {columna: (valor inicial, valor si ya existe)} no acumulables
+    """
+    otras = otras or {}
+    claves, valores_clave = _claves(clave, valor_clave)
+    columnas = claves + list(aportes) + list(otras)
+    valores = valores_clave + list(aportes.values()) + [v for v, _ in otras.values()]
+    asignaciones = [f"{c} = {c} + excluded.{c}" for c in aportes]
+    asignaciones += [f"{c} = {conflicto}" for c, (_, conflicto) in otras.items()]
+    no_nulas = " AND ".join(f"{v.format(e=e)} IS NOT NULL" for v in valores_clave)
+    separador = ",\n                "
+    return f"""
+            INSERT INTO {tabla} ({', '.join(columnas)})
+            SELECT {', '.join(v.format(e=e) for v in valores)}
+            WHERE {no_nulas}
+            ON CONFLICT({', '.join(claves)}) DO UPDATE SET
+                {separador.join(asignaciones)};
+    """
+
+
+def _restar(tabla, clave, valor_clave, aportes, e, otras=None):
+    """Sentencia de trigger que resta los aportes de la fila `e`"""
+    otras = otras or {}
+    claves, valores_clave = _claves(clave, valor_clave)
+    asignaciones = [f"{c} = {c} - ({v.format(e=e)})" for c, v in aportes.items()]
+    asignaciones += [f"{c} = {v.format(e=e)}" for c, v in otras.items()]
+    condicion = " AND ".join(f"{c} = {v.format(e=e)}" for c, v in zip(claves, valores_clave))
+    separador = ",\n                "
+    return f"""
+            UPDATE {tabla} SET
+                {separador.join(asignaciones)}
+            WHERE {condicion};
+    """
+
+
+def _totales(aportes, e):
+    """Columnas de un SELECT ... GROUP BY que recalcula los aportes"""
+    return ", ".join(
+        f"IFNULL(SUM({v.format(e=e)}), 0) AS {c}" for c, v in aportes.items()
+    )
+
+
+# ============================================
+# ESTADÍSTICAS POR CLIENTE (cliente_stats)
+# ============================================
+
+# Aporte de una entrada `{e}` a cada columna acumulable de cliente_stats
+_APORTES_CLIENTE = {
+    "total_visitas": "CASE WHEN {e}.id IS NOT NULL THEN 1 ELSE 0 END",
+    "total_gastado_centimos": "IFNULL({e}.monto_centimos, 0)",
+    "deuda_actual_centimos": "CASE WHEN {e}.pagado = 0 THEN IFNULL({e}.monto_centimos, 0) - IFNULL({e}.adelanto_centimos, 0) ELSE 0 END",
+    "total_dias": "IFNULL({e}.dias, 0)",
+    "dias_contados": "CASE WHEN {e}.dias IS NOT NULL THEN 1 ELSE 0 END",
+    "entradas_activas": "CASE WHEN {e}.salio = 0 THEN 1 ELSE 0 END",
+}
+
+# Columnas de entradas que cambian las estadísticas
+_COLUMNAS_CLIENTE = "cliente_id, fecha_entrada, dias, monto_centimos, adelanto_centimos, pagado, salio"
+
+_CLIENTE = ("cliente_stats", "cliente_id", "{e}.cliente_id", _APORTES_CLIENTE)
+
+_ULTIMA_VISITA_SUMAR = {
+    "ultima_visita": (
+        "{e}.fecha_entrada",
+        "MAX(IFNULL(ultima_visita, excluded.ultima_visita), "
+        "IFNULL(excluded.ultima_visita, ultima_visita))"
+    ),
+}
+
+# MAX no se puede deshacer restando: se recalcula solo para ese cliente
+_ULTIMA_VISITA_RESTAR = {
+    "ultima_visita": "(SELECT MAX(fecha_entrada) FROM entradas WHERE cliente_id = {e}.cliente_id)",
+}
+
+
+def crear_triggers_cliente_stats(cursor):
+    """Triggers que mantienen cliente_stats al día"""
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS cliente_stats_entrada_ai AFTER INSERT ON entradas BEGIN
+            {_sumar(*_CLIENTE, "new", _ULTIMA_VISITA_SUMAR)}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS cliente_stats_entrada_ad AFTER DELETE ON entradas BEGIN
+            {_restar(*_CLIENTE, "old", _ULTIMA_VISITA_RESTAR)}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS cliente_stats_entrada_au
+        AFTER UPDATE OF {_COLUMNAS_CLIENTE} ON entradas BEGIN
+            {_restar(*_CLIENTE, "old", _ULTIMA_VISITA_RESTAR)}
+            {_sumar(*_CLIENTE, "new", _ULTIMA_VISITA_SUMAR)}
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS cliente_stats_cliente_ai AFTER INSERT ON clientes BEGIN
+            INSERT OR IGNORE INTO cliente_stats (cliente_id) VALUES (new.id);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS cliente_stats_cliente_ad AFTER DELETE ON clientes BEGIN
+            DELETE FROM cliente_stats WHERE cliente_id = old.id;
+        END
+    """)
+
+
+COLUMNAS_CLIENTE = list(_APORTES_CLIENTE) + ["ultima_visita"]
+
+# Estadísticas de cada cliente calculadas desde entradas. La segunda parte
+# son entradas cuyo cliente ya no existe (no deberían quedar)
+_CALCULO_CLIENTE = f"""
+    SELECT c.id AS cliente_id, {_totales(_APORTES_CLIENTE, 'e')},
+        MAX(e.fecha_entrada) AS ultima_visita
+    FROM clientes c
+    LEFT JOIN entradas e ON e.cliente_id = c.id
+    GROUP BY c.id
+    UNION ALL
+    SELECT e.cliente_id, {_totales(_APORTES_CLIENTE, 'e')},
+        MAX(e.fecha_entrada) AS ultima_visita
+    FROM entradas e
+    WHERE e.cliente_id IS NOT NULL
+      AND e.cliente_id NOT IN (SELECT id FROM clientes)
+    GROUP BY e.cliente_id
+"""
+
+
+def reconstruir_cliente_stats(cursor):
+    """Recalcula cliente_stats completa desde entradas"""
+    columnas = ", ".join(COLUMNAS_CLIENTE)
+    cursor.execute("DELETE FROM cliente_stats")
+    cursor.execute(f"""
+        INSERT INTO cliente_stats (cliente_id, {columnas})
+        SELECT cliente_id, {columnas} FROM ({_CALCULO_CLIENTE})
+    """)
+
+
+def verificar_cliente_stats(cursor, cliente_id=None):
+    """
+    Recalcula las estadísticas desde entradas y las compara con
+    cliente_stats.
+
+    Args:
+        cliente_id: Cliente a verificar; None para todos
+
+    Returns:
+        list: dicts {cliente_id, columna, guardado, calculado} de las diferencias
+    """
+    filtro = "WHERE cliente_id = ?" if cliente_id is not None else ""
+    params = (cliente_id,) if cliente_id is not None else ()
+    columnas = ", ".join(COLUMNAS_CLIENTE)
+
+    cursor.execute(f"SELECT cliente_id, {columnas} FROM ({_CALCULO_CLIENTE}) {filtro}", params)
+    calculados = {fila[0]: fila[1:] for fila in cursor.fetchall()}
+    cursor.execute(f"SELECT cliente_id, {columnas} FROM cliente_stats {filtro}", params)
+    guardados = {fila[0]: fila[1:] for fila in cursor.fetchall()}
+
+    diferencias = []
+    ceros = (0,) * len(COLUMNAS_CLIENTE)
+    for cliente in sorted(set(calculados) | set(guardados)):
+        guardado = guardados.get(cliente, ceros)
+        calculado = calculados.get(cliente, ceros)
+        for columna, g, c in zip(COLUMNAS_CLIENTE, guardado, calculado):
+            if (g or 0) != (c or 0):
+                diferencias.append({
+                    "cliente_id": cliente,
+                    "columna": columna,
+                    "guardado": g,
+                    "calculado": c
+                })
+    return diferencias
+
+
+# ============================================
+# TOTALES POR TURNO (turno_totales)
+# ============================================
+
+# Aporte de un movimiento de caja `{e}` a los totales de su turno (montos
+# en céntimos, models/dinero.py)
+_APORTES_MOVIMIENTO = {
+    "total_cobrado_centimos": "IFNULL({e}.monto_centimos, 0)",
+    "total_efectivo_centimos": "CASE WHEN {e}.metodo_pago = 'efectivo' THEN IFNULL({e}.monto_centimos, 0) ELSE 0 END",
+    "total_yape_centimos": "CASE WHEN {e}.metodo_pago = 'yape' THEN IFNULL({e}.monto_centimos, 0) ELSE 0 END",
+    "total_adelantos_centimos": "CASE WHEN {e}.tipo LIKE '%ADELANTO%' OR {e}.tipo = 'PAGO_COMPLETO' THEN IFNULL({e}.monto_centimos, 0) ELSE 0 END",
+    "total_cobros_centimos": "CASE WHEN {e}.tipo = 'COBRO_SALIDA' THEN IFNULL({e}.monto_centimos, 0) ELSE 0 END",
+    "total_penalidades_centimos": "CASE WHEN {e}.tipo = 'PENALIDAD' THEN IFNULL({e}.monto_centimos, 0) ELSE 0 END",
+    "num_movimientos": "CASE WHEN {e}.id IS NOT NULL THEN 1 ELSE 0 END",
+    "autos_salieron": "CASE WHEN {e}.tipo = 'COBRO_SALIDA' THEN 1 ELSE 0 END",
+}
+
+_COLUMNAS_MOVIMIENTO = "turno_id, tipo, monto_centimos, metodo_pago"
+
+_APORTES_ENTRADA = {
+    "autos_ingresados": "CASE WHEN {e}.id IS NOT NULL THEN 1 ELSE 0 END",
+}
+
+_MOVIMIENTO = ("turno_totales", "turno_id", "{e}.turno_id", _APORTES_MOVIMIENTO)
+_ENTRADA = ("turno_totales", "turno_id", "{e}.turno_id", _APORTES_ENTRADA)
+
+COLUMNAS_TURNO = list(_APORTES_MOVIMIENTO) + list(_APORTES_ENTRADA)
+
+
+def crear_triggers_turno_totales(cursor):
+    """Triggers que mantienen turno_totales al día"""
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS turno_totales_movimiento_ai
+        AFTER INSERT ON movimientos_caja BEGIN
+            {_sumar(*_MOVIMIENTO, "new")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS turno_totales_movimiento_ad
+        AFTER DELETE ON movimientos_caja BEGIN
+            {_restar(*_MOVIMIENTO, "old")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS turno_totales_movimiento_au
+        AFTER UPDATE OF {_COLUMNAS_MOVIMIENTO} ON movimientos_caja BEGIN
+            {_restar(*_MOVIMIENTO, "old")}
+            {_sumar(*_MOVIMIENTO, "new")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS turno_totales_entrada_ai
+        AFTER INSERT ON entradas BEGIN
+            {_sumar(*_ENTRADA, "new")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS turno_totales_entrada_ad
+        AFTER DELETE ON entradas BEGIN
+            {_restar(*_ENTRADA, "old")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS turno_totales_entrada_au
+        AFTER UPDATE OF turno_id ON entradas BEGIN
+            {_restar(*_ENTRADA, "old")}
+            {_sumar(*_ENTRADA, "new")}
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS turno_totales_turno_ai AFTER INSERT ON turnos BEGIN
+            INSERT OR IGNORE INTO turno_totales (turno_id) VALUES (new.id);
+        END
+    """)
+
+
+# Totales de cada turno calculados desde el libro de caja y las entradas
+_CALCULO_TURNO = f"""
+    SELECT
+        t.id AS turno_id,
+        {', '.join(f'IFNULL(m.{c}, 0) AS {c}' for c in _APORTES_MOVIMIENTO)},
+        IFNULL(e.autos_ingresados, 0) AS autos_ingresados
+    FROM turnos t
+    LEFT JOIN (
+        SELECT m.turno_id, {_totales(_APORTES_MOVIMIENTO, 'm')}
+        FROM movimientos_caja m
+        GROUP BY m.turno_id
+    ) m ON m.turno_id = t.id
+    LEFT JOIN (
+        SELECT e.turno_id, COUNT(*) AS autos_ingresados
+        FROM entradas e
+        GROUP BY e.turno_id
+    ) e ON e.turno_id = t.id
+"""
+
+
+def reconstruir_turno_totales(cursor):
+    """Recalcula turno_totales completa desde movimientos_caja y entradas"""
+    cursor.execute("DELETE FROM turno_totales")
+    cursor.execute(f"""
+        INSERT INTO turno_totales (turno_id, {', '.join(COLUMNAS_TURNO)})
+        SELECT turno_id, {', '.join(COLUMNAS_TURNO)} FROM ({_CALCULO_TURNO})
+    """)
+
+
+def verificar_turno_totales(cursor, turno_id=None):
+    """
+    Recalcula los totales desde el libro de caja y los compara con
+    turno_totales.
+
+    Args:
+        turno_id: Turno a verificar; None para todos
+
+    Returns:
+        list: dicts {turno_id, columna, guardado, calculado} de las diferencias
+    """
+    filtro = "WHERE turno_id = ?" if turno_id is not None else ""
+    params = (turno_id,) if turno_id is not None else ()
+    columnas = ", ".join(COLUMNAS_TURNO)
+
+    cursor.execute(f"SELECT turno_id, {columnas} FROM ({_CALCULO_TURNO}) {filtro}", params)
+    calculados = {fila[0]: fila[1:] for fila in cursor.fetchall()}
+    cursor.execute(f"SELECT turno_id, {columnas} FROM turno_totales {filtro}", params)
+    guardados = {fila[0]: fila[1:] for fila in cursor.fetchall()}
+
+    diferencias = []
+    ceros = (0,) * len(COLUMNAS_TURNO)
+    for turno in sorted(set(calculados) | set(guardados)):
+        guardado = guardados.get(turno, ceros)
+        calculado = calculados.get(turno, ceros)
+        for columna, g, c in zip(COLUMNAS_TURNO, guardado, calculado):
+            if (g or 0) != (c or 0):
+                diferencias.append({
+                    "turno_id": turno,
+                    "columna": columna,
+                    "guardado": g,
+                    "calculado": c
+                })
+    return diferencias
+
+
+# ============================================
+# INGRESOS POR DÍA (ingresos_diarios)
+# ============================================
+
+# Una fila por día, método de pago y tipo de movimiento
+_CLAVES_DIA = ("fecha", "metodo_pago", "tipo")
+_VALORES_DIA = ("date({e}.fecha_movimiento)", "IFNULL({e}.metodo_pago, '')", "{e}.tipo")
+
+_APORTES_DIA = {
+    "total_centimos": "IFNULL({e}.monto_centimos, 0)",
+    "num_movimientos": "CASE WHEN {e}.id IS NOT NULL THEN 1 ELSE 0 END",
+}
+
+_COLUMNAS_DIA = "fecha_movimiento, tipo, monto_centimos, metodo_pago"
+
+_DIA = ("ingresos_diarios", _CLAVES_DIA, _VALORES_DIA, _APORTES_DIA)
+
+
+def crear_triggers_ingresos_diarios(cursor):
+    """Triggers que mantienen ingresos_diarios al día"""
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS ingresos_diarios_movimiento_ai
+        AFTER INSERT ON movimientos_caja BEGIN
+            {_sumar(*_DIA, "new")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS ingresos_diarios_movimiento_ad
+        AFTER DELETE ON movimientos_caja BEGIN
+            {_restar(*_DIA, "old")}
+        END
+    """)
+    cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS ingresos_diarios_movimiento_au
+        AFTER UPDATE OF {_COLUMNAS_DIA} ON movimientos_caja BEGIN
+            {_restar(*_DIA, "old")}
+            {_sumar(*_DIA, "new")}
+        END
+    """)
+
+
+# Ingresos por día calculados desde el libro de caja
+_CALCULO_DIA = f"""
+    SELECT {', '.join(f'{v.format(e="m")} AS {c}' for c, v in zip(_CLAVES_DIA, _VALORES_DIA))},
+        {_totales(_APORTES_DIA, 'm')}
+    FROM movimientos_caja m
+    WHERE date(m.fecha_movimiento) IS NOT NULL
+    GROUP BY 1, 2, 3
+"""
+
+
+def reconstruir_ingresos_diarios(cursor):
+    """Recalcula ingresos_diarios completa desde movimientos_caja"""
+    columnas = ", ".join(_CLAVES_DIA + tuple(_APORTES_DIA))
+    cursor.execute("DELETE FROM ingresos_diarios")
+    cursor.execute(f"INSERT INTO ingresos_diarios ({columnas}) {_CALCULO_DIA}")
+
+
+def verificar_ingresos_diarios(cursor):
+    """
+    Recalcula los ingresos por día desde el libro de caja y los compara
+    con ingresos_diarios.
+
+    Returns:
+        list: dicts {fecha, metodo_pago, tipo, columna, guardado, calculado}
+    """
+    columnas = ", ".join(_CLAVES_DIA + tuple(_APORTES_DIA))
+    cursor.execute(f"SELECT {columnas} FROM ({_CALCULO_DIA})")
+    calculados = {fila[:3]: fila[3:] for fila in cursor.fetchall()}
+    cursor.execute(f"SELECT {columnas} FROM ingresos_diarios")
+    guardados = {fila[:3]: fila[3:] for fila in cursor.fetchall()}
+
+    diferencias = []
+    ceros = (0,) * len(_APORTES_DIA)
+    for clave in sorted(set(calculados) | set(guardados)):
+        guardado = guardados.get(clave, ceros)
+        calculado = calculados.get(clave, ceros)
+        for columna, g, c in zip(_APORTES_DIA, guardado, calculado):
+            if (g or 0) != (c or 0):
+                diferencia = dict(zip(_CLAVES_DIA, clave))
+                diferencia.update({"columna": columna, "guardado": g, "calculado": c})
+                diferencias.append(diferencia)
+    return diferencias
+
+
+# ============================================
+# RECONSTRUIR / VERIFICAR TODO
+# ============================================
+
+RESUMENES = {
+    "cliente_stats": reconstruir_cliente_stats,
+    "turno_totales": reconstruir_turno_totales,
+    "ingresos_diarios": reconstruir_ingresos_diarios,
+}
+
+
+def reconstruir_resumenes(db):
+    """Recalcula todas las tablas de resumen en una sola transacción"""
+    cursor = db.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        for nombre, reconstruir in RESUMENES.items():
+            reconstruir(cursor)
+            print(f"[RESUMENES] {nombre} reconstruida")
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+
+def _main(accion, db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        if accion == "reconstruir":
+            reconstruir_resumenes(conn)
+            return 0
+        diferencias_clientes = verificar_cliente_stats(conn.cursor())
+        for d in diferencias_clientes:
+            print(f"  cliente {d['cliente_id']} {d['columna']}: "
+                  f"guardado {d['guardado']} / calculado {d['calculado']}")
+        print(f"[RESUMENES] cliente_stats: {len(diferencias_clientes)} diferencia(s)")
+
+        diferencias = verificar_turno_totales(conn.cursor())
+        for d in diferencias:
+            print(f"  turno {d['turno_id']} {d['columna']}: "
+                  f"guardado {d['guardado']} / calculado {d['calculado']}")
+        print(f"[RESUMENES] turno_totales: {len(diferencias)} diferencia(s)")
+
+        diferencias_dia = verificar_ingresos_diarios(conn.cursor())
+        for d in diferencias_dia:
+            print(f"  {d['fecha']} {d['metodo_pago']} {d['tipo']} {d['columna']}: "
+                  f"guardado {d['guardado']} / calculado {d['calculado']}")
+        print(f"[RESUMENES] ingresos_diarios: {len(diferencias_dia)} diferencia(s)")
+        return 1 if diferencias_clientes or diferencias or diferencias_dia else 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    argumentos = sys.argv[1:]
+    accion = "verificar"
+    if argumentos and argumentos[0] in ("verificar", "reconstruir"):
+        accion = argumentos.pop(0)
+    sys.exit(_main(accion, argumentos[0] if argumentos else "database.db"))
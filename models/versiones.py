@@ -0,0 +1,91 @@
+"""
+Contadores de Versión Compartidos
+=================================
+Contadores monotónicos compartidos entre los workers de gunicorn.
+
+Viven en un archivo pequeño junto a la base de datos, mapeado en memoria
+(mmap), así que leer una versión cuesta lo mismo que leer una variable: no
+toca SQLite. Quien modifica datos cacheados incrementa su contador después
+del commit y los demás workers invalidan su caché al ver el cambio.
+"""
+import mmap
+import os
+import struct
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo hay un proceso (servidor de desarrollo)
+    fcntl = None
+
+
+# Cada contador ocupa 8 bytes en la posición de su nombre.
+# Agregar nuevos al final para no mover los existentes.
+CONTADORES = (
+    'configuracion',
+    'turnos',
+    'ocupacion',
+    'caja',
+    'eventos',
+    'clientes',
+    'estadias',
+)
+
+_CAPACIDAD = 64
+_FORMATO = '<Q'
+
+_archivo = None
+_mm = None
+_locales = {}
+_lock = threading.Lock()
+
+
+def _ruta(db_path):
+    return db_path + '.versiones'
+
+
+def iniciar_versiones(db_path):
+    """Abre (o crea) el archivo de contadores de esta base de datos"""
+    global _archivo, _mm
+
+    ruta = _ruta(db_path)
+    with _lock:
+        if _mm is not None and _archivo.name == ruta:
+            return
+        if not os.path.exists(ruta):
+            open(ruta, 'ab').close()
+        archivo = open(ruta, 'r+b')
+        if os.path.getsize(ruta) < _CAPACIDAD * 8:
+            archivo.truncate(_CAPACIDAD * 8)
+        _archivo = archivo
+        _mm = mmap.mmap(archivo.fileno(), _CAPACIDAD * 8)
+
+
+def _posicion(nombre):
+    return CONTADORES.index(nombre) * 8
+
+
+def leer_version(nombre):
+    """Valor actual del contador `nombre`"""
+    if _mm is None:
+        return _locales.get(nombre, 0)
+    return struct.unpack_from(_FORMATO, _mm, _posicion(nombre))[0]
+
+
+def incrementar_version(nombre):
+    """Incrementa el contador `nombre` y devuelve el nuevo valor"""
+    with _lock:
+        if _mm is None:
+            _locales[nombre] = _locales.get(nombre, 0) + 1
+            return _locales[nombre]
+
+        posicion = _posicion(nombre)
+        if fcntl is not None:
+            fcntl.lockf(_archivo, fcntl.LOCK_EX, 8, posicion)
+        try:
+            valor = struct.unpack_from(_FORMATO, _mm, posicion)[0] + 1
+            struct.pack_into(_FORMATO, _mm, posicion, valor)
+            return valor
+        finally:
+            if fcntl is not None:
+                fcntl.lockf(_archivo, fcntl.LOCK_UN, 8, posicion)
@@ -3,14 +3,37 @@ Rutas de Administración
 =======================
 Dashboard admin, gestión de usuarios y configuración.
 """
-from flask import Blueprint, render_template, session, jsonify, request, make_response, send_file
+from flask import Blueprint, render_template, session, jsonify, request, current_app, Response, stream_with_context, send_file
 from werkzeug.security import generate_password_hash
-from datetime import datetime
+from datetime import datetime, timedelta
+import calendar
 import sqlite3
-import io
-
-from models.database import get_db
-from utils.helpers import admin_required, login_required
+import os
+
+from models.database import get_db, estadisticas_db
+from models.backup import snapshot_temporal
+from models.fechas import filtro_fechas
+from models.resumenes import (
+    verificar_cliente_stats, reconstruir_cliente_stats,
+    verificar_turno_totales, reconstruir_turno_totales,
+    verificar_ingresos_diarios, reconstruir_ingresos_diarios
+)
+from utils.helpers import admin_required, login_required, invalidar_configuracion, invalidar_caja, calcular_cobros_activos
+from utils.helpers import ingresos_rango, ingresos_por_periodo, ingresos_por_tipo
+from utils.ocupacion import total_ocupados, actualizar_ocupacion
+from utils.ocupacion_historica import serie_ocupacion
+from utils.estadias import autos_en_momento as buscar_autos_en_momento, turno_en_momento, invalidar_estadias
+from utils.busqueda import filtro_clientes
+from utils.placas import actualizar_placas
+from utils.paginacion import leer_paginacion, pagina_keyset, contar
+from utils.reportes import datos_reporte, reporte_archivado
+from utils.exportacion import (
+    FORMATOS, ENCABEZADOS_HISTORIAL, consulta_historial,
+    xlsx_temporal, generar_csv, leer_y_borrar, EXPORTACIONES
+)
+from utils.cola_exportacion import (
+    solicitar_exportacion, leer_estado, directorio_exportaciones, ruta_resultado
+)
 
 # Crear el Blueprint
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -28,44 +51,17 @@ def admin_dashboard():
         db = get_db()
         cursor = db.cursor()
         
-        hoy = datetime.now().strftime("%Y-%m-%d")
-        mes_actual = datetime.now().strftime("%Y-%m")
-        
-        # Ingresos del día
-        cursor.execute("""
-            SELECT 
-                IFNULL(SUM(CASE WHEN metodo_pago = 'efectivo' THEN monto ELSE 0 END), 0) as efectivo,
-                IFNULL(SUM(CASE WHEN metodo_pago = 'yape' THEN monto ELSE 0 END), 0) as yape,
-                IFNULL(SUM(monto), 0) as total
-            FROM movimientos_caja
-            WHERE date(fecha_movimiento) = ?
-        """, (hoy,))
-        ingresos_dia = cursor.fetchone()
-        
-        # Ingresos del mes
-        cursor.execute("""
-            SELECT 
-                IFNULL(SUM(CASE WHEN metodo_pago = 'efectivo' THEN monto ELSE 0 END), 0) as efectivo,
-                IFNULL(SUM(CASE WHEN metodo_pago = 'yape' THEN monto ELSE 0 END), 0) as yape,
-                IFNULL(SUM(monto), 0) as total
-            FROM movimientos_caja
-            WHERE strftime('%Y-%m', fecha_movimiento) = ?
-        """, (mes_actual,))
-        ingresos_mes = cursor.fetchone()
-        
-        # Total histórico
-        cursor.execute("""
-            SELECT 
-                IFNULL(SUM(CASE WHEN metodo_pago = 'efectivo' THEN monto ELSE 0 END), 0) as efectivo,
-                IFNULL(SUM(CASE WHEN metodo_pago = 'yape' THEN monto ELSE 0 END), 0) as yape,
-                IFNULL(SUM(monto), 0) as total
-            FROM movimientos_caja
-        """)
-        total_historico = cursor.fetchone()
-        
+        ahora = datetime.now()
+        hoy = ahora.strftime("%Y-%m-%d")
+        ultimo_dia_mes = calendar.monthrange(ahora.year, ahora.month)[1]
+
+        # Ingresos del día, del mes e histórico (tabla ingresos_diarios)
+        ingresos_dia = ingresos_rango(hoy, hoy)
+        ingresos_mes = ingresos_rango(ahora.strftime("%Y-%m-01"), ahora.strftime(f"%Y-%m-{ultimo_dia_mes:02d}"))
+        total_historico = ingresos_rango()
+
         # Estadísticas
-        cursor.execute("SELECT COUNT(*) FROM entradas WHERE salio = 0")
-        autos_en_cochera = cursor.fetchone()[0]
+        autos_en_cochera = total_ocupados()
         
         cursor.execute("SELECT COUNT(*) FROM clientes")
         total_clientes = cursor.fetchone()[0]
@@ -74,27 +70,19 @@ def admin_dashboard():
         total_trabajadores = cursor.fetchone()[0]
         
         # Ingresos de la semana
-        cursor.execute("""
-            SELECT 
-                date(fecha_movimiento) as fecha,
-                SUM(monto) as total
-            FROM movimientos_caja
-            WHERE fecha_movimiento >= date('now', '-7 days')
-            GROUP BY date(fecha_movimiento)
-            ORDER BY fecha
-        """)
-        ingresos_semana = cursor.fetchall()
+        hace_7_dias = (ahora - timedelta(days=7)).strftime("%Y-%m-%d")
+        ingresos_semana = ingresos_por_periodo(hace_7_dias, hoy)
 
         return render_template(
             "admin_dashboard.html",
             nombre=session["nombre"],
-            ingresos_dia=dict(ingresos_dia),
-            ingresos_mes=dict(ingresos_mes),
-            total_historico=dict(total_historico),
+            ingresos_dia=ingresos_dia,
+            ingresos_mes=ingresos_mes,
+            total_historico=total_historico,
             autos_en_cochera=autos_en_cochera,
             total_clientes=total_clientes,
             total_trabajadores=total_trabajadores,
-            ingresos_semana=[dict(i) for i in ingresos_semana]
+            ingresos_semana=ingresos_semana
         )
 
     except Exception as e:
@@ -102,6 +90,81 @@ def admin_dashboard():
         return "Error al cargar dashboard", 500
 
 
+@admin_bp.route("/ingresos")
+@admin_required
+def ingresos():
+    """
+    Ingresos entre dos fechas (inclusive) agrupados por día o por mes,
+    con el desglose por tipo de movimiento.
+    """
+    try:
+        fecha_desde = request.args.get('fecha_desde', '') or None
+        fecha_hasta = request.args.get('fecha_hasta', '') or None
+        agrupar = request.args.get('agrupar', 'dia')
+
+        return jsonify({
+            "ok": True,
+            "ingresos": ingresos_por_periodo(fecha_desde, fecha_hasta, agrupar),
+            "por_tipo": ingresos_por_tipo(fecha_desde, fecha_hasta),
+            "totales": ingresos_rango(fecha_desde, fecha_hasta)
+        })
+
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)})
+
+
+@admin_bp.route("/ocupacion")
+@admin_required
+def ocupacion():
+    """
+    Ocupación de la cochera entre dos fechas (inclusive): promedio y pico
+    por hora, por día o por día de la semana y hora (mapa de calor).
+    Por defecto, las últimas 4 semanas.
+    """
+    try:
+        hoy = datetime.now()
+        fecha_desde = request.args.get('fecha_desde', '') or (hoy - timedelta(days=27)).strftime("%Y-%m-%d")
+        fecha_hasta = request.args.get('fecha_hasta', '') or hoy.strftime("%Y-%m-%d")
+        agrupar = request.args.get('agrupar', 'dia')
+
+        resultado = serie_ocupacion(fecha_desde, fecha_hasta, agrupar)
+        return jsonify({
+            "ok": True,
+            "fecha_desde": fecha_desde,
+            "fecha_hasta": fecha_hasta,
+            "ocupacion": resultado["serie"],
+            "resumen": resultado["resumen"]
+        })
+
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)})
+
+
+@admin_bp.route("/autos_en_momento")
+@admin_required
+def autos_en_momento():
+    """
+    Autos que estaban en la cochera en un momento pasado (?momento=
+    YYYY-MM-DD HH:MM), con el trabajador que los recibió, su estado de
+    pago a esa hora y el turno que estaba en curso.
+    """
+    try:
+        momento = datetime.fromisoformat(request.args.get('momento', ''))
+        autos = buscar_autos_en_momento(momento)
+        return jsonify({
+            "ok": True,
+            "momento": momento.strftime("%Y-%m-%d %H:%M:%S"),
+            "turno": turno_en_momento(momento),
+            "total": len(autos),
+            "autos": autos
+        })
+
+    except ValueError:
+        return jsonify({"ok": False, "error": "Fecha y hora no válidas"})
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)})
+
+
 # ============================================
 # TURNO ACTIVO
 # ============================================
@@ -237,6 +300,7 @@ def editar_usuario():
             ))
         
         db.commit()
+        actualizar_ocupacion(recargar=True)
         return jsonify({"ok": True, "mensaje": "Usuario actualizado"})
         
     except sqlite3.IntegrityError:
@@ -294,6 +358,7 @@ def guardar_configuracion():
             """, (valor, clave))
         
         db.commit()
+        invalidar_configuracion()
         return jsonify({"ok": True, "mensaje": "Configuración guardada"})
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)})
@@ -315,8 +380,7 @@ def historial_vehiculos():
         filtro_fecha_desde = request.args.get('fecha_desde', '')
         filtro_fecha_hasta = request.args.get('fecha_hasta', '')
         filtro_estado = request.args.get('estado', '')
-        pagina = int(request.args.get('pagina', 1))
-        por_pagina = int(request.args.get('por_pagina', 50))
+        por_pagina, despues, con_total = leer_paginacion(request.args, 50)
         
         query = """
             SELECT 
@@ -326,6 +390,7 @@ def historial_vehiculos():
                 c.celular,
                 e.fecha_entrada,
                 e.hora_entrada,
+                e.entrada_epoch,
                 e.fecha_salida,
                 e.hora_salida_real,
                 e.dias,
@@ -339,12 +404,10 @@ def historial_vehiculos():
                 e.pago_completo_adelantado,
                 e.salio,
                 e.observaciones,
+                e.fecha_hasta,
+                e.hora_salida_esperada,
                 t1.nombre as trabajador_entrada,
-                t2.nombre as trabajador_salida,
-                CASE
-                    WHEN e.salio = 0 THEN MAX(1, CAST((julianday(datetime('now', 'localtime')) - julianday(e.fecha_entrada)) + 0.5 AS INTEGER))
-                    ELSE e.dias
-                END as dias_reales
+                t2.nombre as trabajador_salida
             FROM entradas e
             JOIN clientes c ON e.cliente_id = c.id
             LEFT JOIN trabajadores t1 ON e.trabajador_id = t1.id
@@ -354,33 +417,33 @@ def historial_vehiculos():
         params = []
         
         if filtro_placa:
-            query += " AND c.placa LIKE ?"
-            params.append(f"%{filtro_placa}%")
-        
-        if filtro_fecha_desde:
-            query += " AND e.fecha_entrada >= ?"
-            params.append(filtro_fecha_desde)
+            condicion, valores = filtro_clientes(filtro_placa)
+            query += condicion
+            params.extend(valores)
         
-        if filtro_fecha_hasta:
-            query += " AND e.fecha_entrada <= ?"
-            params.append(filtro_fecha_hasta)
+        condicion, valores = filtro_fechas("e.entrada_epoch", filtro_fecha_desde, filtro_fecha_hasta)
+        query += condicion
+        params.extend(valores)
         
         if filtro_estado == 'en_cochera':
             query += " AND e.salio = 0"
         elif filtro_estado == 'salieron':
             query += " AND e.salio = 1"
         
-        # Contar total
-        count_query = f"SELECT COUNT(*) FROM ({query})"
-        cursor.execute(count_query, params)
-        total = cursor.fetchone()[0]
+        total = contar(cursor, query, params) if con_total else None
         
-        # Ordenar y paginar
-        query += " ORDER BY e.fecha_entrada DESC, e.hora_entrada DESC"
-        query += f" LIMIT {por_pagina} OFFSET {(pagina - 1) * por_pagina}"
-        
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
+        # Página siguiente a la última fila vista (índice idx_entradas_fecha)
+        rows, siguiente = pagina_keyset(cursor, query, params, [
+            ("e.entrada_epoch", "entrada_epoch"),
+            ("e.id", "id")
+        ], por_pagina, despues)
+
+        # Días reales de los que siguen en cochera, con el mismo "ahora"
+        activos = [r for r in rows if not r["salio"]]
+        dias_activos = {
+            r["id"]: cobro["dias_reales"]
+            for r, cobro in zip(activos, calcular_cobros_activos(activos))
+        }
         
         historial = []
         for r in rows:
@@ -394,7 +457,7 @@ def historial_vehiculos():
                 "fecha_salida": r["fecha_salida"],
                 "hora_salida": r["hora_salida_real"],
                 "dias": r["dias"],
-                "dias_reales": r["dias_reales"],
+                "dias_reales": dias_activos.get(r["id"], r["dias"]),
                 "precio_dia": r["precio_dia"],
                 "monto": r["monto"],
                 "adelanto": r["adelanto"],
@@ -413,9 +476,8 @@ def historial_vehiculos():
             "ok": True,
             "historial": historial,
             "total": total,
-            "pagina": pagina,
             "por_pagina": por_pagina,
-            "total_paginas": (total + por_pagina - 1) // por_pagina
+            "siguiente": siguiente
         })
         
     except Exception as e:
@@ -426,128 +488,123 @@ def historial_vehiculos():
 @admin_bp.route("/exportar_historial")
 @login_required
 def exportar_historial():
-    """Exporta el historial a Excel"""
+    """Exporta el historial a Excel (?formato=xlsx) o CSV (?formato=csv o csv.gz)"""
+    formato = request.args.get('formato', 'xlsx')
+    if formato not in FORMATOS:
+        return jsonify({"ok": False, "error": f"Formato no válido: {formato}"})
+
     try:
-        try:
-            from openpyxl import Workbook
-            from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-        except ImportError:
-            return jsonify({"ok": False, "error": "Módulo openpyxl no instalado"})
-        
         db = get_db()
         cursor = db.cursor()
-        
-        filtro_placa = request.args.get('placa', '').upper()
-        filtro_fecha_desde = request.args.get('fecha_desde', '')
-        filtro_fecha_hasta = request.args.get('fecha_hasta', '')
-        filtro_estado = request.args.get('estado', '')
-        
-        query = """
-            SELECT 
-                c.placa,
-                c.nombre as cliente,
-                c.celular,
-                e.fecha_entrada,
-                e.hora_entrada,
-                e.fecha_salida,
-                e.hora_salida_real as hora_salida,
-                e.dias,
-                e.precio_dia,
-                e.monto,
-                e.adelanto,
-                e.penalidad,
-                e.descuento,
-                e.metodo_pago,
-                CASE WHEN e.salio = 1 THEN 'Sí' ELSE 'No' END as salio,
-                CASE WHEN e.pagado = 1 THEN 'Sí' ELSE 'No' END as pagado,
-                t1.nombre as trabajador_entrada,
-                t2.nombre as trabajador_salida,
-                e.observaciones
-            FROM entradas e
-            JOIN clientes c ON e.cliente_id = c.id
-            LEFT JOIN trabajadores t1 ON e.trabajador_id = t1.id
-            LEFT JOIN trabajadores t2 ON e.trabajador_salida_id = t2.id
-            WHERE 1=1
-        """
-        params = []
-        
-        if filtro_placa:
-            query += " AND c.placa LIKE ?"
-            params.append(f"%{filtro_placa}%")
-        if filtro_fecha_desde:
-            query += " AND e.fecha_entrada >= ?"
-            params.append(filtro_fecha_desde)
-        if filtro_fecha_hasta:
-            query += " AND e.fecha_entrada <= ?"
-            params.append(filtro_fecha_hasta)
-        if filtro_estado == 'en_cochera':
-            query += " AND e.salio = 0"
-        elif filtro_estado == 'salieron':
-            query += " AND e.salio = 1"
-        
-        query += " ORDER BY e.fecha_entrada DESC"
-        
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
-        
-        # Crear Excel
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Historial"
-        
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="1F2937", end_color="1F2937", fill_type="solid")
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
+
+        query, params = consulta_historial(
+            request.args.get('placa', ''),
+            request.args.get('fecha_desde', ''),
+            request.args.get('fecha_hasta', ''),
+            request.args.get('estado', '')
         )
-        
-        headers = ['Placa', 'Cliente', 'Celular', 'F. Entrada', 'H. Entrada', 
-                   'F. Salida', 'H. Salida', 'Días', 'Precio/Día', 'Monto Total',
-                   'Adelanto', 'Penalidad', 'Descuento', 'Método Pago', 'Salió', 
-                   'Pagado', 'Trabajador Entrada', 'Trabajador Salida', 'Observaciones']
-        
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal='center')
-            cell.border = thin_border
-        
-        for row_idx, row in enumerate(rows, 2):
-            for col_idx, value in enumerate(dict(row).values(), 1):
-                cell = ws.cell(row=row_idx, column=col_idx, value=value)
-                cell.border = thin_border
-        
-        # Ajustar anchos
-        for col in ws.columns:
-            max_length = 0
-            column = col[0].column_letter
-            for cell in col:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            ws.column_dimensions[column].width = min(max_length + 2, 30)
-        
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        response = make_response(output.getvalue())
-        response.headers['Content-Type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        response.headers['Content-Disposition'] = f'attachment; filename=historial_cochera_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-        
-        return response
-        
+        cursor.execute(query, params)
+
+        tipo, extension = FORMATOS[formato]
+        headers = {
+            "Content-Disposition": f'attachment; filename=historial_cochera_{datetime.now().strftime("%Y%m%d_%H%M%S")}{extension}'
+        }
+
+        if formato == "xlsx":
+            try:
+                ruta = xlsx_temporal(ENCABEZADOS_HISTORIAL, cursor)
+            except ImportError:
+                return jsonify({"ok": False, "error": "Módulo openpyxl no instalado"})
+            headers["Content-Length"] = str(os.path.getsize(ruta))
+            return Response(leer_y_borrar(ruta), content_type=tipo, headers=headers)
+
+        # CSV: se genera mientras se envía, leyendo el cursor por bloques
+        filas = generar_csv(ENCABEZADOS_HISTORIAL, cursor, comprimir=(formato == "csv.gz"))
+        return Response(stream_with_context(filas), content_type=tipo, headers=headers)
+
     except Exception as e:
         print(f"Error exportando: {e}")
         return jsonify({"ok": False, "error": str(e)})
 
 
+# ============================================
+# EXPORTACIONES EN SEGUNDO PLANO
+# ============================================
+
+def _puede_exportar(tipo):
+    definicion = EXPORTACIONES.get(tipo)
+    return definicion is not None and (session.get("es_admin") or not definicion["solo_admin"])
+
+
+def _estado_exportacion(estado):
+    respuesta = {
+        clave: estado[clave]
+        for clave in ("id", "tipo", "formato", "estado", "filas", "total", "tamano", "creado", "terminado", "error")
+    }
+    if estado["estado"] == "listo":
+        respuesta["url"] = f"/admin/exportaciones/{estado['id']}/descargar"
+    return respuesta
+
+
+@admin_bp.route("/exportaciones", methods=["POST"])
+@login_required
+def nueva_exportacion():
+    """
+    Encola una exportación (historial, reportes_turnos o clientes) y
+    devuelve su id al instante. Pedidos iguales comparten el mismo trabajo.
+    """
+    data = request.json or {}
+    tipo = data.get("tipo", "")
+    if not _puede_exportar(tipo):
+        return jsonify({"ok": False, "error": "Exportación no permitida"}), 403
+
+    try:
+        estado = solicitar_exportacion(
+            current_app._get_current_object(),
+            tipo,
+            data.get("formato", "xlsx"),
+            data.get("filtros") or {}
+        )
+        return jsonify({"ok": True, "exportacion": _estado_exportacion(estado)})
+
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)})
+
+
+@admin_bp.route("/exportaciones/<trabajo_id>")
+@login_required
+def estado_exportacion(trabajo_id):
+    """Estado y progreso de una exportación"""
+    estado = leer_estado(directorio_exportaciones(current_app.config), trabajo_id)
+    if not estado or not _puede_exportar(estado["tipo"]):
+        return jsonify({"ok": False, "error": "Exportación no encontrada"})
+    return jsonify({"ok": True, "exportacion": _estado_exportacion(estado)})
+
+
+@admin_bp.route("/exportaciones/<trabajo_id>/descargar")
+@login_required
+def descargar_exportacion(trabajo_id):
+    """Descarga el archivo de una exportación terminada"""
+    directorio = directorio_exportaciones(current_app.config)
+    estado = leer_estado(directorio, trabajo_id)
+    if not estado or not _puede_exportar(estado["tipo"]) or estado["estado"] != "listo":
+        return "Exportación no disponible", 404
+
+    ruta = ruta_resultado(directorio, estado)
+    if not os.path.exists(ruta):
+        return "Exportación vencida", 404
+
+    tipo, extension = FORMATOS[estado["formato"]]
+    fecha = estado["terminado"].replace("-", "").replace(":", "").replace(" ", "_")
+    return send_file(
+        ruta,
+        mimetype=tipo,
+        as_attachment=True,
+        download_name=f"{estado['tipo']}_cochera_{fecha}{extension}",
+        conditional=True
+    )
+
+
 @admin_bp.route("/reportes_turnos")
 @admin_required
 def reportes_turnos():
@@ -559,8 +616,7 @@ def reportes_turnos():
         filtro_trabajador = request.args.get('trabajador_id', '')
         filtro_fecha_desde = request.args.get('fecha_desde', '')
         filtro_fecha_hasta = request.args.get('fecha_hasta', '')
-        pagina = int(request.args.get('pagina', 1))
-        por_pagina = int(request.args.get('por_pagina', 20))
+        por_pagina, despues, con_total = leer_paginacion(request.args, 20)
 
         query = """
             SELECT
@@ -568,17 +624,19 @@ def reportes_turnos():
                 t.trabajador_id,
                 tr.nombre as trabajador,
                 t.fecha_inicio,
+                t.inicio_epoch,
                 t.fecha_fin,
                 t.estado,
-                IFNULL(t.total_efectivo, 0) as total_efectivo,
-                IFNULL(t.total_yape, 0) as total_yape,
-                IFNULL(t.total_efectivo, 0) + IFNULL(t.total_yape, 0) as total,
+                IFNULL(t.total_efectivo_centimos, 0) / 100.0 as total_efectivo,
+                IFNULL(t.total_yape_centimos, 0) / 100.0 as total_yape,
+                (IFNULL(t.total_efectivo_centimos, 0) + IFNULL(t.total_yape_centimos, 0)) / 100.0 as total,
                 t.efectivo_declarado,
-                IFNULL(t.efectivo_declarado, 0) - IFNULL(t.total_efectivo, 0) as diferencia,
+                (IFNULL(t.efectivo_declarado_centimos, 0) - IFNULL(t.total_efectivo_centimos, 0)) / 100.0 as diferencia,
                 t.observaciones,
-                (SELECT COUNT(*) FROM movimientos_caja m WHERE m.turno_id = t.id) as num_movimientos
+                IFNULL(tt.num_movimientos, 0) as num_movimientos
             FROM turnos t
             JOIN trabajadores tr ON t.trabajador_id = tr.id
+            LEFT JOIN turno_totales tt ON tt.turno_id = t.id
             WHERE 1=1
         """
         params = []
@@ -586,22 +644,17 @@ def reportes_turnos():
         if filtro_trabajador:
             query += " AND t.trabajador_id = ?"
             params.append(int(filtro_trabajador))
-        if filtro_fecha_desde:
-            query += " AND date(t.fecha_inicio) >= ?"
-            params.append(filtro_fecha_desde)
-        if filtro_fecha_hasta:
-            query += " AND date(t.fecha_inicio) <= ?"
-            params.append(filtro_fecha_hasta)
-
-        count_query = f"SELECT COUNT(*) FROM ({query})"
-        cursor.execute(count_query, params)
-        total = cursor.fetchone()[0]
+        condicion, valores = filtro_fechas("t.inicio_epoch", filtro_fecha_desde, filtro_fecha_hasta)
+        query += condicion
+        params.extend(valores)
 
-        query += " ORDER BY t.fecha_inicio DESC"
-        query += f" LIMIT {por_pagina} OFFSET {(pagina - 1) * por_pagina}"
+        total = contar(cursor, query, params) if con_total else None
 
-        cursor.execute(query, params)
-        turnos = [dict(r) for r in cursor.fetchall()]
+        filas, siguiente = pagina_keyset(cursor, query, params, [
+            ("t.inicio_epoch", "inicio_epoch"),
+            ("t.id", "id")
+        ], por_pagina, despues)
+        turnos = [dict(r) for r in filas]
 
         # Lista de trabajadores para el filtro
         cursor.execute("SELECT id, nombre FROM trabajadores WHERE activo = 1 ORDER BY nombre")
@@ -612,9 +665,8 @@ def reportes_turnos():
             "turnos": turnos,
             "trabajadores": trabajadores,
             "total": total,
-            "pagina": pagina,
             "por_pagina": por_pagina,
-            "total_paginas": (total + por_pagina - 1) // por_pagina
+            "siguiente": siguiente
         })
 
     except Exception as e:
@@ -630,42 +682,22 @@ def detalle_turno(turno_id):
         db = get_db()
         cursor = db.cursor()
 
-        cursor.execute("""
-            SELECT t.*, tr.nombre as trabajador
-            FROM turnos t
-            JOIN trabajadores tr ON t.trabajador_id = tr.id
-            WHERE t.id = ?
-        """, (turno_id,))
-        turno = cursor.fetchone()
-        if not turno:
+        # Cerrado: reporte archivado; abierto: en vivo
+        datos = reporte_archivado(turno_id) or datos_reporte(cursor, turno_id)
+        if not datos:
             return jsonify({"ok": False, "error": "Turno no encontrado"})
 
-        cursor.execute("""
-            SELECT
-                m.*,
-                c.placa,
-                c.nombre as cliente
-            FROM movimientos_caja m
-            LEFT JOIN entradas e ON m.entrada_id = e.id
-            LEFT JOIN clientes c ON e.cliente_id = c.id
-            WHERE m.turno_id = ?
-            ORDER BY m.fecha_movimiento DESC
-        """, (turno_id,))
-        movimientos = [dict(m) for m in cursor.fetchall()]
-
-        cursor.execute("""
-            SELECT
-                IFNULL(SUM(CASE WHEN tipo LIKE '%ADELANTO%' OR tipo = 'PAGO_COMPLETO' THEN monto ELSE 0 END), 0) as total_adelantos,
-                IFNULL(SUM(CASE WHEN tipo = 'COBRO_SALIDA' THEN monto ELSE 0 END), 0) as total_cobros,
-                IFNULL(SUM(CASE WHEN tipo = 'PENALIDAD' THEN monto ELSE 0 END), 0) as total_penalidades
-            FROM movimientos_caja WHERE turno_id = ?
-        """, (turno_id,))
-        desglose = dict(cursor.fetchone())
+        stats = datos["stats"]
+        desglose = {
+            "total_adelantos": stats["total_adelantos"],
+            "total_cobros": stats["total_cobros"],
+            "total_penalidades": stats["total_penalidades"]
+        }
 
         return jsonify({
             "ok": True,
-            "turno": dict(turno),
-            "movimientos": movimientos,
+            "turno": datos["turno"],
+            "movimientos": datos["movimientos"],
             "desglose": desglose
         })
 
@@ -738,8 +770,7 @@ def listar_clientes():
         cursor = db.cursor()
 
         busqueda = request.args.get('busqueda', '').strip().upper()
-        pagina = int(request.args.get('pagina', 1))
-        por_pagina = int(request.args.get('por_pagina', 50))
+        por_pagina, despues, con_total = leer_paginacion(request.args, 50)
 
         query = """
             SELECT
@@ -749,40 +780,41 @@ def listar_clientes():
                 c.celular,
                 c.precio_dia,
                 c.fecha_actualizacion,
-                COUNT(e.id) as total_visitas,
-                MAX(e.fecha_entrada) as ultima_visita,
-                SUM(CASE WHEN e.salio = 0 THEN 1 ELSE 0 END) as entradas_activas
+                IFNULL(c.fecha_actualizacion, '') as orden_actualizacion,
+                IFNULL(s.total_visitas, 0) as total_visitas,
+                s.ultima_visita,
+                IFNULL(s.entradas_activas, 0) as entradas_activas,
+                IFNULL(s.total_gastado_centimos, 0) / 100.0 as total_gastado,
+                IFNULL(s.deuda_actual_centimos, 0) / 100.0 as deuda_actual
             FROM clientes c
-            LEFT JOIN entradas e ON c.id = e.cliente_id
+            LEFT JOIN cliente_stats s ON s.cliente_id = c.id
             WHERE 1=1
         """
+        filtro = ""
         params = []
 
         if busqueda:
-            query += " AND (c.placa LIKE ? OR c.nombre LIKE ?)"
-            params.extend([f"%{busqueda}%", f"%{busqueda}%"])
+            filtro, params = filtro_clientes(busqueda, ("placa", "nombre"))
+        query += filtro
 
-        query += " GROUP BY c.id"
+        # Contar total (sin estadísticas: solo clientes)
+        total = None
+        if con_total:
+            cursor.execute(f"SELECT COUNT(*) FROM clientes c WHERE 1=1{filtro}", params)
+            total = cursor.fetchone()[0]
 
-        # Contar total
-        count_query = f"SELECT COUNT(*) FROM ({query})"
-        cursor.execute(count_query, params)
-        total = cursor.fetchone()[0]
-
-        # Ordenar y paginar
-        query += " ORDER BY c.fecha_actualizacion DESC"
-        query += f" LIMIT {por_pagina} OFFSET {(pagina - 1) * por_pagina}"
-
-        cursor.execute(query, params)
-        clientes = [dict(c) for c in cursor.fetchall()]
+        filas, siguiente = pagina_keyset(cursor, query, params, [
+            ("IFNULL(c.fecha_actualizacion, '')", "orden_actualizacion"),
+            ("c.id", "id")
+        ], por_pagina, despues)
+        clientes = [dict(c) for c in filas]
 
         return jsonify({
             "ok": True,
             "clientes": clientes,
             "total": total,
-            "pagina": pagina,
             "por_pagina": por_pagina,
-            "total_paginas": (total + por_pagina - 1) // por_pagina
+            "siguiente": siguiente
         })
 
     except Exception as e:
@@ -823,7 +855,9 @@ def crear_cliente():
         ))
 
         db.commit()
-        return jsonify({"ok": True, "mensaje": "Cliente creado exitosamente", "id": cursor.lastrowid})
+        cliente_id = cursor.lastrowid
+        actualizar_placas([cliente_id])
+        return jsonify({"ok": True, "mensaje": "Cliente creado exitosamente", "id": cliente_id})
 
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)})
@@ -872,6 +906,8 @@ def editar_cliente():
         ))
 
         db.commit()
+        actualizar_placas([data["id"]])
+        actualizar_ocupacion(cliente_id=int(data["id"]))
         return jsonify({"ok": True, "mensaje": "Cliente actualizado"})
 
     except Exception as e:
@@ -902,6 +938,9 @@ def eliminar_cliente(id):
         cursor.execute("DELETE FROM clientes WHERE id = ?", (id,))
 
         db.commit()
+        actualizar_placas([id])
+        invalidar_caja()
+        invalidar_estadias()
         return jsonify({"ok": True, "mensaje": "Cliente eliminado"})
 
     except Exception as e:
@@ -911,18 +950,77 @@ def eliminar_cliente(id):
 # ============================================
 # BACKUP BASE DE DATOS
 # ============================================
+@admin_bp.route("/estado_db")
+@admin_required
+def estado_db():
+    """Estadísticas del pool de conexiones de este worker"""
+    return jsonify({"ok": True, "pool": estadisticas_db()})
+
+
+@admin_bp.route("/verificar_totales", methods=["GET", "POST"])
+@admin_required
+def verificar_totales():
+    """
+    Compara turno_totales e ingresos_diarios con los totales recalculados
+    desde el libro de caja, y cliente_stats con las entradas. GET solo
+    compara; POST además reconstruye las que tengan diferencias. Con
+    ?turno_id= solo revisa ese turno.
+    """
+    try:
+        db = get_db()
+        cursor = db.cursor()
+
+        turno_id = request.args.get("turno_id", type=int)
+        diferencias = verificar_turno_totales(cursor, turno_id)
+        diferencias_diarias = verificar_ingresos_diarios(cursor) if turno_id is None else []
+        diferencias_clientes = verificar_cliente_stats(cursor) if turno_id is None else []
+
+        corregido = False
+        if (diferencias or diferencias_diarias or diferencias_clientes) and request.method == "POST":
+            if diferencias_clientes:
+                reconstruir_cliente_stats(cursor)
+                print(f"[RESUMENES] cliente_stats reconstruida ({len(diferencias_clientes)} diferencia(s))")
+            if diferencias:
+                reconstruir_turno_totales(cursor)
+                print(f"[RESUMENES] turno_totales reconstruida ({len(diferencias)} diferencia(s))")
+            if diferencias_diarias:
+                reconstruir_ingresos_diarios(cursor)
+                print(f"[RESUMENES] ingresos_diarios reconstruida ({len(diferencias_diarias)} diferencia(s))")
+            db.commit()
+            invalidar_caja()
+            corregido = True
+
+        return jsonify({
+            "ok": True,
+            "consistente": not diferencias and not diferencias_diarias and not diferencias_clientes,
+            "diferencias": diferencias,
+            "diferencias_diarias": diferencias_diarias,
+            "diferencias_clientes": diferencias_clientes,
+            "corregido": corregido
+        })
+
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)})
+
+
 @admin_bp.route("/backup_db")
 @admin_required
 def backup_db():
-    """Descarga una copia de la base de datos"""
-    import os
-    from flask import current_app
+    """Descarga una copia consistente de la base de datos"""
     db_path = current_app.config.get('DATABASE_PATH', 'database.db')
     if not os.path.exists(db_path):
         return "Base de datos no encontrada", 404
+
+    comprimir = request.args.get('gz') == '1'
+    try:
+        ruta = snapshot_temporal(db_path, comprimir=comprimir)
+    except Exception as e:
+        print(f"Error creando backup: {e}")
+        return "Error al crear backup", 500
+
     fecha = datetime.now().strftime("%Y%m%d_%H%M%S")
-    return send_file(
-        db_path,
-        as_attachment=True,
-        download_name=f"cochera_backup_{fecha}.db"
-    )
+    extension = ".db.gz" if comprimir else ".db"
+    return Response(leer_y_borrar(ruta), mimetype="application/octet-stream", headers={
+        "Content-Disposition": f"attachment; filename=cochera_backup_{fecha}{extension}",
+        "Content-Length": str(os.path.getsize(ruta))
+    })
@@ -3,11 +3,17 @@ Rutas del Dashboard (Trabajador)
 ================================
 Dashboard principal y funciones del trabajador.
 """
-from flask import Blueprint, render_template, session, jsonify, request, redirect
-from datetime import datetime
+from flask import Blueprint, render_template, session, jsonify, request, redirect, current_app, Response
 
 from models.database import get_db
-from utils.helpers import login_required
+from models.dinero import a_centimos, a_soles
+from models.fechas import filtro_fechas
+from models.pool import obtener_pool
+from utils.helpers import login_required, respuesta_versionada, invalidar_turnos, formato_movimiento, totales_turno
+from utils.ocupacion import total_ocupados
+from utils.eventos import publicar_evento, flujo_eventos
+from utils.paginacion import leer_paginacion, pagina_keyset, contar
+from utils.reportes import datos_reporte, renderizar_reporte, archivar_reporte, reporte_archivado, respuesta_reporte
 
 # Crear el Blueprint
 dashboard_bp = Blueprint('dashboard', __name__)
@@ -18,49 +24,18 @@ dashboard_bp = Blueprint('dashboard', __name__)
 def dashboard():
     """Dashboard principal del trabajador"""
     try:
-        db = get_db()
-        cursor = db.cursor()
-        
         turno_id = session.get("turno_id")
 
-        # Total efectivo del turno
-        cursor.execute("""
-            SELECT IFNULL(SUM(monto), 0)
-            FROM movimientos_caja
-            WHERE turno_id = ? AND metodo_pago = 'efectivo'
-        """, (turno_id,))
-        total_efectivo = cursor.fetchone()[0]
-        
-        # Total yape del turno
-        cursor.execute("""
-            SELECT IFNULL(SUM(monto), 0)
-            FROM movimientos_caja
-            WHERE turno_id = ? AND metodo_pago = 'yape'
-        """, (turno_id,))
-        total_yape = cursor.fetchone()[0]
-        
-        total_turno = total_efectivo + total_yape
-
-        # Autos ingresados en el turno
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM entradas
-            WHERE trabajador_id = ?
-            AND fecha_registro >= ?
-        """, (session["trabajador_id"], session["inicio_turno"]))
-        autos_ingresados = cursor.fetchone()[0]
-        
-        # Autos que salieron en el turno
-        cursor.execute("""
-            SELECT COUNT(*)
-            FROM movimientos_caja
-            WHERE turno_id = ? AND tipo = 'COBRO_SALIDA'
-        """, (turno_id,))
-        autos_salieron = cursor.fetchone()[0]
+        # Totales del turno (una fila de turno_totales)
+        totales = totales_turno(turno_id)
+        total_efectivo = totales["total_efectivo"]
+        total_yape = totales["total_yape"]
+        total_turno = a_soles(totales["total_efectivo_centimos"] + totales["total_yape_centimos"])
+        autos_ingresados = totales["autos_ingresados"]
+        autos_salieron = totales["autos_salieron"]
 
         # Total de autos en cochera
-        cursor.execute("SELECT COUNT(*) FROM entradas WHERE salio = 0")
-        autos_en_cochera = cursor.fetchone()[0]
+        autos_en_cochera = total_ocupados()
 
         return render_template(
             "dashboard.html",
@@ -71,6 +46,7 @@ def dashboard():
             autos_ingresados=autos_ingresados,
             autos_salieron=autos_salieron,
             autos_en_cochera=autos_en_cochera,
+            turno_id=turno_id,
             inicio_turno=session["inicio_turno"],
             tipo_turno=session.get("tipo_turno", ""),
             es_admin=session.get("es_admin", False)
@@ -83,6 +59,7 @@ def dashboard():
 
 @dashboard_bp.route("/ingresos_turno")
 @login_required
+@respuesta_versionada('caja', 'ocupacion')
 def ingresos_turno():
     """Obtiene los ingresos del turno actual"""
     try:
@@ -111,54 +88,22 @@ def ingresos_turno():
 
         rows = cursor.fetchall()
 
-        ingresos = []
-        total_efectivo = 0
-        total_yape = 0
-
-        for r in rows:
-            monto = float(r["monto"] or 0)
-            
-            if r["metodo_pago"] == "efectivo":
-                total_efectivo += monto
-            else:
-                total_yape += monto
-
-            ingresos.append({
-                "id": r["id"],
-                "entrada_id": r["entrada_id"],
-                "tipo": r["tipo"],
-                "hora": r["fecha_movimiento"].split(" ")[1][:5] if r["fecha_movimiento"] else "",
-                "fecha": r["fecha_movimiento"].split(" ")[0] if r["fecha_movimiento"] else "",
-                "placa": r["placa"] or "-",
-                "cliente": r["cliente"] or "-",
-                "monto": monto,
-                "metodo_pago": r["metodo_pago"],
-                "descripcion": r["descripcion"]
-            })
-
-        # KPIs: autos ingresados y salidos en este turno
-        cursor.execute("""
-            SELECT COUNT(*) FROM entradas
-            WHERE trabajador_id = ? AND fecha_registro >= ?
-        """, (session["trabajador_id"], session["inicio_turno"]))
-        autos_ingresados = cursor.fetchone()[0]
+        ingresos = [formato_movimiento(r) for r in rows]
 
-        cursor.execute("""
-            SELECT COUNT(*) FROM movimientos_caja
-            WHERE turno_id = ? AND tipo = 'COBRO_SALIDA'
-        """, (turno_id,))
-        autos_salieron = cursor.fetchone()[0]
+        # Totales y KPIs del turno: todo lo que no es efectivo va con yape
+        totales = totales_turno(turno_id)
+        total_efectivo = totales["total_efectivo"]
+        total_yape = a_soles(totales["total_cobrado_centimos"] - totales["total_efectivo_centimos"])
 
-        cursor.execute("SELECT COUNT(*) FROM entradas WHERE salio = 0")
-        autos_en_cochera = cursor.fetchone()[0]
+        autos_en_cochera = total_ocupados()
 
         return jsonify({
             "ingresos": ingresos,
             "total_efectivo": total_efectivo,
             "total_yape": total_yape,
-            "total": total_efectivo + total_yape,
-            "autos_ingresados": autos_ingresados,
-            "autos_salieron": autos_salieron,
+            "total": totales["total_cobrado"],
+            "autos_ingresados": totales["autos_ingresados"],
+            "autos_salieron": totales["autos_salieron"],
             "autos_en_cochera": autos_en_cochera
         })
 
@@ -167,6 +112,28 @@ def ingresos_turno():
         return jsonify({"ingresos": [], "total": 0, "error": str(e)})
 
 
+@dashboard_bp.route("/eventos")
+@login_required
+def eventos():
+    """Canal de eventos en vivo (Server-Sent Events)"""
+    ultimo = request.headers.get("Last-Event-ID") or request.args.get("desde")
+    try:
+        ultimo_id = int(ultimo) if ultimo else None
+    except ValueError:
+        ultimo_id = None
+
+    flujo = flujo_eventos(
+        obtener_pool(current_app),
+        ultimo_id,
+        duracion=current_app.config.get("EVENTOS_DURACION_SEGUNDOS", 60),
+        max_conexiones=current_app.config.get("EVENTOS_MAX_CONEXIONES", 2)
+    )
+    return Response(flujo, mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
 @dashboard_bp.route("/reporte_turno")
 @login_required
 def reporte_turno_actual():
@@ -181,97 +148,18 @@ def reporte_turno_actual():
 def reporte_turno(turno_id):
     """Genera el reporte de un turno por ID (accesible sin sesión activa)"""
     try:
-        db = get_db()
-        cursor = db.cursor()
+        es_admin = session.get("es_admin", False) if "trabajador_id" in session else False
 
-        # Obtener datos del turno
-        cursor.execute("""
-            SELECT t.*, tr.nombre as trabajador_nombre
-            FROM turnos t
-            JOIN trabajadores tr ON t.trabajador_id = tr.id
-            WHERE t.id = ?
-        """, (turno_id,))
-        turno = cursor.fetchone()
+        # Turno cerrado: HTML archivado al cerrarlo
+        respuesta = respuesta_reporte(turno_id, es_admin)
+        if respuesta is not None:
+            return respuesta
 
-        if not turno:
+        # Turno abierto: se arma en vivo
+        datos = datos_reporte(get_db().cursor(), turno_id)
+        if not datos:
             return "Turno no encontrado", 404
-
-        cursor.execute("""
-            SELECT
-                IFNULL(SUM(monto), 0) as total_cobrado,
-                IFNULL(SUM(CASE WHEN metodo_pago = 'efectivo' THEN monto ELSE 0 END), 0) as total_efectivo,
-                IFNULL(SUM(CASE WHEN metodo_pago = 'yape' THEN monto ELSE 0 END), 0) as total_yape,
-                IFNULL(SUM(CASE WHEN tipo LIKE '%ADELANTO%' OR tipo = 'PAGO_COMPLETO' THEN monto ELSE 0 END), 0) as total_adelantos,
-                IFNULL(SUM(CASE WHEN tipo = 'COBRO_SALIDA' THEN monto ELSE 0 END), 0) as total_cobros,
-                IFNULL(SUM(CASE WHEN tipo = 'PENALIDAD' THEN monto ELSE 0 END), 0) as total_penalidades
-            FROM movimientos_caja
-            WHERE turno_id = ?
-        """, (turno_id,))
-        stats_mov = cursor.fetchone()
-
-        cursor.execute("""
-            SELECT COUNT(*) FROM entradas
-            WHERE trabajador_id = ? AND fecha_registro >= ?
-        """, (turno["trabajador_id"], turno["fecha_inicio"]))
-        autos_ingresados = cursor.fetchone()[0]
-
-        cursor.execute("""
-            SELECT COUNT(*) FROM movimientos_caja
-            WHERE turno_id = ? AND tipo = 'COBRO_SALIDA'
-        """, (turno_id,))
-        autos_salieron = cursor.fetchone()[0]
-
-        cursor.execute("SELECT COUNT(*) FROM entradas WHERE salio = 0")
-        autos_en_cochera = cursor.fetchone()[0]
-
-        stats = {
-            "total_cobrado": stats_mov["total_cobrado"],
-            "total_efectivo": stats_mov["total_efectivo"],
-            "total_yape": stats_mov["total_yape"],
-            "total_adelantos": stats_mov["total_adelantos"],
-            "total_cobros": stats_mov["total_cobros"],
-            "total_penalidades": stats_mov["total_penalidades"],
-            "autos_ingresados": autos_ingresados,
-            "autos_salieron": autos_salieron,
-            "autos_en_cochera": autos_en_cochera,
-            "efectivo_declarado": turno["efectivo_declarado"],
-            "yape_declarado": turno["yape_declarado"],
-            "dif_efectivo": (turno["efectivo_declarado"] or 0) - stats_mov["total_efectivo"],
-            "dif_yape": (turno["yape_declarado"] or 0) - stats_mov["total_yape"],
-        }
-
-        cursor.execute("""
-            SELECT
-                m.*,
-                c.placa,
-                c.nombre as cliente,
-                e.fecha_entrada,
-                e.fecha_salida
-            FROM movimientos_caja m
-            LEFT JOIN entradas e ON m.entrada_id = e.id
-            LEFT JOIN clientes c ON e.cliente_id = c.id
-            WHERE m.turno_id = ?
-            ORDER BY m.fecha_movimiento DESC
-        """, (turno_id,))
-        detalles = [dict(d) for d in cursor.fetchall()]
-
-        nombre_trabajador = turno["trabajador_nombre"]
-        es_admin = session.get("es_admin", False) if "trabajador_id" in session else False
-
-        return render_template(
-            "reporte_turno.html",
-            turno_id=turno_id,
-            trabajador=nombre_trabajador,
-            nombre=session.get("nombre", nombre_trabajador),
-            es_admin=es_admin,
-            inicio_turno=turno["fecha_inicio"],
-            fin_turno=turno["fecha_fin"] or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            estado_turno=turno["estado"],
-            stats=stats,
-            detalles=detalles,
-            observaciones=turno["observaciones"] or "",
-            now=datetime.now().strftime("%Y-%m-%d %H:%M")
-        )
+        return renderizar_reporte(datos, es_admin)
 
     except Exception as e:
         print(f"Error en reporte: {e}")
@@ -289,50 +177,46 @@ def mis_reportes():
         trabajador_id = session["trabajador_id"]
         filtro_fecha_desde = request.args.get('fecha_desde', '')
         filtro_fecha_hasta = request.args.get('fecha_hasta', '')
-        pagina = int(request.args.get('pagina', 1))
-        por_pagina = int(request.args.get('por_pagina', 15))
+        por_pagina, despues, con_total = leer_paginacion(request.args, 15)
 
         query = """
             SELECT
                 t.id,
                 t.fecha_inicio,
+                t.inicio_epoch,
                 t.fecha_fin,
                 t.estado,
-                IFNULL(t.total_efectivo, 0) as total_efectivo,
-                IFNULL(t.total_yape, 0) as total_yape,
-                IFNULL(t.total_efectivo, 0) + IFNULL(t.total_yape, 0) as total,
+                IFNULL(t.total_efectivo_centimos, 0) / 100.0 as total_efectivo,
+                IFNULL(t.total_yape_centimos, 0) / 100.0 as total_yape,
+                (IFNULL(t.total_efectivo_centimos, 0) + IFNULL(t.total_yape_centimos, 0)) / 100.0 as total,
                 t.efectivo_declarado,
-                IFNULL(t.efectivo_declarado, 0) - IFNULL(t.total_efectivo, 0) as diferencia,
+                (IFNULL(t.efectivo_declarado_centimos, 0) - IFNULL(t.total_efectivo_centimos, 0)) / 100.0 as diferencia,
                 t.observaciones,
-                (SELECT COUNT(*) FROM movimientos_caja m WHERE m.turno_id = t.id) as num_movimientos
+                IFNULL(tt.num_movimientos, 0) as num_movimientos
             FROM turnos t
+            LEFT JOIN turno_totales tt ON tt.turno_id = t.id
             WHERE t.trabajador_id = ?
         """
         params = [trabajador_id]
 
-        if filtro_fecha_desde:
-            query += " AND date(t.fecha_inicio) >= ?"
-            params.append(filtro_fecha_desde)
-        if filtro_fecha_hasta:
-            query += " AND date(t.fecha_inicio) <= ?"
-            params.append(filtro_fecha_hasta)
-
-        count_query = f"SELECT COUNT(*) FROM ({query})"
-        cursor.execute(count_query, params)
-        total = cursor.fetchone()[0]
+        condicion, valores = filtro_fechas("t.inicio_epoch", filtro_fecha_desde, filtro_fecha_hasta)
+        query += condicion
+        params.extend(valores)
 
-        query += " ORDER BY t.fecha_inicio DESC"
-        query += f" LIMIT {por_pagina} OFFSET {(pagina - 1) * por_pagina}"
+        total = contar(cursor, query, params) if con_total else None
 
-        cursor.execute(query, params)
-        turnos = [dict(r) for r in cursor.fetchall()]
+        filas, siguiente = pagina_keyset(cursor, query, params, [
+            ("t.inicio_epoch", "inicio_epoch"),
+            ("t.id", "id")
+        ], por_pagina, despues)
+        turnos = [dict(r) for r in filas]
 
         return jsonify({
             "ok": True,
             "turnos": turnos,
             "total": total,
-            "pagina": pagina,
-            "total_paginas": (total + por_pagina - 1) // por_pagina
+            "por_pagina": por_pagina,
+            "siguiente": siguiente
         })
 
     except Exception as e:
@@ -348,27 +232,20 @@ def detalle_mi_turno(turno_id):
         db = get_db()
         cursor = db.cursor()
 
-        cursor.execute("""
-            SELECT * FROM turnos WHERE id = ? AND trabajador_id = ?
-        """, (turno_id, session["trabajador_id"]))
+        # Solo sus propios turnos: se comprueba antes de leer el reporte
+        cursor.execute("SELECT trabajador_id FROM turnos WHERE id = ?", (turno_id,))
         turno = cursor.fetchone()
-        if not turno:
+        if not turno or turno["trabajador_id"] != session["trabajador_id"]:
             return jsonify({"ok": False, "error": "Turno no encontrado"})
 
-        cursor.execute("""
-            SELECT m.*, c.placa, c.nombre as cliente
-            FROM movimientos_caja m
-            LEFT JOIN entradas e ON m.entrada_id = e.id
-            LEFT JOIN clientes c ON e.cliente_id = c.id
-            WHERE m.turno_id = ?
-            ORDER BY m.fecha_movimiento DESC
-        """, (turno_id,))
-        movimientos = [dict(m) for m in cursor.fetchall()]
+        datos = reporte_archivado(turno_id) or datos_reporte(cursor, turno_id)
+        if not datos:
+            return jsonify({"ok": False, "error": "Turno no encontrado"})
 
         return jsonify({
             "ok": True,
-            "turno": dict(turno),
-            "movimientos": movimientos
+            "turno": datos["turno"],
+            "movimientos": datos["movimientos"]
         })
 
     except Exception as e:
@@ -390,36 +267,25 @@ def cerrar_turno():
         
         turno_id = session.get("turno_id")
 
-        cursor.execute("""
-            SELECT 
-                IFNULL(SUM(CASE WHEN metodo_pago = 'efectivo' THEN monto ELSE 0 END), 0) as total_efectivo,
-                IFNULL(SUM(CASE WHEN metodo_pago = 'yape' THEN monto ELSE 0 END), 0) as total_yape,
-                IFNULL(SUM(monto), 0) as total
-            FROM movimientos_caja
-            WHERE turno_id = ?
-        """, (turno_id,))
-
-        totales = cursor.fetchone()
-        
-        cursor.execute("""
-            SELECT COUNT(*) FROM entradas
-            WHERE trabajador_id = ? AND fecha_registro >= ?
-        """, (session["trabajador_id"], session["inicio_turno"]))
-        autos_ingresados = cursor.fetchone()[0]
-        
-        cursor.execute("""
-            SELECT COUNT(*) FROM movimientos_caja
-            WHERE turno_id = ? AND tipo = 'COBRO_SALIDA'
-        """, (turno_id,))
-        autos_salieron = cursor.fetchone()[0]
-
-        efectivo_declarado = float(data.get("efectivo_declarado", 0))
-        yape_declarado = float(data.get("yape_declarado", 0))
-        total_efectivo = float(totales["total_efectivo"] or 0)
-        total_yape = float(totales["total_yape"] or 0)
-        dif_efectivo = efectivo_declarado - total_efectivo
-        dif_yape = yape_declarado - total_yape
-        diferencia = dif_efectivo + dif_yape
+        totales = totales_turno(turno_id)
+        autos_ingresados = totales["autos_ingresados"]
+        autos_salieron = totales["autos_salieron"]
+
+        # Cuadre en céntimos: las diferencias salen exactas
+        efectivo_declarado_c = a_centimos(data.get("efectivo_declarado", 0))
+        yape_declarado_c = a_centimos(data.get("yape_declarado", 0))
+        total_efectivo_c = totales["total_efectivo_centimos"]
+        total_yape_c = totales["total_yape_centimos"]
+        dif_efectivo_c = efectivo_declarado_c - total_efectivo_c
+        dif_yape_c = yape_declarado_c - total_yape_c
+
+        efectivo_declarado = a_soles(efectivo_declarado_c)
+        yape_declarado = a_soles(yape_declarado_c)
+        total_efectivo = a_soles(total_efectivo_c)
+        total_yape = a_soles(total_yape_c)
+        dif_efectivo = a_soles(dif_efectivo_c)
+        dif_yape = a_soles(dif_yape_c)
+        diferencia = a_soles(dif_efectivo_c + dif_yape_c)
 
         if data.get("solo_calcular"):
             return jsonify({
@@ -428,7 +294,7 @@ def cerrar_turno():
                 "autos_salieron": autos_salieron,
                 "total_efectivo": total_efectivo,
                 "total_yape": total_yape,
-                "total_cobrado": float(totales["total"] or 0),
+                "total_cobrado": totales["total_cobrado"],
                 "efectivo_declarado": efectivo_declarado,
                 "yape_declarado": yape_declarado,
                 "dif_efectivo": dif_efectivo,
@@ -440,22 +306,27 @@ def cerrar_turno():
             UPDATE turnos
             SET estado = 'cerrado',
                 fecha_fin = datetime('now', 'localtime'),
-                total_efectivo = ?,
-                total_yape = ?,
-                efectivo_declarado = ?,
-                yape_declarado = ?,
+                total_efectivo = ?, total_efectivo_centimos = ?,
+                total_yape = ?, total_yape_centimos = ?,
+                efectivo_declarado = ?, efectivo_declarado_centimos = ?,
+                yape_declarado = ?, yape_declarado_centimos = ?,
                 observaciones = ?
             WHERE id = ?
         """, (
-            total_efectivo,
-            total_yape,
-            efectivo_declarado,
-            yape_declarado,
+            total_efectivo, total_efectivo_c,
+            total_yape, total_yape_c,
+            efectivo_declarado, efectivo_declarado_c,
+            yape_declarado, yape_declarado_c,
             data.get("observaciones", ""),
             turno_id
         ))
 
+        # Congelar el reporte en la misma transacción del cierre
+        archivar_reporte(cursor, turno_id)
+
         db.commit()
+        invalidar_turnos()
+        publicar_evento('turno_cerrado', {}, turno_id)
 
         return jsonify({
             "ok": True,
@@ -7,7 +7,13 @@ from flask import Blueprint, jsonify, request, session, render_template
 from datetime import datetime
 
 from models.database import get_db
-from utils.helpers import login_required, calcular_penalidad, obtener_configuracion, obtener_turno_trabajador_activo
+from models.dinero import a_centimos, a_soles
+from utils.helpers import login_required, respuesta_versionada, invalidar_caja, calcular_cobros_activos, obtener_configuracion, obtener_turno_trabajador_activo
+from utils.ocupacion import autos_activos, total_ocupados, placa_en_cochera, actualizar_ocupacion
+from utils.estadias import invalidar_estadias
+from utils.eventos import publicar_evento, publicar_movimientos
+from utils.busqueda import buscar as buscar_texto
+from utils.placas import sugerir_placas, datos_placa, actualizar_placas
 
 # Crear el Blueprint
 vehiculos_bp = Blueprint('vehiculos', __name__)
@@ -22,16 +28,7 @@ vehiculos_bp = Blueprint('vehiculos', __name__)
 def buscar_cliente(placa):
     """Busca un cliente por placa"""
     try:
-        db = get_db()
-        cursor = db.cursor()
-
-        cursor.execute("""
-            SELECT nombre, celular, precio_dia
-            FROM clientes
-            WHERE placa = ?
-        """, (placa.upper().strip(),))
-
-        cliente = cursor.fetchone()
+        cliente = datos_placa(placa)
 
         if cliente:
             return jsonify({
@@ -47,6 +44,49 @@ def buscar_cliente(placa):
         return jsonify({"error": str(e)}), 500
 
 
+@vehiculos_bp.route("/autocompletar_placa")
+@login_required
+@respuesta_versionada('clientes', 'ocupacion')
+def autocompletar_placa():
+    """Placas de clientes que empiezan con lo escrito (desde memoria)"""
+    try:
+        limite = min(int(request.args.get("limite", 8)), 50)
+    except ValueError:
+        limite = 8
+
+    try:
+        sugerencias = sugerir_placas(request.args.get("q", ""), limite)
+        for cliente in sugerencias:
+            cliente["en_cochera"] = placa_en_cochera(cliente["placa"]) is not None
+        return jsonify({"ok": True, "sugerencias": sugerencias})
+
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)})
+
+
+@vehiculos_bp.route("/buscar")
+@login_required
+def buscar():
+    """Búsqueda unificada: placa, nombre, celular y observaciones"""
+    texto = request.args.get("q", "").strip()
+    if not texto:
+        return jsonify({"ok": True, "clientes": [], "entradas": []})
+
+    try:
+        limite = min(int(request.args.get("limite", 20)), 100)
+    except ValueError:
+        limite = 20
+
+    try:
+        resultados = buscar_texto(texto, limite)
+        for cliente in resultados["clientes"]:
+            cliente["en_cochera"] = placa_en_cochera(cliente["placa"]) is not None
+        return jsonify({"ok": True, **resultados})
+
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)})
+
+
 @vehiculos_bp.route("/historial_cliente/<placa>")
 @login_required
 def historial_cliente(placa):
@@ -76,12 +116,14 @@ def historial_cliente(placa):
         visitas = cursor.fetchall()
 
         cursor.execute("""
-            SELECT 
-                COUNT(*) as total_visitas,
-                SUM(monto) as total_gastado,
-                SUM(CASE WHEN pagado = 0 THEN monto - IFNULL(adelanto, 0) ELSE 0 END) as deuda_actual,
-                AVG(dias) as promedio_dias
-            FROM entradas
+            SELECT
+                total_visitas,
+                total_gastado_centimos / 100.0 as total_gastado,
+                deuda_actual_centimos / 100.0 as deuda_actual,
+                CAST(total_dias AS REAL) / NULLIF(dias_contados, 0) as promedio_dias,
+                ultima_visita,
+                entradas_activas
+            FROM cliente_stats
             WHERE cliente_id = ?
         """, (cliente["id"],))
 
@@ -90,7 +132,7 @@ def historial_cliente(placa):
         return jsonify({
             "ok": True,
             "cliente": dict(cliente),
-            "estadisticas": dict(estadisticas),
+            "estadisticas": dict(estadisticas) if estadisticas else {"total_visitas": 0},
             "visitas": [dict(v) for v in visitas]
         })
 
@@ -116,11 +158,12 @@ def guardar_entrada():
     nombre_cliente = data.get("cliente", "").strip() or "Sin nombre"
 
     try:
-        precio = float(data.get("precio", 0))
-        if precio <= 0:
+        precio_c = a_centimos(data.get("precio", 0))
+        if precio_c <= 0:
             return jsonify({"ok": False, "error": "El precio por día es obligatorio y debe ser mayor a 0"})
     except (ValueError, TypeError):
         return jsonify({"ok": False, "error": "Precio inválido"})
+    precio = a_soles(precio_c)
 
     try:
         dias = int(data.get("dias", 1))
@@ -147,12 +190,7 @@ def guardar_entrada():
         placa = data["placa"].upper().strip()
 
         # Verificar que no exista una entrada activa para esta placa
-        cursor.execute("""
-            SELECT e.id FROM entradas e
-            JOIN clientes c ON e.cliente_id = c.id
-            WHERE c.placa = ? AND e.salio = 0
-        """, (placa,))
-        if cursor.fetchone():
+        if placa_en_cochera(placa):
             return jsonify({"ok": False, "error": "Este vehiculo ya se encuentra en la cochera"})
 
         # Buscar o crear cliente
@@ -173,63 +211,77 @@ def guardar_entrada():
             """, (placa, nombre_cliente, data.get("celular", ""), precio))
             cliente_id = cursor.lastrowid
 
-        # Calcular montos
-        monto = precio * dias
-        adelanto = float(data.get("adelanto", 0))
+        # Calcular montos (en céntimos)
+        monto_c = precio_c * dias
+        adelanto_c = a_centimos(data.get("adelanto", 0))
         metodo_pago = data.get("metodo_pago", "efectivo")
         
-        pago_completo = 1 if data.get("pagado") and adelanto >= monto else 0
+        pago_completo = 1 if data.get("pagado") and adelanto_c >= monto_c else 0
         
-        if data.get("pagado") and adelanto == 0:
-            adelanto = monto
+        if data.get("pagado") and adelanto_c == 0:
+            adelanto_c = monto_c
             pago_completo = 1
 
         # Insertar entrada (fecha y hora se generan automáticamente)
         cursor.execute("""
             INSERT INTO entradas (
                 cliente_id, fecha_entrada, hora_entrada,
-                dias, precio_dia, monto,
-                adelanto, metodo_pago, dejo_llave, pagado, pago_completo_adelantado,
-                salio, observaciones, trabajador_id, fecha_registro
+                dias, precio_dia, precio_dia_centimos, monto, monto_centimos,
+                adelanto, adelanto_centimos, metodo_pago, dejo_llave, pagado, pago_completo_adelantado,
+                salio, observaciones, trabajador_id, turno_id, fecha_registro
             )
             VALUES (?, date('now', 'localtime'), time('now', 'localtime'),
-                    ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now', 'localtime'))
+                    ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now', 'localtime'))
         """, (
             cliente_id,
             dias,
-            precio,
-            monto,
-            adelanto,
+            precio, precio_c,
+            a_soles(monto_c), monto_c,
+            a_soles(adelanto_c), adelanto_c,
             metodo_pago,
             1 if data.get("dejo_llave") else 0,
             1 if pago_completo else 0,
             pago_completo,
             0,
             data.get("observaciones", ""),
-            trabajador_id
+            trabajador_id,
+            turno_id
         ))
 
         entrada_id = cursor.lastrowid
+        movimiento_id = None
 
         # Registrar movimiento de caja si hay adelanto
-        if adelanto > 0:
+        if adelanto_c > 0:
             tipo_mov = "PAGO_COMPLETO" if pago_completo else "ADELANTO"
             cursor.execute("""
                 INSERT INTO movimientos_caja (
-                    turno_id, entrada_id, trabajador_id, tipo, monto, metodo_pago, descripcion
+                    turno_id, entrada_id, trabajador_id, tipo, monto, monto_centimos, metodo_pago, descripcion
                 )
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             """, (
                 turno_id,
                 entrada_id,
                 trabajador_id,
                 tipo_mov,
-                adelanto,
+                a_soles(adelanto_c), adelanto_c,
                 metodo_pago,
                 f"{tipo_mov} - {placa} - {nombre_cliente} - {dias} día(s)"
             ))
+            movimiento_id = cursor.lastrowid
 
         db.commit()
+        actualizar_placas([cliente_id])
+        actualizar_ocupacion([entrada_id])
+        publicar_evento('entrada', {
+            "id": entrada_id,
+            "placa": placa,
+            "cliente": nombre_cliente,
+            "ocupados": total_ocupados()
+        }, turno_id)
+        if movimiento_id:
+            invalidar_caja()
+            publicar_movimientos([movimiento_id])
         
         return jsonify({
             "ok": True, 
@@ -243,6 +295,205 @@ def guardar_entrada():
         return jsonify({"ok": False, "error": str(e)})
 
 
+# Máximo de vehículos por lote (una flota o un evento)
+LOTE_MAXIMO = 200
+
+
+@vehiculos_bp.route("/guardar_entradas_lote", methods=["POST"])
+@login_required
+def guardar_entradas_lote():
+    """
+    Registra varias entradas con el mismo precio, días y pago (flotas,
+    eventos). Valida todo primero y guarda las válidas en una sola
+    transacción; devuelve el resultado de cada placa.
+    """
+    data = request.json or {}
+
+    try:
+        precio_c = a_centimos(data.get("precio", 0))
+        if precio_c <= 0:
+            return jsonify({"ok": False, "error": "El precio por día es obligatorio y debe ser mayor a 0"})
+    except (ValueError, TypeError):
+        return jsonify({"ok": False, "error": "Precio inválido"})
+    precio = a_soles(precio_c)
+
+    try:
+        dias = int(data.get("dias", 1))
+        if dias < 1:
+            return jsonify({"ok": False, "error": "Días debe ser al menos 1"})
+    except (ValueError, TypeError):
+        return jsonify({"ok": False, "error": "Días inválido"})
+
+    try:
+        adelanto_c = a_centimos(data.get("adelanto", 0))
+    except (ValueError, TypeError):
+        return jsonify({"ok": False, "error": "Adelanto inválido"})
+
+    vehiculos = data.get("vehiculos") or []
+    if not isinstance(vehiculos, list) or not vehiculos:
+        return jsonify({"ok": False, "error": "Ingrese al menos una placa"})
+    if len(vehiculos) > LOTE_MAXIMO:
+        return jsonify({"ok": False, "error": f"Máximo {LOTE_MAXIMO} vehículos por lote"})
+
+    # Validar todas las placas antes de escribir
+    nombre_comun = (data.get("cliente") or "").strip()
+    celular_comun = data.get("celular", "")
+    resultados = []
+    validos = []
+    vistas = set()
+    for vehiculo in vehiculos:
+        if not isinstance(vehiculo, dict):
+            vehiculo = {"placa": vehiculo}
+        placa = str(vehiculo.get("placa") or "").upper().strip()
+        resultado = {"placa": placa, "ok": False}
+        resultados.append(resultado)
+
+        if not placa:
+            resultado["error"] = "Placa es requerida"
+        elif placa in vistas:
+            resultado["error"] = "Placa repetida en el lote"
+        elif placa_en_cochera(placa):
+            resultado["error"] = "Este vehiculo ya se encuentra en la cochera"
+        else:
+            validos.append((resultado, {
+                "placa": placa,
+                "nombre": (vehiculo.get("cliente") or "").strip() or nombre_comun or "Sin nombre",
+                "celular": vehiculo.get("celular") or celular_comun
+            }))
+        vistas.add(placa)
+
+    if not validos:
+        return jsonify({"ok": False, "error": "Ninguna placa se puede registrar", "resultados": resultados})
+
+    # Montos (mismas reglas que guardar_entrada, por vehículo)
+    monto_c = precio_c * dias
+    metodo_pago = data.get("metodo_pago", "efectivo")
+    pago_completo = 1 if data.get("pagado") and adelanto_c >= monto_c else 0
+    if data.get("pagado") and adelanto_c == 0:
+        adelanto_c = monto_c
+        pago_completo = 1
+
+    try:
+        # Resolver turno_id y trabajador_id según rol
+        if session.get("es_admin"):
+            turno_activo = obtener_turno_trabajador_activo()
+            if not turno_activo:
+                return jsonify({"ok": False, "error": "No hay trabajador en turno activo"})
+            turno_id = turno_activo["turno_id"]
+            trabajador_id = turno_activo["trabajador_id"]
+        else:
+            turno_id = session["turno_id"]
+            trabajador_id = session["trabajador_id"]
+
+        db = get_db()
+        cursor = db.cursor()
+
+        # Clientes: crear o actualizar todos de una vez
+        cursor.executemany("""
+            INSERT INTO clientes (placa, nombre, celular, precio_dia, fecha_actualizacion)
+            VALUES (?, ?, ?, ?, datetime('now', 'localtime'))
+            ON CONFLICT(placa) DO UPDATE SET
+                nombre = excluded.nombre,
+                celular = excluded.celular,
+                precio_dia = excluded.precio_dia,
+                fecha_actualizacion = excluded.fecha_actualizacion
+        """, [(v["placa"], v["nombre"], v["celular"], precio) for _, v in validos])
+
+        placas = [v["placa"] for _, v in validos]
+        cursor.execute(
+            f"SELECT id, placa FROM clientes WHERE placa IN ({','.join('?' * len(placas))})",
+            placas
+        )
+        cliente_por_placa = {r["placa"]: r["id"] for r in cursor.fetchall()}
+
+        # La transacción ya tiene el lock de escritura: los ids mayores a
+        # estos máximos son exactamente los que inserta este lote
+        cursor.execute("SELECT IFNULL(MAX(id), 0) FROM entradas")
+        ultima_entrada = cursor.fetchone()[0]
+        cursor.execute("SELECT IFNULL(MAX(id), 0) FROM movimientos_caja")
+        ultimo_movimiento = cursor.fetchone()[0]
+
+        cursor.executemany("""
+            INSERT INTO entradas (
+                cliente_id, fecha_entrada, hora_entrada,
+                dias, precio_dia, precio_dia_centimos, monto, monto_centimos,
+                adelanto, adelanto_centimos, metodo_pago, dejo_llave, pagado, pago_completo_adelantado,
+                salio, observaciones, trabajador_id, turno_id, fecha_registro
+            )
+            VALUES (?, date('now', 'localtime'), time('now', 'localtime'),
+                    ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?, ?, datetime('now', 'localtime'))
+        """, [(
+            cliente_por_placa[v["placa"]],
+            dias,
+            precio, precio_c,
+            a_soles(monto_c), monto_c,
+            a_soles(adelanto_c), adelanto_c,
+            metodo_pago,
+            1 if data.get("dejo_llave") else 0,
+            pago_completo,
+            pago_completo,
+            data.get("observaciones", ""),
+            trabajador_id,
+            turno_id
+        ) for _, v in validos])
+
+        cursor.execute("SELECT id, cliente_id FROM entradas WHERE id > ?", (ultima_entrada,))
+        entrada_por_cliente = {r["cliente_id"]: r["id"] for r in cursor.fetchall()}
+
+        # Movimientos de caja si hay adelanto
+        if adelanto_c > 0:
+            tipo_mov = "PAGO_COMPLETO" if pago_completo else "ADELANTO"
+            cursor.executemany("""
+                INSERT INTO movimientos_caja (
+                    turno_id, entrada_id, trabajador_id, tipo, monto, monto_centimos, metodo_pago, descripcion
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(
+                turno_id,
+                entrada_por_cliente[cliente_por_placa[v["placa"]]],
+                trabajador_id,
+                tipo_mov,
+                a_soles(adelanto_c), adelanto_c,
+                metodo_pago,
+                f"{tipo_mov} - {v['placa']} - {v['nombre']} - {dias} día(s)"
+            ) for _, v in validos])
+
+        cursor.execute("SELECT id FROM movimientos_caja WHERE id > ?", (ultimo_movimiento,))
+        movimiento_ids = [r["id"] for r in cursor.fetchall()]
+
+        db.commit()
+
+        entrada_ids = []
+        for resultado, v in validos:
+            resultado["ok"] = True
+            resultado["id"] = entrada_por_cliente[cliente_por_placa[v["placa"]]]
+            entrada_ids.append(resultado["id"])
+
+        actualizar_placas(cliente_por_placa.values())
+        actualizar_ocupacion(entrada_ids)
+        publicar_evento('entradas_lote', {
+            "ids": entrada_ids,
+            "placas": placas,
+            "ocupados": total_ocupados()
+        }, turno_id)
+        if movimiento_ids:
+            invalidar_caja()
+            publicar_movimientos(movimiento_ids)
+
+        return jsonify({
+            "ok": True,
+            "mensaje": f"{len(entrada_ids)} entrada(s) guardada(s)",
+            "guardadas": len(entrada_ids),
+            "rechazadas": len(resultados) - len(entrada_ids),
+            "pago_completo": pago_completo == 1,
+            "resultados": resultados
+        })
+
+    except Exception as e:
+        print(f"Error al guardar entradas en lote: {e}")
+        return jsonify({"ok": False, "error": str(e)})
+
+
 @vehiculos_bp.route("/ingreso/<int:id>")
 @login_required
 def obtener_ingreso(id):
@@ -290,10 +541,14 @@ def actualizar_ingreso():
         db = get_db()
         cursor = db.cursor()
 
+        precio_c = a_centimos(data.get("precio", 0))
+        monto_c = a_centimos(data.get("monto", 0))
+
         cursor.execute("""
             UPDATE entradas
             SET fecha_entrada = ?, hora_entrada = ?, fecha_hasta = ?, 
-                hora_salida_esperada = ?, precio_dia = ?, dias = ?, monto = ?,
+                hora_salida_esperada = ?, precio_dia = ?, precio_dia_centimos = ?,
+                dias = ?, monto = ?, monto_centimos = ?,
                 dejo_llave = ?, observaciones = ?
             WHERE id = ?
         """, (
@@ -301,9 +556,9 @@ def actualizar_ingreso():
             data.get("hora_entrada"),
             data.get("fecha_hasta"),
             data.get("hora_salida"),
-            float(data.get("precio", 0)),
+            a_soles(precio_c), precio_c,
             int(data.get("dias", 1)),
-            float(data.get("monto", 0)),
+            a_soles(monto_c), monto_c,
             1 if data.get("dejo_llave") else 0,
             data.get("observaciones", ""),
             data["id"]
@@ -317,11 +572,16 @@ def actualizar_ingreso():
             """, (
                 data.get("cliente", ""),
                 data.get("celular", ""),
-                float(data.get("precio", 0)),
+                a_soles(precio_c),
                 data["placa"].upper().strip()
             ))
 
         db.commit()
+        if data.get("placa"):
+            actualizar_placas(placas=[data["placa"]])
+        actualizar_ocupacion([data["id"]])
+        invalidar_estadias()
+        publicar_evento('entrada_editada', {"id": int(data["id"])})
         return jsonify({"ok": True, "mensaje": "Ingreso actualizado"})
 
     except Exception as e:
@@ -334,61 +594,21 @@ def actualizar_ingreso():
 
 @vehiculos_bp.route("/autos_en_cochera")
 @login_required
+@respuesta_versionada('ocupacion', 'configuracion', segundos=60)
 def autos_en_cochera():
     """Lista los autos actualmente en la cochera"""
     try:
-        db = get_db()
-        cursor = db.cursor()
-
-        cursor.execute("""
-            SELECT 
-                e.id,
-                c.placa,
-                c.nombre as cliente,
-                c.celular,
-                e.fecha_entrada,
-                e.hora_entrada,
-                e.fecha_hasta,
-                e.hora_salida_esperada,
-                e.dias as dias_pactados,
-                e.precio_dia,
-                e.monto,
-                e.adelanto,
-                e.metodo_pago,
-                e.dejo_llave,
-                e.pagado,
-                e.pago_completo_adelantado,
-                e.observaciones,
-                t.nombre as trabajador_entrada,
-                MAX(1, CAST((julianday(datetime('now', 'localtime')) - julianday(e.fecha_entrada)) + 0.5 AS INTEGER)) as dias_reales
-            FROM entradas e
-            JOIN clientes c ON e.cliente_id = c.id
-            LEFT JOIN trabajadores t ON e.trabajador_id = t.id
-            WHERE e.salio = 0
-            ORDER BY e.fecha_entrada DESC
-        """)
-
-        autos = cursor.fetchall()
+        autos = autos_activos()
+        cobros = calcular_cobros_activos(autos)
 
         autos_list = []
-        for auto in autos:
-            dias_reales = auto["dias_reales"]
+        for auto, cobro in zip(autos, cobros):
+            dias_reales = cobro["dias_reales"]
             dias_pactados = auto["dias_pactados"]
             excede_tiempo = dias_reales > dias_pactados
-            
-            penalidad = 0
-            if auto["fecha_hasta"] and auto["hora_salida_esperada"]:
-                penalidad = calcular_penalidad(
-                    auto["fecha_entrada"],
-                    auto["hora_entrada"],
-                    auto["fecha_hasta"],
-                    auto["hora_salida_esperada"],
-                    auto["precio_dia"]
-                )
-            
-            monto_total = dias_reales * float(auto["precio_dia"]) + penalidad
+            penalidad = cobro["penalidad"]
             adelanto = float(auto["adelanto"] or 0)
-            pendiente = max(0, monto_total - adelanto)
+            pendiente = cobro["pendiente"]
 
             autos_list.append({
                 "id": auto["id"],
@@ -444,8 +664,7 @@ def calcular_cobro(id):
                 c.placa,
                 c.nombre as cliente,
                 c.celular,
-                t.nombre as trabajador_entrada,
-                MAX(1, CAST((julianday(datetime('now', 'localtime')) - julianday(e.fecha_entrada)) + 0.5 AS INTEGER)) as dias_reales
+                t.nombre as trabajador_entrada
             FROM entradas e
             JOIN clientes c ON e.cliente_id = c.id
             LEFT JOIN trabajadores t ON e.trabajador_id = t.id
@@ -460,23 +679,14 @@ def calcular_cobro(id):
         if auto["salio"]:
             return jsonify({"ok": False, "error": "Este auto ya salió"})
 
-        dias_reales = auto["dias_reales"]
+        cobro = calcular_cobros_activos([auto])[0]
+        dias_reales = cobro["dias_reales"]
         precio_dia = float(auto["precio_dia"])
         adelanto = float(auto["adelanto"] or 0)
-        
-        penalidad = 0
-        if auto["fecha_hasta"] and auto["hora_salida_esperada"]:
-            penalidad = calcular_penalidad(
-                auto["fecha_entrada"],
-                auto["hora_entrada"],
-                auto["fecha_hasta"],
-                auto["hora_salida_esperada"],
-                precio_dia
-            )
-        
-        monto_dias = dias_reales * precio_dia
-        monto_total = monto_dias + penalidad
-        a_cobrar = max(0, monto_total - adelanto)
+        penalidad = cobro["penalidad"]
+        monto_dias = cobro["monto_dias"]
+        monto_total = cobro["monto_total"]
+        a_cobrar = cobro["pendiente"]
         
         ya_pago_completo = auto["pago_completo_adelantado"] == 1
 
@@ -537,8 +747,7 @@ def registrar_salida():
             SELECT
                 e.*,
                 c.placa,
-                c.nombre as cliente_nombre,
-                MAX(1, CAST((julianday(datetime('now', 'localtime')) - julianday(e.fecha_entrada)) + 0.5 AS INTEGER)) as dias_reales
+                c.nombre as cliente_nombre
             FROM entradas e
             JOIN clientes c ON e.cliente_id = c.id
             WHERE e.id = ?
@@ -554,12 +763,12 @@ def registrar_salida():
 
         # Datos ingresados por el trabajador
         dias_reales = int(data.get("dias_reales", 1))
-        monto_cobrado = float(data.get("monto_cobrado", 0))
+        monto_cobrado_c = a_centimos(data.get("monto_cobrado", 0))
         metodo_pago = data.get("metodo_pago", "efectivo")
-        adelanto = float(entrada["adelanto"] or 0)
+        adelanto_c = entrada["adelanto_centimos"] or 0
 
         # Monto total = adelanto + cobro actual
-        monto_total = adelanto + monto_cobrado
+        monto_total_c = adelanto_c + monto_cobrado_c
 
         cursor.execute("""
             UPDATE entradas
@@ -568,42 +777,56 @@ def registrar_salida():
                 hora_salida_real = time('now', 'localtime'),
                 dias = ?,
                 monto = ?,
+                monto_centimos = ?,
                 pagado = 1,
                 observaciones = ?,
                 trabajador_salida_id = ?
             WHERE id = ?
         """, (
             dias_reales,
-            monto_total,
+            a_soles(monto_total_c),
+            monto_total_c,
             data.get("observaciones", entrada["observaciones"] or ""),
             trabajador_id,
             data["id"]
         ))
 
         # Registrar movimiento de caja si se cobró algo
-        if monto_cobrado > 0:
+        movimiento_id = None
+        if monto_cobrado_c > 0:
             descripcion = f"Cobro salida - {entrada['placa']} - {entrada['cliente_nombre'] or 'Sin nombre'} - {dias_reales} día(s)"
 
             cursor.execute("""
                 INSERT INTO movimientos_caja (
-                    turno_id, entrada_id, trabajador_id, tipo, monto, metodo_pago, descripcion
+                    turno_id, entrada_id, trabajador_id, tipo, monto, monto_centimos, metodo_pago, descripcion
                 )
-                VALUES (?, ?, ?, 'COBRO_SALIDA', ?, ?, ?)
+                VALUES (?, ?, ?, 'COBRO_SALIDA', ?, ?, ?, ?)
             """, (
                 turno_id,
                 data["id"],
                 trabajador_id,
-                monto_cobrado,
+                a_soles(monto_cobrado_c),
+                monto_cobrado_c,
                 metodo_pago,
                 descripcion
             ))
+            movimiento_id = cursor.lastrowid
 
         db.commit()
+        actualizar_ocupacion([data["id"]])
+        publicar_evento('salida', {
+            "id": entrada["id"],
+            "placa": entrada["placa"],
+            "ocupados": total_ocupados()
+        }, turno_id)
+        if movimiento_id:
+            invalidar_caja()
+            publicar_movimientos([movimiento_id])
 
         return jsonify({
             "ok": True,
             "mensaje": "Salida registrada exitosamente",
-            "monto_cobrado": monto_cobrado,
+            "monto_cobrado": a_soles(monto_cobrado_c),
             "dias_reales": dias_reales
         })
 
@@ -648,9 +871,9 @@ def autorizar_salida():
         if not entrada:
             return jsonify({"ok": False, "error": "Entrada no encontrada o no válida para autorización"})
 
-        penalidad = float(data.get("penalidad", 0))
-        descuento = float(data.get("descuento", 0))
-        monto_extra = max(0, penalidad - descuento)
+        penalidad_c = a_centimos(data.get("penalidad", 0))
+        descuento_c = a_centimos(data.get("descuento", 0))
+        monto_extra_c = max(0, penalidad_c - descuento_c)
         metodo_pago = data.get("metodo_pago", "efectivo")
 
         cursor.execute("""
@@ -658,46 +881,265 @@ def autorizar_salida():
             SET salio = 1,
                 fecha_salida = datetime('now', 'localtime'),
                 hora_salida_real = time('now', 'localtime'),
-                penalidad = ?,
-                descuento = ?,
+                penalidad = ?, penalidad_centimos = ?,
+                descuento = ?, descuento_centimos = ?,
                 observaciones = ?,
                 trabajador_salida_id = ?
             WHERE id = ?
         """, (
-            penalidad,
-            descuento,
+            a_soles(penalidad_c), penalidad_c,
+            a_soles(descuento_c), descuento_c,
             data.get("observaciones", entrada["observaciones"]),
             trabajador_id,
             data["id"]
         ))
 
-        if monto_extra > 0:
+        movimiento_id = None
+        if monto_extra_c > 0:
             cursor.execute("""
                 INSERT INTO movimientos_caja (
-                    turno_id, entrada_id, trabajador_id, tipo, monto, metodo_pago, descripcion
+                    turno_id, entrada_id, trabajador_id, tipo, monto, monto_centimos, metodo_pago, descripcion
                 )
-                VALUES (?, ?, ?, 'PENALIDAD', ?, ?, ?)
+                VALUES (?, ?, ?, 'PENALIDAD', ?, ?, ?, ?)
             """, (
                 turno_id,
                 data["id"],
                 trabajador_id,
-                monto_extra,
+                a_soles(monto_extra_c),
+                monto_extra_c,
                 metodo_pago,
                 f"Penalidad - {entrada['placa']} - {entrada['cliente_nombre']}"
             ))
+            movimiento_id = cursor.lastrowid
 
         db.commit()
+        actualizar_ocupacion([data["id"]])
+        publicar_evento('salida', {
+            "id": entrada["id"],
+            "placa": entrada["placa"],
+            "ocupados": total_ocupados()
+        }, turno_id)
+        if movimiento_id:
+            invalidar_caja()
+            publicar_movimientos([movimiento_id])
 
         return jsonify({
             "ok": True,
             "mensaje": "Salida autorizada exitosamente",
-            "penalidad_cobrada": monto_extra
+            "penalidad_cobrada": a_soles(monto_extra_c)
+        })
+
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)})
+
+
+@vehiculos_bp.route("/registrar_salidas_lote", methods=["POST"])
+@login_required
+def registrar_salidas_lote():
+    """
+    Registra la salida de varios vehículos a la vez (una flota que se va).
+    Se eligen por ids, por cliente o por un grupo de placas; se cobran con
+    las mismas reglas de días y penalidad de la lista de autos (a los que
+    pagaron todo al entrar solo la penalidad, como en autorizar_salida) y
+    todo se guarda en una sola transacción con un único recibo.
+    """
+    data = request.json or {}
+
+    # Resolver los vehículos en el índice de ocupación
+    activos = autos_activos()
+    no_encontrados = []
+    if data.get("ids"):
+        try:
+            pedidos = [int(i) for i in data["ids"]]
+        except (ValueError, TypeError):
+            return jsonify({"ok": False, "error": "IDs inválidos"})
+        por_id = {a["id"]: a for a in activos}
+        seleccion = [por_id[i] for i in dict.fromkeys(pedidos) if i in por_id]
+        no_encontrados = [i for i in dict.fromkeys(pedidos) if i not in por_id]
+    elif data.get("cliente_id"):
+        try:
+            cliente_id = int(data["cliente_id"])
+        except (ValueError, TypeError):
+            return jsonify({"ok": False, "error": "Cliente inválido"})
+        seleccion = [a for a in activos if a["cliente_id"] == cliente_id]
+    elif data.get("placas"):
+        pedidos = [str(p).upper().strip() for p in data["placas"] if str(p).strip()]
+        por_placa = {a["placa"]: a for a in activos}
+        seleccion = [por_placa[p] for p in dict.fromkeys(pedidos) if p in por_placa]
+        no_encontrados = [p for p in dict.fromkeys(pedidos) if p not in por_placa]
+    else:
+        return jsonify({"ok": False, "error": "Indique ids, cliente_id o placas"})
+
+    if not seleccion:
+        return jsonify({"ok": False, "error": "Ningún vehículo en cochera", "no_encontrados": no_encontrados})
+
+    metodo_pago = data.get("metodo_pago", "efectivo")
+
+    try:
+        # Resolver turno_id y trabajador_id según rol
+        if session.get("es_admin"):
+            turno_activo = obtener_turno_trabajador_activo()
+            if not turno_activo:
+                return jsonify({"ok": False, "error": "No hay trabajador en turno activo"})
+            turno_id = turno_activo["turno_id"]
+            trabajador_id = turno_activo["trabajador_id"]
+        else:
+            turno_id = session["turno_id"]
+            trabajador_id = session["trabajador_id"]
+
+        db = get_db()
+        cursor = db.cursor()
+
+        # Releer de la base: el índice puede ir un paso atrás de otro worker
+        ids = [a["id"] for a in seleccion]
+        cursor.execute(f"""
+            SELECT
+                e.id, e.fecha_entrada, e.fecha_hasta, e.hora_salida_esperada,
+                e.precio_dia, e.adelanto, e.adelanto_centimos, e.observaciones,
+                e.dias, e.monto_centimos, e.descuento_centimos, e.pago_completo_adelantado,
+                c.placa, c.nombre as cliente_nombre
+            FROM entradas e
+            JOIN clientes c ON e.cliente_id = c.id
+            WHERE e.id IN ({','.join('?' * len(ids))}) AND e.salio = 0
+            ORDER BY e.id
+        """, ids)
+        entradas = cursor.fetchall()
+        if not entradas:
+            return jsonify({"ok": False, "error": "Estos vehículos ya salieron"})
+
+        cobros = calcular_cobros_activos(entradas)
+        for entrada, cobro in zip(entradas, cobros):
+            cobro["penalidad_centimos"] = a_centimos(cobro["penalidad"])
+            if entrada["pago_completo_adelantado"] == 1:
+                # Pagó todo al entrar: como en autorizar_salida, solo se cobra
+                # la penalidad menos el descuento y los días y el monto quedan
+                cobro["tipo"] = "PENALIDAD"
+                cobro["dias_reales"] = entrada["dias"]
+                cobro["pendiente_centimos"] = max(0, cobro["penalidad_centimos"] - (entrada["descuento_centimos"] or 0))
+                cobro["monto_centimos"] = entrada["monto_centimos"]
+                cobro["descripcion"] = f"Penalidad - {entrada['placa']} - {entrada['cliente_nombre']}"
+            else:
+                cobro["tipo"] = "COBRO_SALIDA"
+                cobro["pendiente_centimos"] = a_centimos(cobro["pendiente"])
+                cobro["monto_centimos"] = (entrada["adelanto_centimos"] or 0) + cobro["pendiente_centimos"]
+                cobro["descripcion"] = f"Cobro salida - {entrada['placa']} - {entrada['cliente_nombre'] or 'Sin nombre'} - {cobro['dias_reales']} día(s)"
+
+        cursor.executemany("""
+            UPDATE entradas
+            SET salio = 1,
+                fecha_salida = datetime('now', 'localtime'),
+                hora_salida_real = time('now', 'localtime'),
+                dias = ?,
+                monto = ?, monto_centimos = ?,
+                penalidad = ?, penalidad_centimos = ?,
+                pagado = 1,
+                observaciones = ?,
+                trabajador_salida_id = ?
+            WHERE id = ? AND salio = 0
+        """, [(
+            cobro["dias_reales"],
+            a_soles(cobro["monto_centimos"]), cobro["monto_centimos"],
+            a_soles(cobro["penalidad_centimos"]), cobro["penalidad_centimos"],
+            data.get("observaciones") or entrada["observaciones"] or "",
+            trabajador_id,
+            entrada["id"]
+        ) for entrada, cobro in zip(entradas, cobros)])
+
+        # Si otro worker registró alguna salida en medio, no cobrar dos veces
+        if cursor.rowcount != len(entradas):
+            db.rollback()
+            return jsonify({"ok": False, "error": "Alguno de estos vehículos acaba de salir. Intente de nuevo."})
+
+        cursor.execute("SELECT IFNULL(MAX(id), 0) FROM movimientos_caja")
+        ultimo_movimiento = cursor.fetchone()[0]
+
+        cursor.executemany("""
+            INSERT INTO movimientos_caja (
+                turno_id, entrada_id, trabajador_id, tipo, monto, monto_centimos, metodo_pago, descripcion
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, [(
+            turno_id,
+            entrada["id"],
+            trabajador_id,
+            cobro["tipo"],
+            a_soles(cobro["pendiente_centimos"]),
+            cobro["pendiente_centimos"],
+            metodo_pago,
+            cobro["descripcion"]
+        ) for entrada, cobro in zip(entradas, cobros) if cobro["pendiente_centimos"] > 0])
+
+        cursor.execute("SELECT id FROM movimientos_caja WHERE id > ?", (ultimo_movimiento,))
+        movimiento_ids = [r["id"] for r in cursor.fetchall()]
+
+        db.commit()
+
+        salida_ids = [e["id"] for e in entradas]
+        actualizar_ocupacion(salida_ids)
+        publicar_evento('salidas_lote', {
+            "ids": salida_ids,
+            "placas": [e["placa"] for e in entradas],
+            "ocupados": total_ocupados()
+        }, turno_id)
+        if movimiento_ids:
+            invalidar_caja()
+            publicar_movimientos(movimiento_ids)
+
+        return jsonify({
+            "ok": True,
+            "mensaje": f"{len(salida_ids)} salida(s) registrada(s)",
+            "no_encontrados": no_encontrados,
+            "recibo": _recibo_salidas(cursor, salida_ids)
         })
 
     except Exception as e:
+        print(f"Error al registrar salidas en lote: {e}")
         return jsonify({"ok": False, "error": str(e)})
 
 
+def _recibo_salidas(cursor, ids):
+    """Recibo agregado de varias salidas (lo cobrado sale de movimientos_caja)"""
+    cursor.execute(f"""
+        SELECT
+            e.id, c.placa, c.nombre as cliente,
+            e.fecha_entrada, e.hora_entrada, e.fecha_salida,
+            e.dias, e.precio_dia,
+            IFNULL(e.penalidad_centimos, 0) as penalidad_centimos,
+            IFNULL(e.adelanto_centimos, 0) as adelanto_centimos,
+            IFNULL(e.monto_centimos, 0) as monto_centimos,
+            (SELECT IFNULL(SUM(m.monto_centimos), 0) FROM movimientos_caja m
+             WHERE m.entrada_id = e.id AND m.tipo IN ('COBRO_SALIDA', 'PENALIDAD')) as cobrado_centimos,
+            t.nombre as trabajador
+        FROM entradas e
+        JOIN clientes c ON e.cliente_id = c.id
+        LEFT JOIN trabajadores t ON e.trabajador_salida_id = t.id
+        WHERE e.id IN ({','.join('?' * len(ids))}) AND e.salio = 1
+        ORDER BY c.placa
+    """, ids)
+    # Los totales se suman en céntimos; cada vehículo lleva sus montos en soles
+    totales = {"penalidad": 0, "adelanto": 0, "monto": 0, "cobrado": 0}
+    vehiculos = []
+    for fila in cursor.fetchall():
+        vehiculo = dict(fila)
+        for campo in totales:
+            centimos = vehiculo.pop(f"{campo}_centimos")
+            totales[campo] += centimos
+            vehiculo[campo] = a_soles(centimos)
+        vehiculos.append(vehiculo)
+
+    return {
+        "vehiculos": vehiculos,
+        "total_vehiculos": len(vehiculos),
+        "total_dias": sum(v["dias"] or 0 for v in vehiculos),
+        "total_penalidad": a_soles(totales["penalidad"]),
+        "total_adelantos": a_soles(totales["adelanto"]),
+        "total_monto": a_soles(totales["monto"]),
+        "total_cobrado": a_soles(totales["cobrado"]),
+        "trabajador": vehiculos[0]["trabajador"] if vehiculos else "",
+        "fecha_emision": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
 # ============================================
 # CAPACIDAD Y ALERTAS
 # ============================================
@@ -709,11 +1151,7 @@ def verificar_capacidad():
     capacidad = int(obtener_configuracion('capacidad_maxima', 50))
 
     try:
-        db = get_db()
-        cursor = db.cursor()
-
-        cursor.execute("SELECT COUNT(*) FROM entradas WHERE salio = 0")
-        ocupados = cursor.fetchone()[0]
+        ocupados = total_ocupados()
 
         disponibles = capacidad - ocupados
         porcentaje = (ocupados / capacidad) * 100 if capacidad > 0 else 0
@@ -732,29 +1170,20 @@ def verificar_capacidad():
 
 @vehiculos_bp.route("/obtener_alertas")
 @login_required
+@respuesta_versionada('ocupacion', 'configuracion', segundos=3600)
 def obtener_alertas():
     """Obtiene las alertas del sistema"""
     try:
-        db = get_db()
-        cursor = db.cursor()
-
         alertas = []
 
         # Alertas de vehículos que exceden tiempo
-        cursor.execute("""
-            SELECT 
-                c.placa,
-                c.nombre as cliente,
-                e.dias as dias_pactados,
-                MAX(1, CAST((julianday(datetime('now', 'localtime')) - julianday(e.fecha_entrada)) + 0.5 AS INTEGER)) as dias_reales
-            FROM entradas e
-            JOIN clientes c ON e.cliente_id = c.id
-            WHERE e.salio = 0
-            AND MAX(1, CAST((julianday(datetime('now', 'localtime')) - julianday(e.fecha_entrada)) + 0.5 AS INTEGER)) > e.dias
-        """)
+        activos = autos_activos()
+        ocupados = len(activos)
 
-        for auto in cursor.fetchall():
-            exceso = auto["dias_reales"] - auto["dias_pactados"]
+        for auto, cobro in zip(activos, calcular_cobros_activos(activos)):
+            if auto["dias_pactados"] is None or cobro["dias_reales"] <= auto["dias_pactados"]:
+                continue
+            exceso = cobro["dias_reales"] - auto["dias_pactados"]
             alertas.append({
                 "tipo": "exceso_tiempo",
                 "nivel": "warning",
@@ -765,8 +1194,6 @@ def obtener_alertas():
 
         # Alertas de capacidad
         capacidad = int(obtener_configuracion('capacidad_maxima', 50))
-        cursor.execute("SELECT COUNT(*) FROM entradas WHERE salio = 0")
-        ocupados = cursor.fetchone()[0]
         porcentaje = (ocupados / capacidad) * 100 if capacidad > 0 else 0
 
         if porcentaje >= 90:
@@ -887,3 +1314,24 @@ def ticket_entrada(id):
 
     except Exception as e:
         return f"Error: {e}", 500
+
+
+@vehiculos_bp.route("/ticket_salida_lote")
+@login_required
+def ticket_salida_lote():
+    """Muestra el recibo agregado de una salida en lote para imprimir"""
+    try:
+        ids = [int(i) for i in request.args.get("ids", "").split(",") if i.strip()]
+    except ValueError:
+        return "IDs inválidos", 400
+    if not ids:
+        return "IDs requeridos", 400
+
+    try:
+        recibo = _recibo_salidas(get_db().cursor(), ids)
+        if not recibo["vehiculos"]:
+            return "Salidas no encontradas", 404
+        return render_template("ticket_salida_lote.html", recibo=recibo)
+
+    except Exception as e:
+        return f"Error: {e}", 500
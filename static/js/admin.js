@@ -17,8 +17,61 @@ document.addEventListener('DOMContentLoaded', function() {
             if (this.dataset.tab === 'clientes') cargarClientes();
         });
     });
+
+    if (document.getElementById('heatmap-ocupacion')) cargarMapaOcupacion();
 });
 
+// --- MAPA DE CALOR DE OCUPACION ---
+const DIAS_SEMANA = ['Lun', 'Mar', 'Mie', 'Jue', 'Vie', 'Sab', 'Dom'];
+
+function cargarMapaOcupacion() {
+    const desde = new Date();
+    desde.setDate(desde.getDate() - parseInt(document.getElementById('heatmap-rango').value));
+    const params = new URLSearchParams({
+        agrupar: 'dia_semana',
+        fecha_desde: desde.toLocaleDateString('en-CA')
+    });
+
+    fetch('/admin/ocupacion?' + params)
+        .then(r => r.json())
+        .then(data => {
+            if (!data.ok) {
+                mostrarToast(data.error, 'error');
+                return;
+            }
+            dibujarMapaOcupacion(data.ocupacion);
+
+            const resumen = data.resumen;
+            document.getElementById('heatmap-resumen').textContent = resumen.momento_pico
+                ? `Promedio: ${resumen.promedio} autos · Pico: ${resumen.pico} autos (${resumen.momento_pico})`
+                : 'Sin datos en este rango';
+        })
+        .catch(() => mostrarToast('Error al cargar la ocupacion', 'error'));
+}
+
+function dibujarMapaOcupacion(celdas) {
+    const maximo = Math.max(1, ...celdas.map(c => c.promedio));
+    const porCelda = {};
+    celdas.forEach(c => porCelda[c.dia_semana + '-' + c.hora] = c);
+
+    let html = '<span></span>';
+    for (let hora = 0; hora < 24; hora++) {
+        html += `<span class="heatmap-hora">${hora % 3 === 0 ? hora : ''}</span>`;
+    }
+    DIAS_SEMANA.forEach((dia, d) => {
+        html += `<span class="heatmap-dia">${dia}</span>`;
+        for (let hora = 0; hora < 24; hora++) {
+            const celda = porCelda[d + '-' + hora];
+            const titulo = celda
+                ? `${dia} ${hora}:00 - promedio ${celda.promedio}, pico ${celda.pico}`
+                : `${dia} ${hora}:00 - sin datos`;
+            const fondo = celda ? `style="background: rgba(79, 70, 229, ${(celda.promedio / maximo).toFixed(2)})"` : '';
+            html += `<span class="heatmap-celda" ${fondo} title="${titulo}"></span>`;
+        }
+    });
+    document.getElementById('heatmap-ocupacion').innerHTML = html;
+}
+
 // --- USUARIOS ---
 function cargarUsuarios() {
     fetch('/admin/usuarios')
@@ -160,11 +213,53 @@ function guardarConfiguracion(e) {
     });
 }
 
+// --- PAGINACIÓN POR CURSOR ---
+// Cada listado guarda el cursor con que empieza cada página ya visitada;
+// el total se pide solo al cargar la primera página.
+function crearPaginador() {
+    return { pagina: 1, cursores: [null], total: null, porPagina: 0 };
+}
+
+function parametrosPagina(paginador, pagina, params) {
+    paginador.pagina = pagina;
+    if (pagina === 1) {
+        paginador.cursores = [null];
+        paginador.total = null;
+        params.append('contar', '1');
+    }
+    const despues = paginador.cursores[pagina - 1];
+    if (despues) params.append('despues', despues);
+}
+
+function registrarPagina(paginador, data) {
+    if (data.total != null) paginador.total = data.total;
+    paginador.porPagina = data.por_pagina;
+    paginador.cursores[paginador.pagina] = data.siguiente || null;
+}
+
+function controlesPagina(paginador, funcion, etiqueta) {
+    const p = paginador.pagina;
+    let html = '';
+    if (p > 1) {
+        html += `<button class="btn-sm btn-secondary" onclick="${funcion}(1)">«</button> `;
+        html += `<button class="btn-sm btn-secondary" onclick="${funcion}(${p - 1})">◀</button> `;
+    }
+    const paginas = paginador.total != null ? Math.max(1, Math.ceil(paginador.total / paginador.porPagina)) : null;
+    html += `<button class="btn-sm btn-primary">${p}${paginas ? ' / ' + paginas : ''}</button> `;
+    if (paginador.cursores[p]) {
+        html += `<button class="btn-sm btn-secondary" onclick="${funcion}(${p + 1})">▶</button> `;
+    }
+    if (paginador.total != null) {
+        html += `<span class="pag-total">Total: ${paginador.total} ${etiqueta}</span>`;
+    }
+    return html;
+}
+
 // --- REPORTES DE TURNOS ---
-let reportesPagina = 1;
+const paginadorReportes = crearPaginador();
 
 function cargarFiltrosTrabajadores() {
-    fetch('/admin/reportes_turnos?pagina=1&por_pagina=1')
+    fetch('/admin/reportes_turnos?por_pagina=1')
         .then(r => r.json())
         .then(data => {
             if (!data.ok) return;
@@ -179,19 +274,19 @@ function cargarFiltrosTrabajadores() {
 }
 
 function buscarReportes(pagina) {
-    reportesPagina = pagina || 1;
     const params = new URLSearchParams({
         trabajador_id: document.getElementById('filtro-trabajador').value,
         fecha_desde: document.getElementById('filtro-reporte-desde').value,
         fecha_hasta: document.getElementById('filtro-reporte-hasta').value,
-        pagina: reportesPagina,
         por_pagina: 20
     });
+    parametrosPagina(paginadorReportes, pagina || 1, params);
 
     fetch('/admin/reportes_turnos?' + params)
         .then(r => r.json())
         .then(data => {
             if (!data.ok) return;
+            registrarPagina(paginadorReportes, data);
             const tbody = document.getElementById('tbody-reportes');
 
             if (!data.turnos.length) {
@@ -226,14 +321,8 @@ function buscarReportes(pagina) {
             }).join('');
 
             // Paginacion
-            let pagHtml = '';
-            if (data.total_paginas > 1) {
-                for (let i = 1; i <= data.total_paginas; i++) {
-                    pagHtml += `<button class="btn-sm ${i === data.pagina ? 'btn-primary' : 'btn-secondary'}" onclick="buscarReportes(${i})">${i}</button> `;
-                }
-            }
-            pagHtml += `<span class="pag-total">Total: ${data.total} turnos</span>`;
-            document.getElementById('paginacion-reportes').innerHTML = pagHtml;
+            document.getElementById('paginacion-reportes').innerHTML =
+                controlesPagina(paginadorReportes, 'buscarReportes', 'turnos');
         });
 }
 
@@ -245,6 +334,54 @@ function limpiarFiltrosReportes() {
     document.getElementById('paginacion-reportes').innerHTML = '';
 }
 
+function buscarAutosEnMomento() {
+    const momento = document.getElementById('momento-cochera').value;
+    if (!momento) {
+        mostrarToast('Elija fecha y hora', 'error');
+        return;
+    }
+
+    fetch('/admin/autos_en_momento?' + new URLSearchParams({momento}))
+        .then(r => r.json())
+        .then(data => {
+            if (!data.ok) {
+                mostrarToast(data.error, 'error');
+                return;
+            }
+            const turno = data.turno
+                ? ` · Turno de ${data.turno.trabajador} (desde ${formatearFecha(data.turno.fecha_inicio)})`
+                : ' · Sin turno abierto';
+            document.getElementById('momento-resumen').textContent =
+                `${data.total} autos en cochera el ${formatearFecha(data.momento)}${turno}`;
+
+            const tbody = document.getElementById('tbody-momento');
+            if (!data.autos.length) {
+                tbody.innerHTML = '<tr><td colspan="7" class="tabla-vacia"><div class="empty-state"><span class="empty-icon">🕒</span><p>No había autos en ese momento</p></div></td></tr>';
+                return;
+            }
+
+            tbody.innerHTML = data.autos.map(a => `
+                <tr>
+                    <td><strong>${a.placa}</strong></td>
+                    <td>${a.cliente || '-'}</td>
+                    <td class="fecha-col">${a.fecha_entrada} ${a.hora_entrada || ''}</td>
+                    <td class="fecha-col">${a.fecha_salida ? formatearFecha(a.fecha_salida) : 'En cochera'}</td>
+                    <td>${a.trabajador_entrada || '-'}</td>
+                    <td>S/ ${parseFloat(a.pagado_al_momento || 0).toFixed(2)}</td>
+                    <td>S/ ${parseFloat(a.monto || 0).toFixed(2)}</td>
+                </tr>`).join('');
+        })
+        .catch(() => mostrarToast('Error al buscar', 'error'));
+}
+
+function exportarReportes(formato, boton) {
+    exportarEnSegundoPlano('reportes_turnos', formato, {
+        trabajador_id: document.getElementById('filtro-trabajador').value,
+        fecha_desde: document.getElementById('filtro-reporte-desde').value,
+        fecha_hasta: document.getElementById('filtro-reporte-hasta').value
+    }, boton);
+}
+
 function verDetalleTurno(turnoId) {
     document.getElementById('modal-detalle-turno').style.display = 'flex';
     document.getElementById('detalle-turno-body').innerHTML = '<p style="text-align:center;padding:2rem;">Cargando...</p>';
@@ -360,16 +497,15 @@ function formatearFecha(str) {
 }
 
 // --- CLIENTES ---
-let clientesPagina = 1;
+const paginadorClientes = crearPaginador();
 
 function cargarClientes(pagina) {
-    clientesPagina = pagina || 1;
     const busqueda = document.getElementById('buscar-cliente').value;
     const params = new URLSearchParams({
         busqueda: busqueda,
-        pagina: clientesPagina,
         por_pagina: 50
     });
+    parametrosPagina(paginadorClientes, pagina || 1, params);
 
     fetch('/admin/clientes?' + params)
         .then(r => r.json())
@@ -378,6 +514,7 @@ function cargarClientes(pagina) {
                 mostrarToast(data.error, 'error');
                 return;
             }
+            registrarPagina(paginadorClientes, data);
             const tbody = document.getElementById('tbody-clientes');
 
             if (!data.clientes.length) {
@@ -404,14 +541,8 @@ function cargarClientes(pagina) {
             }).join('');
 
             // Paginacion
-            let pagHtml = '';
-            if (data.total_paginas > 1) {
-                for (let i = 1; i <= data.total_paginas; i++) {
-                    pagHtml += `<button class="btn-sm ${i === data.pagina ? 'btn-primary' : 'btn-secondary'}" onclick="cargarClientes(${i})">${i}</button> `;
-                }
-            }
-            pagHtml += `<span class="pag-total">Total: ${data.total} clientes</span>`;
-            document.getElementById('paginacion-clientes').innerHTML = pagHtml;
+            document.getElementById('paginacion-clientes').innerHTML =
+                controlesPagina(paginadorClientes, 'cargarClientes', 'clientes');
         });
 }
 
@@ -421,6 +552,12 @@ function filtrarClientes() {
     window.clienteFilterTimeout = setTimeout(() => cargarClientes(1), 400);
 }
 
+function exportarClientes(formato, boton) {
+    exportarEnSegundoPlano('clientes', formato, {
+        busqueda: document.getElementById('buscar-cliente').value
+    }, boton);
+}
+
 function abrirModalCliente(cliente = null) {
     document.getElementById('modal-cliente-titulo').textContent = cliente ? 'Editar Cliente' : 'Nuevo Cliente';
     document.getElementById('form-cliente').reset();
@@ -471,7 +608,7 @@ function guardarCliente(e) {
         if (data.ok) {
             mostrarToast(data.mensaje);
             cerrarModalCliente();
-            cargarClientes(clientesPagina);
+            cargarClientes(paginadorClientes.pagina);
         } else {
             mostrarToast(data.error, 'error');
         }
@@ -489,7 +626,7 @@ function eliminarCliente(id) {
         .then(data => {
             if (data.ok) {
                 mostrarToast(data.mensaje);
-                cargarClientes(clientesPagina);
+                cargarClientes(paginadorClientes.pagina);
             } else {
                 mostrarToast(data.error, 'error');
             }
@@ -8,7 +8,32 @@
 // VARIABLES GLOBALES
 // ========================================
 let autosEnCocheraData = [];
-let historialPaginaActual = 1;
+const autosSeleccionados = new Set();  // ids marcados para salida en lote
+const respuestasCacheadas = {};  // url -> { etag, data }
+let totalesTurno = null;         // ultimos totales de /ingresos_turno
+const movimientosMostrados = new Set();
+
+// ========================================
+// PETICIONES CONDICIONALES
+// ========================================
+// Envía el ETag de la última respuesta; si el servidor contesta 304 se
+// reutiliza el JSON guardado en vez de volver a descargarlo.
+async function fetchConEtag(url) {
+    const previa = respuestasCacheadas[url];
+    const headers = previa ? { 'If-None-Match': previa.etag } : {};
+    const response = await fetch(url, { headers, cache: 'no-store' });
+
+    if (response.status === 304 && previa) return previa.data;
+
+    const data = await response.json();
+    const etag = response.headers.get('ETag');
+    if (etag) {
+        respuestasCacheadas[url] = { etag, data };
+    } else {
+        delete respuestasCacheadas[url];
+    }
+    return data;
+}
 
 // ========================================
 // INICIALIZACION
@@ -17,8 +42,7 @@ document.addEventListener('DOMContentLoaded', function() {
     cargarIngresos();
     cargarAlertas();
 
-    setInterval(cargarIngresos, 30000);
-    setInterval(cargarAlertas, 30000);
+    iniciarEventos();
 
     inicializarEventosEntrada();
     inicializarEventosSalida();
@@ -36,36 +60,107 @@ function inicializarEventosEntrada() {
     if (dias) dias.addEventListener('input', calcularMonto);
     if (precio) precio.addEventListener('input', calcularMonto);
 
-    // Buscar cliente al escribir placa (con debounce)
+    // Sugerir placas de clientes al escribir (autocompletado por prefijo)
     if (placa) {
         let placaTimeout;
         placa.addEventListener('input', function() {
             clearTimeout(placaTimeout);
             const val = this.value.trim().toUpperCase();
-            if (val.length >= 3) {
-                placaTimeout = setTimeout(() => buscarClientePorPlaca(val), 400);
+            if (val.length >= 1) {
+                placaTimeout = setTimeout(() => sugerirPlacasEntrada(val), 120);
+            } else {
+                ocultarSugerenciasEntrada();
             }
         });
+
+        // Navegar la lista con el teclado
+        placa.addEventListener('keydown', function(e) {
+            const items = document.querySelectorAll('#sugerenciasEntrada .sugerencia-item[data-indice]');
+            if (!items.length) return;
+            if (e.key === 'ArrowDown' || e.key === 'ArrowUp') {
+                e.preventDefault();
+                const paso = e.key === 'ArrowDown' ? 1 : -1;
+                sugerenciaActiva = (sugerenciaActiva + paso + items.length) % items.length;
+                items.forEach((item, i) => item.classList.toggle('activa', i === sugerenciaActiva));
+            } else if (e.key === 'Enter' && sugerenciaActiva >= 0) {
+                e.preventDefault();
+                seleccionarPlacaEntrada(sugerenciaActiva);
+            } else if (e.key === 'Escape') {
+                ocultarSugerenciasEntrada();
+            }
+        });
+
+        placa.addEventListener('blur', () => setTimeout(ocultarSugerenciasEntrada, 150));
     }
 }
 
-async function buscarClientePorPlaca(placa) {
+let sugerenciasEntrada = [];
+let sugerenciaActiva = -1;
+
+async function sugerirPlacasEntrada(texto) {
     try {
-        const response = await fetch(`/buscar_cliente/${placa}`);
+        const response = await fetch(`/autocompletar_placa?q=${encodeURIComponent(texto)}`);
         const data = await response.json();
+        if (!data.ok) return;
+
+        // Ignorar respuestas de algo que ya no está escrito
+        const placa = document.getElementById('placa');
+        if (!placa || placa.value.trim().toUpperCase() !== texto) return;
+
+        sugerenciasEntrada = data.sugerencias;
+        sugerenciaActiva = -1;
 
-        if (data.existe) {
-            document.getElementById('cliente').value = data.nombre || '';
-            document.getElementById('celular').value = data.celular || '';
-            document.getElementById('precio').value = data.precio_dia || 10;
-            calcularMonto();
-            mostrarToast('Cliente encontrado: ' + data.nombre, 'exito');
+        const exacta = sugerenciasEntrada.find(c => c.placa === texto);
+        if (exacta) {
+            completarCliente(exacta);
         }
+
+        const container = document.getElementById('sugerenciasEntrada');
+        if (!container) return;
+
+        if (sugerenciasEntrada.length === 0 || (exacta && sugerenciasEntrada.length === 1)) {
+            ocultarSugerenciasEntrada();
+            return;
+        }
+
+        container.innerHTML = sugerenciasEntrada.map((c, i) => `
+            <div class="sugerencia-item" data-indice="${i}" onmousedown="seleccionarPlacaEntrada(${i})">
+                <strong>${c.placa}</strong>
+                <span>${c.nombre || ''}${c.celular ? ' - ' + c.celular : ''}</span>
+                <small>${c.en_cochera ? '🅿️ En cochera' : 'S/ ' + Number(c.precio_dia || 0).toFixed(2) + '/día'}</small>
+            </div>
+        `).join('');
+        container.style.display = 'block';
     } catch (error) {
-        console.error('Error buscando cliente:', error);
+        console.error('Error buscando placas:', error);
     }
 }
 
+function seleccionarPlacaEntrada(indice) {
+    const cliente = sugerenciasEntrada[indice];
+    if (!cliente) return;
+    document.getElementById('placa').value = cliente.placa;
+    completarCliente(cliente);
+    ocultarSugerenciasEntrada();
+    document.getElementById('dias')?.focus();
+}
+
+function completarCliente(cliente) {
+    document.getElementById('cliente').value = cliente.nombre || '';
+    document.getElementById('celular').value = cliente.celular || '';
+    document.getElementById('precio').value = cliente.precio_dia || 10;
+    calcularMonto();
+    if (cliente.en_cochera) {
+        mostrarToast('⚠️ ' + cliente.placa + ' ya se encuentra en la cochera', 'error');
+    }
+}
+
+function ocultarSugerenciasEntrada() {
+    const container = document.getElementById('sugerenciasEntrada');
+    if (container) container.style.display = 'none';
+    sugerenciaActiva = -1;
+}
+
 // ========================================
 // EVENTOS INTERACTIVOS - SALIDA
 // ========================================
@@ -105,8 +200,7 @@ function inicializarEventosSalida() {
 
 async function buscarSugerenciasSalida(texto) {
     try {
-        const response = await fetch('/autos_en_cochera');
-        const data = await response.json();
+        const data = await fetchConEtag('/autos_en_cochera');
         if (!data.ok) return;
 
         const coincidencias = data.autos.filter(a =>
@@ -158,6 +252,7 @@ function abrirModal() {
 
 function cerrarModal() {
     document.getElementById('modalEntrada').style.display = 'none';
+    ocultarSugerenciasEntrada();
 }
 
 function limpiarFormularioEntrada() {
@@ -271,75 +366,229 @@ async function guardarEntrada() {
     }
 }
 
+// ========================================
+// ENTRADA EN LOTE (flotas, eventos)
+// ========================================
+function abrirModalLote() {
+    document.getElementById('modalEntradaLote').style.display = 'flex';
+    document.getElementById('lotePlacas').value = '';
+    document.getElementById('loteCliente').value = '';
+    document.getElementById('loteCelular').value = '';
+    document.getElementById('lotePrecio').value = '10';
+    document.getElementById('loteDias').value = '1';
+    document.getElementById('loteObservaciones').value = '';
+    document.getElementById('loteDejoLlave').checked = false;
+    document.getElementById('lotePagado').checked = false;
+    document.getElementById('loteSeccionPago').style.display = 'none';
+    document.getElementById('loteMontoRecibido').value = '0';
+    document.getElementById('loteResultados').style.display = 'none';
+    contarPlacasLote();
+    setTimeout(() => document.getElementById('lotePlacas')?.focus(), 200);
+}
+
+function cerrarModalLote() {
+    document.getElementById('modalEntradaLote').style.display = 'none';
+}
+
+function placasLote() {
+    return document.getElementById('lotePlacas').value
+        .split(/[\n,;]+/)
+        .map(p => p.trim().toUpperCase())
+        .filter(p => p);
+}
+
+function contarPlacasLote() {
+    const cantidad = placasLote().length;
+    document.getElementById('loteContador').textContent = cantidad + (cantidad === 1 ? ' placa' : ' placas');
+    calcularMontoLote();
+}
+
+function calcularMontoLote() {
+    const dias = parseInt(document.getElementById('loteDias').value) || 1;
+    const precio = parseFloat(document.getElementById('lotePrecio').value) || 0;
+    const total = dias * precio * placasLote().length;
+    document.getElementById('loteMontoTotal').value = 'S/ ' + total.toFixed(2);
+}
+
+function toggleSeccionPagoLote() {
+    const pagado = document.getElementById('lotePagado').checked;
+    const montoRecibido = document.getElementById('loteMontoRecibido');
+
+    document.getElementById('loteSeccionPago').style.display = pagado ? 'block' : 'none';
+    if (pagado) {
+        const dias = parseInt(document.getElementById('loteDias').value) || 1;
+        const precio = parseFloat(document.getElementById('lotePrecio').value) || 0;
+        montoRecibido.value = (dias * precio).toFixed(2);
+    } else {
+        montoRecibido.value = '0';
+    }
+}
+
+async function guardarEntradasLote() {
+    const placas = placasLote();
+    const precio = parseFloat(document.getElementById('lotePrecio').value);
+    const pagado = document.getElementById('lotePagado').checked;
+
+    if (placas.length === 0) { mostrarToast('Ingrese al menos una placa', 'error'); return; }
+    if (!precio || precio <= 0) { mostrarToast('El precio debe ser mayor a 0', 'error'); return; }
+
+    let montoRecibido = 0;
+    let metodoPago = 'efectivo';
+    if (pagado) {
+        montoRecibido = parseFloat(document.getElementById('loteMontoRecibido').value) || 0;
+        metodoPago = document.getElementById('loteMetodoPago').value;
+        if (montoRecibido <= 0) {
+            mostrarToast('Ingrese el monto recibido', 'error');
+            return;
+        }
+    }
+
+    const datos = {
+        vehiculos: placas.map(placa => ({ placa })),
+        cliente: document.getElementById('loteCliente').value.trim(),
+        celular: document.getElementById('loteCelular').value,
+        dias: parseInt(document.getElementById('loteDias').value) || 1,
+        precio: precio,
+        adelanto: montoRecibido,
+        metodo_pago: metodoPago,
+        dejo_llave: document.getElementById('loteDejoLlave').checked,
+        pagado: pagado,
+        observaciones: document.getElementById('loteObservaciones').value
+    };
+
+    const boton = document.getElementById('btnGuardarLote');
+    boton.disabled = true;
+    try {
+        const response = await fetch('/guardar_entradas_lote', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(datos)
+        });
+        const data = await response.json();
+
+        if (data.resultados) renderizarResultadosLote(data.resultados);
+
+        if (data.ok) {
+            mostrarToast(data.mensaje, data.rechazadas ? 'error' : 'exito');
+            cargarIngresos();
+            // Dejar en el campo solo las placas rechazadas para corregirlas
+            document.getElementById('lotePlacas').value = data.resultados
+                .filter(r => !r.ok).map(r => r.placa).join('\n');
+            contarPlacasLote();
+        } else {
+            mostrarToast(data.error, 'error');
+        }
+    } catch (error) {
+        mostrarToast('Error al guardar el lote', 'error');
+    } finally {
+        boton.disabled = false;
+    }
+}
+
+function renderizarResultadosLote(resultados) {
+    const contenedor = document.getElementById('loteResultados');
+    contenedor.style.display = 'block';
+    contenedor.innerHTML = resultados.map(r => `
+        <div>
+            <strong>${r.placa || '-'}</strong>
+            ${r.ok
+                ? `<span class="badge badge-success">Guardada</span>
+                   <button class="btn-mini" onclick="window.open('/ticket_entrada/${r.id}', '_blank')">🎫</button>`
+                : `<span class="badge badge-danger">${r.error}</span>`}
+        </div>
+    `).join('');
+}
+
 // ========================================
 // CARGAR INGRESOS DEL TURNO
 // ========================================
 async function cargarIngresos() {
     try {
-        const response = await fetch('/ingresos_turno');
-        const data = await response.json();
+        const data = await fetchConEtag('/ingresos_turno');
+        if (data.error) throw new Error(data.error);
 
         const tbody = document.getElementById('tablaIngresos');
 
+        movimientosMostrados.clear();
         if (!data.ingresos || data.ingresos.length === 0) {
-            tbody.innerHTML = `
-                <tr>
-                    <td colspan="7" class="tabla-vacia">
-                        <div class="empty-state">
-                            <span class="empty-icon">📭</span>
-                            <p>Sin movimientos en este turno</p>
-                        </div>
-                    </td>
-                </tr>
-            `;
+            tbody.innerHTML = filaSinMovimientos();
         } else {
-            tbody.innerHTML = '';
-            data.ingresos.forEach(ing => {
-                const tipoBadge = getTipoBadge(ing.tipo);
-                const metodoBadge = ing.metodo_pago === 'yape'
-                    ? '<span class="badge badge-yape"><img src="/static/img/yape.png" alt="Yape" class="yape-icon"></span>'
-                    : '<span class="badge badge-efectivo">💵</span>';
-
-                tbody.innerHTML += `
-                    <tr>
-                        <td>${ing.hora}</td>
-                        <td>${tipoBadge}</td>
-                        <td><strong>${ing.placa}</strong></td>
-                        <td>${ing.cliente}</td>
-                        <td class="monto">S/ ${ing.monto.toFixed(2)}</td>
-                        <td>${metodoBadge}</td>
-                        <td>
-                            <button class="btn-icono" onclick="verDetalle(${ing.id})" title="Ver detalle">👁️</button>
-                        </td>
-                    </tr>
-                `;
-            });
+            tbody.innerHTML = data.ingresos.map(filaIngreso).join('');
+            data.ingresos.forEach(ing => movimientosMostrados.add(ing.id));
         }
 
-        document.getElementById('totalEfectivo').textContent = data.total_efectivo.toFixed(2);
-        document.getElementById('totalYape').textContent = data.total_yape.toFixed(2);
-        document.getElementById('totalTurno').textContent = data.total.toFixed(2);
-
-        // Actualizar KPI cards en tiempo real
-        const kpiTotal = document.getElementById('kpiTotalCaja');
-        const kpiEfectivo = document.getElementById('kpiEfectivo');
-        const kpiYape = document.getElementById('kpiYape');
-        const kpiIngresados = document.getElementById('kpiIngresados');
-        const kpiSalieron = document.getElementById('kpiSalieron');
-        const kpiEnCochera = document.getElementById('kpiEnCochera');
-
-        if (kpiTotal) kpiTotal.textContent = `S/ ${data.total.toFixed(2)}`;
-        if (kpiEfectivo) kpiEfectivo.textContent = data.total_efectivo.toFixed(2);
-        if (kpiYape) kpiYape.textContent = data.total_yape.toFixed(2);
-        if (kpiIngresados) kpiIngresados.textContent = data.autos_ingresados;
-        if (kpiSalieron) kpiSalieron.textContent = data.autos_salieron;
-        if (kpiEnCochera) kpiEnCochera.textContent = data.autos_en_cochera;
+        totalesTurno = {
+            total_efectivo: data.total_efectivo,
+            total_yape: data.total_yape,
+            autos_ingresados: data.autos_ingresados,
+            autos_salieron: data.autos_salieron,
+            autos_en_cochera: data.autos_en_cochera
+        };
+        pintarTotales();
 
     } catch (error) {
         console.error('Error cargando ingresos:', error);
     }
 }
 
+function filaSinMovimientos() {
+    return `
+        <tr>
+            <td colspan="7" class="tabla-vacia">
+                <div class="empty-state">
+                    <span class="empty-icon">📭</span>
+                    <p>Sin movimientos en este turno</p>
+                </div>
+            </td>
+        </tr>
+    `;
+}
+
+function filaIngreso(ing) {
+    const tipoBadge = getTipoBadge(ing.tipo);
+    const metodoBadge = ing.metodo_pago === 'yape'
+        ? '<span class="badge badge-yape"><img src="/static/img/yape.png" alt="Yape" class="yape-icon"></span>'
+        : '<span class="badge badge-efectivo">💵</span>';
+
+    return `
+        <tr>
+            <td>${ing.hora}</td>
+            <td>${tipoBadge}</td>
+            <td><strong>${ing.placa}</strong></td>
+            <td>${ing.cliente}</td>
+            <td class="monto">S/ ${ing.monto.toFixed(2)}</td>
+            <td>${metodoBadge}</td>
+            <td>
+                <button class="btn-icono" onclick="verDetalle(${ing.id})" title="Ver detalle">👁️</button>
+            </td>
+        </tr>
+    `;
+}
+
+function pintarTotales() {
+    const t = totalesTurno;
+    const total = t.total_efectivo + t.total_yape;
+
+    document.getElementById('totalEfectivo').textContent = t.total_efectivo.toFixed(2);
+    document.getElementById('totalYape').textContent = t.total_yape.toFixed(2);
+    document.getElementById('totalTurno').textContent = total.toFixed(2);
+
+    // KPI cards
+    const kpiTotal = document.getElementById('kpiTotalCaja');
+    const kpiEfectivo = document.getElementById('kpiEfectivo');
+    const kpiYape = document.getElementById('kpiYape');
+    const kpiIngresados = document.getElementById('kpiIngresados');
+    const kpiSalieron = document.getElementById('kpiSalieron');
+    const kpiEnCochera = document.getElementById('kpiEnCochera');
+
+    if (kpiTotal) kpiTotal.textContent = `S/ ${total.toFixed(2)}`;
+    if (kpiEfectivo) kpiEfectivo.textContent = t.total_efectivo.toFixed(2);
+    if (kpiYape) kpiYape.textContent = t.total_yape.toFixed(2);
+    if (kpiIngresados) kpiIngresados.textContent = t.autos_ingresados;
+    if (kpiSalieron) kpiSalieron.textContent = t.autos_salieron;
+    if (kpiEnCochera) kpiEnCochera.textContent = t.autos_en_cochera;
+}
+
 function getTipoBadge(tipo) {
     if (tipo.includes('ADELANTO')) return '<span class="badge badge-info">Adelanto</span>';
     if (tipo === 'PAGO_COMPLETO') return '<span class="badge badge-success">Pago Total</span>';
@@ -362,11 +611,14 @@ function cerrarModalAutosEnCochera() {
 
 async function cargarAutosEnCochera() {
     try {
-        const response = await fetch('/autos_en_cochera');
-        const data = await response.json();
+        const data = await fetchConEtag('/autos_en_cochera');
         if (!data.ok) throw new Error(data.error);
 
         autosEnCocheraData = data.autos;
+        // Descartar seleccionados que ya no estan en la cochera
+        const vigentes = new Set(data.autos.map(a => a.id));
+        [...autosSeleccionados].forEach(id => { if (!vigentes.has(id)) autosSeleccionados.delete(id); });
+        actualizarSeleccionLote();
         renderizarAutosEnCochera(data.autos);
         document.getElementById('contadorAutos').textContent = data.total + ' autos';
     } catch (error) {
@@ -379,7 +631,7 @@ function renderizarAutosEnCochera(autos) {
 
     if (!autos || autos.length === 0) {
         tbody.innerHTML = `
-            <tr><td colspan="7" class="tabla-vacia">
+            <tr><td colspan="8" class="tabla-vacia">
                 <div class="empty-state">
                     <span class="empty-icon">🅿️</span>
                     <p>No hay autos en la cochera</p>
@@ -398,6 +650,8 @@ function renderizarAutosEnCochera(autos) {
 
         return `
             <tr class="${auto.excede_tiempo ? 'fila-excedida' : ''}">
+                <td><input type="checkbox" ${autosSeleccionados.has(auto.id) ? 'checked' : ''}
+                           onchange="toggleSeleccionAuto(${auto.id}, this.checked)"></td>
                 <td><strong>${auto.placa}</strong></td>
                 <td>${auto.cliente}</td>
                 <td class="fecha-col">${auto.fecha_entrada} ${auto.hora_entrada || ''}</td>
@@ -422,6 +676,58 @@ function filtrarAutosEnCochera() {
     renderizarAutosEnCochera(filtrados);
 }
 
+function toggleSeleccionAuto(id, marcado) {
+    if (marcado) autosSeleccionados.add(id); else autosSeleccionados.delete(id);
+    actualizarSeleccionLote();
+}
+
+function seleccionarTodosAutos(marcado) {
+    const filtro = document.getElementById('buscarAutoEnCochera').value.toLowerCase();
+    autosEnCocheraData
+        .filter(a => a.placa.toLowerCase().includes(filtro) || a.cliente.toLowerCase().includes(filtro))
+        .forEach(a => { if (marcado) autosSeleccionados.add(a.id); else autosSeleccionados.delete(a.id); });
+    actualizarSeleccionLote();
+    filtrarAutosEnCochera();
+}
+
+function actualizarSeleccionLote() {
+    document.getElementById('contadorSeleccionados').textContent = autosSeleccionados.size;
+    document.getElementById('btnSalidaLote').disabled = autosSeleccionados.size === 0;
+}
+
+async function registrarSalidasLote() {
+    const seleccionados = autosEnCocheraData.filter(a => autosSeleccionados.has(a.id));
+    if (seleccionados.length === 0) return;
+
+    const total = seleccionados.reduce((suma, a) => suma + a.pendiente, 0);
+    if (!confirm(`Registrar la salida de ${seleccionados.length} vehiculo(s) y cobrar S/ ${total.toFixed(2)}?`)) return;
+
+    try {
+        const response = await fetch('/registrar_salidas_lote', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({
+                ids: seleccionados.map(a => a.id),
+                metodo_pago: document.getElementById('loteSalidaMetodoPago').value
+            })
+        });
+        const data = await response.json();
+
+        if (data.ok) {
+            mostrarToast(`${data.mensaje} - S/ ${data.recibo.total_cobrado.toFixed(2)}`, 'exito');
+            autosSeleccionados.clear();
+            cargarAutosEnCochera();
+            cargarIngresos();
+            const ids = data.recibo.vehiculos.map(v => v.id).join(',');
+            window.open('/ticket_salida_lote?ids=' + ids, '_blank');
+        } else {
+            mostrarToast(data.error, 'error');
+        }
+    } catch (error) {
+        mostrarToast('Error al registrar salidas', 'error');
+    }
+}
+
 // ========================================
 // SALIDA Y COBRO
 // ========================================
@@ -446,8 +752,7 @@ async function buscarParaSalida() {
     ocultarSugerencias();
 
     try {
-        const response = await fetch('/autos_en_cochera');
-        const data = await response.json();
+        const data = await fetchConEtag('/autos_en_cochera');
         const auto = data.autos.find(a => a.placa === placa);
 
         if (!auto) {
@@ -582,9 +887,49 @@ async function buscarHistorial() {
     buscarHistorialPaginado(1);
 }
 
-async function buscarHistorialPaginado(pagina) {
-    historialPaginaActual = pagina || 1;
+// Paginación por cursor: el servidor devuelve el cursor de la página
+// siguiente y aquí se guarda el de cada página visitada para volver atrás.
+function crearPaginador() {
+    return { pagina: 1, cursores: [null], total: null, porPagina: 0 };
+}
+
+function parametrosPagina(paginador, pagina, params) {
+    paginador.pagina = pagina;
+    if (pagina === 1) {
+        paginador.cursores = [null];
+        paginador.total = null;
+        params.append('contar', '1');
+    }
+    const despues = paginador.cursores[pagina - 1];
+    if (despues) params.append('despues', despues);
+}
 
+function registrarPagina(paginador, data) {
+    if (data.total != null) paginador.total = data.total;
+    paginador.porPagina = data.por_pagina;
+    paginador.cursores[paginador.pagina] = data.siguiente || null;
+}
+
+function controlesPagina(paginador, funcion, boton, activo) {
+    const p = paginador.pagina;
+    let html = '';
+    if (p > 1) {
+        html += `<button class="${boton}" onclick="${funcion}(1)">«</button> `;
+        html += `<button class="${boton}" onclick="${funcion}(${p - 1})">◀</button> `;
+    }
+    const paginas = paginador.total != null ? Math.max(1, Math.ceil(paginador.total / paginador.porPagina)) : null;
+    if (p > 1 || paginador.cursores[p]) {
+        html += `<button class="${activo}">${p}${paginas ? ' / ' + paginas : ''}</button> `;
+    }
+    if (paginador.cursores[p]) {
+        html += `<button class="${boton}" onclick="${funcion}(${p + 1})">▶</button> `;
+    }
+    return html;
+}
+
+const paginadorHistorial = crearPaginador();
+
+async function buscarHistorialPaginado(pagina) {
     const placa = document.getElementById('filtroPlaca').value;
     const fechaDesde = document.getElementById('filtroFechaDesde').value;
     const fechaHasta = document.getElementById('filtroFechaHasta').value;
@@ -595,16 +940,17 @@ async function buscarHistorialPaginado(pagina) {
     if (fechaDesde) params.append('fecha_desde', fechaDesde);
     if (fechaHasta) params.append('fecha_hasta', fechaHasta);
     if (estado) params.append('estado', estado);
-    params.append('pagina', historialPaginaActual);
     params.append('por_pagina', 30);
+    parametrosPagina(paginadorHistorial, pagina || 1, params);
 
     try {
         const response = await fetch('/admin/historial_vehiculos?' + params.toString());
         const data = await response.json();
         if (!data.ok) throw new Error(data.error);
 
+        registrarPagina(paginadorHistorial, data);
         renderizarHistorial(data.historial);
-        renderizarPaginacion(data);
+        renderizarPaginacion();
     } catch (error) {
         mostrarToast('Error cargando historial', 'error');
     }
@@ -643,46 +989,24 @@ function renderizarHistorial(historial) {
     }).join('');
 }
 
-function renderizarPaginacion(data) {
+function renderizarPaginacion() {
     const container = document.getElementById('paginacionHistorial');
-    if (!container || data.total_paginas <= 1) {
-        if (container) container.innerHTML = `<small class="texto-muted">${data.total} registros</small>`;
-        return;
-    }
-
-    let html = '';
-    if (data.pagina > 1) {
-        html += `<button class="btn-mini" onclick="buscarHistorialPaginado(${data.pagina - 1})">◀</button>`;
-    }
+    if (!container) return;
 
-    const start = Math.max(1, data.pagina - 2);
-    const end = Math.min(data.total_paginas, data.pagina + 2);
-
-    for (let i = start; i <= end; i++) {
-        const active = i === data.pagina ? 'btn-primario' : '';
-        html += `<button class="btn-mini ${active}" onclick="buscarHistorialPaginado(${i})">${i}</button>`;
+    let html = controlesPagina(paginadorHistorial, 'buscarHistorialPaginado', 'btn-mini', 'btn-mini btn-primario');
+    if (paginadorHistorial.total != null) {
+        html += `<small class="texto-muted" style="margin-left:12px;">${paginadorHistorial.total} registros</small>`;
     }
-
-    if (data.pagina < data.total_paginas) {
-        html += `<button class="btn-mini" onclick="buscarHistorialPaginado(${data.pagina + 1})">▶</button>`;
-    }
-    html += `<small class="texto-muted" style="margin-left:12px;">${data.total} registros</small>`;
     container.innerHTML = html;
 }
 
-function exportarHistorial() {
-    const placa = document.getElementById('filtroPlaca').value;
-    const fechaDesde = document.getElementById('filtroFechaDesde').value;
-    const fechaHasta = document.getElementById('filtroFechaHasta').value;
-    const estado = document.getElementById('filtroEstado').value;
-
-    const params = new URLSearchParams();
-    if (placa) params.append('placa', placa);
-    if (fechaDesde) params.append('fecha_desde', fechaDesde);
-    if (fechaHasta) params.append('fecha_hasta', fechaHasta);
-    if (estado) params.append('estado', estado);
-
-    window.open('/admin/exportar_historial?' + params.toString(), '_blank');
+function exportarHistorial(formato, boton) {
+    exportarEnSegundoPlano('historial', formato, {
+        placa: document.getElementById('filtroPlaca').value,
+        fecha_desde: document.getElementById('filtroFechaDesde').value,
+        fecha_hasta: document.getElementById('filtroFechaHasta').value,
+        estado: document.getElementById('filtroEstado').value
+    }, boton);
 }
 
 // ========================================
@@ -746,8 +1070,7 @@ function cerrarModalHistorialCliente() {
 // ========================================
 async function cargarAlertas() {
     try {
-        const response = await fetch('/obtener_alertas');
-        const data = await response.json();
+        const data = await fetchConEtag('/obtener_alertas');
         if (!data.ok) return;
 
         const seccion = document.getElementById('seccionAlertas');
@@ -773,6 +1096,112 @@ async function cargarAlertas() {
     }
 }
 
+// ========================================
+// EVENTOS EN VIVO (SSE)
+// ========================================
+// El servidor avisa cada entrada, salida, movimiento de caja y cierre de
+// turno; la tabla y los KPIs se actualizan sin volver a pedir todo. El
+// polling cada 30s solo corre mientras el canal esta caido o sin lugar.
+let fuenteEventos = null;
+let intervalosPolling = [];
+
+function miTurnoId() {
+    const kpis = document.querySelector('.kpis');
+    return kpis && kpis.dataset.turnoId ? parseInt(kpis.dataset.turnoId) : null;
+}
+
+function iniciarPolling() {
+    if (intervalosPolling.length) return;
+    intervalosPolling = [
+        setInterval(cargarIngresos, 30000),
+        setInterval(cargarAlertas, 30000)
+    ];
+}
+
+function detenerPolling() {
+    intervalosPolling.forEach(clearInterval);
+    intervalosPolling = [];
+}
+
+function iniciarEventos() {
+    if (!window.EventSource) { iniciarPolling(); return; }
+
+    fuenteEventos = new EventSource('/eventos');
+
+    fuenteEventos.addEventListener('open', detenerPolling);
+    fuenteEventos.addEventListener('error', () => {
+        iniciarPolling();
+        // CLOSED: el navegador ya no reintenta (sesion vencida, error 500...)
+        if (fuenteEventos.readyState === EventSource.CLOSED) {
+            fuenteEventos = null;
+            setTimeout(iniciarEventos, 60000);
+        }
+    });
+
+    const escuchar = (tipo, manejador) => fuenteEventos.addEventListener(tipo, e => {
+        try {
+            manejador(JSON.parse(e.data));
+        } catch (error) {
+            console.error('Error evento ' + tipo + ':', error);
+        }
+    });
+
+    escuchar('entrada', ev => {
+        if (totalesTurno && ev.turno_id === miTurnoId()) totalesTurno.autos_ingresados += 1;
+        cambioOcupacion(ev.ocupados);
+    });
+    escuchar('entradas_lote', ev => {
+        if (totalesTurno && ev.turno_id === miTurnoId()) totalesTurno.autos_ingresados += ev.ids.length;
+        cambioOcupacion(ev.ocupados);
+    });
+    escuchar('salida', ev => cambioOcupacion(ev.ocupados));
+    escuchar('salidas_lote', ev => cambioOcupacion(ev.ocupados));
+    escuchar('entrada_editada', () => cambioOcupacion(null));
+    escuchar('caja', ev => {
+        if (ev.turno_id === miTurnoId()) agregarMovimiento(ev);
+    });
+    escuchar('turno_cerrado', ev => {
+        if (ev.turno_id === miTurnoId()) window.location.href = '/';
+    });
+    escuchar('alertas', cargarAlertas);
+    escuchar('recargar', () => { cargarIngresos(); cargarAlertas(); });
+    // El servidor no tiene lugar para otro canal: polling y reintentar luego
+    escuchar('polling', ev => {
+        fuenteEventos.close();
+        fuenteEventos = null;
+        iniciarPolling();
+        setTimeout(iniciarEventos, (ev.reintentar || 60) * 1000);
+    });
+}
+
+function cambioOcupacion(ocupados) {
+    if (totalesTurno && ocupados !== null && ocupados !== undefined) {
+        totalesTurno.autos_en_cochera = ocupados;
+        pintarTotales();
+    }
+    if (document.getElementById('modalAutosEnCochera').style.display === 'flex') {
+        cargarAutosEnCochera();
+    }
+    cargarAlertas();
+}
+
+function agregarMovimiento(mov) {
+    if (!totalesTurno || movimientosMostrados.has(mov.id)) return;
+
+    const tbody = document.getElementById('tablaIngresos');
+    if (movimientosMostrados.size === 0) tbody.innerHTML = '';
+    tbody.insertAdjacentHTML('afterbegin', filaIngreso(mov));
+    movimientosMostrados.add(mov.id);
+
+    if (mov.metodo_pago === 'efectivo') {
+        totalesTurno.total_efectivo += mov.monto;
+    } else {
+        totalesTurno.total_yape += mov.monto;
+    }
+    if (mov.tipo === 'COBRO_SALIDA') totalesTurno.autos_salieron += 1;
+    pintarTotales();
+}
+
 function toggleAlertas() {
     const lista = document.getElementById('listaAlertas');
     const icono = document.getElementById('iconoAlertas');
@@ -1007,7 +1436,7 @@ function cerrarModalDetalle() {
 // ========================================
 // MIS REPORTES
 // ========================================
-let misReportesPagina = 1;
+const paginadorMisReportes = crearPaginador();
 
 function abrirModalMisReportes() {
     document.getElementById('modal-mis-reportes').style.display = 'flex';
@@ -1019,18 +1448,18 @@ function cerrarModalMisReportes() {
 }
 
 function buscarMisReportes(pagina) {
-    misReportesPagina = pagina || 1;
     const params = new URLSearchParams({
         fecha_desde: document.getElementById('mis-reportes-desde').value,
         fecha_hasta: document.getElementById('mis-reportes-hasta').value,
-        pagina: misReportesPagina,
         por_pagina: 15
     });
+    parametrosPagina(paginadorMisReportes, pagina || 1, params);
 
     fetch('/mis_reportes?' + params)
         .then(r => r.json())
         .then(data => {
             if (!data.ok) return;
+            registrarPagina(paginadorMisReportes, data);
             const tbody = document.getElementById('tbody-mis-reportes');
             document.getElementById('mis-reportes-detalle').style.display = 'none';
 
@@ -1062,13 +1491,10 @@ function buscarMisReportes(pagina) {
                 </tr>`;
             }).join('');
 
-            let pagHtml = '';
-            if (data.total_paginas > 1) {
-                for (let i = 1; i <= data.total_paginas; i++) {
-                    pagHtml += `<button class="btn-sm ${i === data.pagina ? 'btn-primary' : 'btn-secondary'}" onclick="buscarMisReportes(${i})">${i}</button> `;
-                }
+            let pagHtml = controlesPagina(paginadorMisReportes, 'buscarMisReportes', 'btn-sm btn-secondary', 'btn-sm btn-primary');
+            if (paginadorMisReportes.total != null) {
+                pagHtml += `<span style="margin-left:0.5rem;opacity:0.7;">Total: ${paginadorMisReportes.total}</span>`;
             }
-            pagHtml += `<span style="margin-left:0.5rem;opacity:0.7;">Total: ${data.total}</span>`;
             document.getElementById('paginacion-mis-reportes').innerHTML = pagHtml;
         });
 }
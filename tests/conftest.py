@@ -0,0 +1,52 @@
+"""
+Fixtures de Pruebas
+===================
+Una aplicación por módulo sobre una base de datos temporal (se aplican
+todas las migraciones) y clientes de prueba ya logueados.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ADMIN_PASSWORD = "admin-pruebas"
+
+
+@pytest.fixture(scope="module")
+def app(tmp_path_factory):
+    directorio = tmp_path_factory.mktemp("cochera")
+    os.environ["DATABASE_PATH"] = str(directorio / "database.db")
+    os.environ["BACKUP_DIR"] = str(directorio / "backups")
+    os.environ["EXPORTACIONES_DIR"] = str(directorio / "exports")
+    os.environ["ADMIN_PASSWORD"] = ADMIN_PASSWORD
+
+    from app import create_app
+    from models.pool import cerrar_pools
+
+    app = create_app()
+    app.config["TESTING"] = True
+    yield app
+    cerrar_pools()
+
+
+@pytest.fixture(scope="module")
+def admin(app):
+    cliente = app.test_client()
+    r = cliente.post("/", data={"usuario": "angel", "password": ADMIN_PASSWORD})
+    assert r.status_code == 302
+    return cliente
+
+
+@pytest.fixture(scope="module")
+def trabajador(app, admin):
+    r = admin.post("/admin/usuarios/crear", json={
+        "nombre": "Trabajador", "usuario": "trabajador", "password": "clave"
+    })
+    assert r.json["ok"], r.json
+
+    cliente = app.test_client()
+    r = cliente.post("/", data={"usuario": "trabajador", "password": "clave", "tipo_turno": "dia"})
+    assert r.status_code == 302
+    return cliente
@@ -0,0 +1,155 @@
+"""
+Tablas de Resumen
+=================
+Las tablas de resumen (cliente_stats, turno_totales, ingresos_diarios) las
+mantienen triggers. Después de cada grupo de operaciones hechas por las
+rutas, cada tabla debe ser igual a lo que recalcula su reconstruir_*.
+"""
+import pytest
+
+from models.database import get_db
+from models.resumenes import (
+    RESUMENES, verificar_cliente_stats, verificar_turno_totales,
+    verificar_ingresos_diarios
+)
+from utils.ocupacion import actualizar_ocupacion
+
+
+def _filas(cursor, tabla):
+    cursor.execute(f"SELECT * FROM {tabla}")
+    return sorted(tuple(fila) for fila in cursor.fetchall())
+
+
+def _recalculada(db, tabla):
+    """Contenido de `tabla` según su reconstruir_*, sin guardarlo"""
+    cursor = db.cursor()
+    cursor.execute("SAVEPOINT recalcular")
+    try:
+        RESUMENES[tabla](cursor)
+        return _filas(cursor, tabla)
+    finally:
+        cursor.execute("ROLLBACK TO recalcular")
+        cursor.execute("RELEASE recalcular")
+
+
+def comprobar_resumenes(app):
+    with app.app_context():
+        db = get_db()
+        cursor = db.cursor()
+        for tabla in RESUMENES:
+            assert _filas(cursor, tabla) == _recalculada(db, tabla), tabla
+        assert verificar_cliente_stats(cursor) == []
+        assert verificar_turno_totales(cursor) == []
+        assert verificar_ingresos_diarios(cursor) == []
+
+
+def _atrasar(app, ids):
+    """Pone las entradas tres días atrás, vencidas hace dos (con penalidad)"""
+    with app.app_context():
+        db = get_db()
+        db.executemany("""
+            UPDATE entradas SET
+                fecha_entrada = date('now', 'localtime', '-3 days'),
+                fecha_hasta = date('now', 'localtime', '-2 days'),
+                hora_salida_esperada = '08:00'
+            WHERE id = ?
+        """, [(i,) for i in ids])
+        db.commit()
+        actualizar_ocupacion(ids)
+
+
+@pytest.fixture(scope="module")
+def entradas(trabajador):
+    ids = {}
+    for placa, extra in (
+        ("AAA111", {}),
+        ("BBB222", {"adelanto": 5}),
+        ("CCC333", {"pagado": True, "metodo_pago": "yape"}),
+        ("DDD444", {"pagado": True}),
+    ):
+        r = trabajador.post("/guardar_entrada", json={
+            "placa": placa, "cliente": f"Cliente {placa}", "precio": 12.5, "dias": 2, **extra
+        })
+        assert r.json["ok"], r.json
+        ids[placa] = r.json["id"]
+    return ids
+
+
+def test_resumenes_vacios_tras_migrar(app):
+    comprobar_resumenes(app)
+
+
+def test_entradas(app, entradas):
+    comprobar_resumenes(app)
+
+
+def test_editar_entrada(app, trabajador, entradas):
+    r = trabajador.post("/actualizar_ingreso", json={
+        "id": entradas["BBB222"], "placa": "BBB222", "cliente": "Otro nombre",
+        "fecha_entrada": "2020-01-01", "hora_entrada": "10:00",
+        "fecha_hasta": "2020-01-02", "hora_salida": "10:00",
+        "precio": 10, "dias": 1, "monto": 10
+    })
+    assert r.json["ok"], r.json
+    comprobar_resumenes(app)
+
+
+def test_salidas(app, trabajador, entradas):
+    r = trabajador.post("/registrar_salida", json={
+        "id": entradas["AAA111"], "dias_reales": 2, "monto_cobrado": 25, "metodo_pago": "efectivo"
+    })
+    assert r.json["ok"], r.json
+
+    _atrasar(app, [entradas["CCC333"]])
+    r = trabajador.post("/autorizar_salida", json={"id": entradas["CCC333"], "penalidad": 3})
+    assert r.json["ok"], r.json
+    comprobar_resumenes(app)
+
+
+def test_entradas_lote(app, trabajador):
+    r = trabajador.post("/guardar_entradas_lote", json={
+        "vehiculos": ["FLT001", "FLT002", "FLT003"], "cliente": "Flota",
+        "precio": 8, "dias": 1, "pagado": True, "metodo_pago": "yape"
+    })
+    assert r.json["ok"], r.json
+    r = trabajador.post("/guardar_entradas_lote", json={
+        "vehiculos": ["FLT004", "FLT005"], "cliente": "Flota", "precio": 8, "adelanto": 3
+    })
+    assert r.json["ok"], r.json
+    comprobar_resumenes(app)
+
+
+def test_salidas_lote(app, trabajador, entradas):
+    # Un prepagado vencido (solo penalidad) y uno con saldo pendiente
+    _atrasar(app, [entradas["DDD444"], entradas["BBB222"]])
+    r = trabajador.post("/registrar_salidas_lote", json={
+        "ids": [entradas["DDD444"], entradas["BBB222"]], "metodo_pago": "efectivo"
+    })
+    assert r.json["ok"], r.json
+
+    r = trabajador.post("/registrar_salidas_lote", json={
+        "placas": ["FLT001", "FLT002", "FLT003", "FLT004", "FLT005"], "metodo_pago": "yape"
+    })
+    assert r.json["ok"], r.json
+    comprobar_resumenes(app)
+
+
+def test_eliminar_cliente(app, admin):
+    r = admin.get("/admin/clientes?busqueda=AAA111")
+    cliente_id = r.json["clientes"][0]["id"]
+    r = admin.delete(f"/admin/clientes/eliminar/{cliente_id}")
+    assert r.json["ok"], r.json
+    comprobar_resumenes(app)
+
+
+def test_cerrar_turno(app, trabajador, admin):
+    r = trabajador.post("/cerrar_turno", json={"solo_calcular": True})
+    assert r.json["ok"], r.json
+    r = trabajador.post("/cerrar_turno", json={
+        "efectivo_declarado": r.json["total_efectivo"], "yape_declarado": r.json["total_yape"]
+    })
+    assert r.json["ok"], r.json
+    comprobar_resumenes(app)
+
+    r = admin.get("/admin/verificar_totales")
+    assert r.json["ok"] and r.json["consistente"], r.json
@@ -4,10 +4,20 @@ Módulo de utilidades
 from .helpers import (
     login_required,
     admin_required,
+    respuesta_versionada,
     obtener_turno_activo,
     crear_turno,
+    estado_turno,
+    totales_turno,
+    ingresos_rango,
+    ingresos_por_periodo,
+    ingresos_por_tipo,
+    invalidar_turnos,
+    invalidar_caja,
     obtener_configuracion,
+    invalidar_configuracion,
     calcular_penalidad,
+    calcular_cobros_activos,
     formato_moneda,
     formato_fecha,
     formato_hora
@@ -16,10 +26,20 @@ from .helpers import (
 __all__ = [
     'login_required',
     'admin_required',
+    'respuesta_versionada',
     'obtener_turno_activo',
     'crear_turno',
+    'estado_turno',
+    'totales_turno',
+    'ingresos_rango',
+    'ingresos_por_periodo',
+    'ingresos_por_tipo',
+    'invalidar_turnos',
+    'invalidar_caja',
     'obtener_configuracion',
+    'invalidar_configuracion',
     'calcular_penalidad',
+    'calcular_cobros_activos',
     'formato_moneda',
     'formato_fecha',
     'formato_hora'
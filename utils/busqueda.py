@@ -0,0 +1,129 @@
+"""
+Búsqueda de Texto
+=================
+Búsqueda por fragmentos de placa, nombre, celular y observaciones usando
+los índices FTS5 trigram (migración 4) en lugar de LIKE '%X%'.
+
+El trigram necesita al menos 3 caracteres; con menos, o si el SQLite no
+trae FTS5, se usa LIKE como antes.
+"""
+from models.database import get_db
+
+
+MINIMO_TRIGRAMA = 3
+
+_fts = None
+
+
+def fts_disponible():
+    """True si existen las tablas de búsqueda (se consulta una vez por proceso)"""
+    global _fts
+    if _fts is None:
+        cursor = get_db().cursor()
+        cursor.execute("""
+            SELECT COUNT(*) FROM sqlite_master
+            WHERE name IN ('busqueda_clientes', 'busqueda_entradas')
+        """)
+        _fts = cursor.fetchone()[0] == 2
+    return _fts
+
+
+def _usar_fts(texto):
+    return len(texto) >= MINIMO_TRIGRAMA and fts_disponible()
+
+
+def _frase(texto, columnas):
+    """Consulta MATCH que busca `texto` literal dentro de `columnas`"""
+    frase = '"' + texto.replace('"', '""') + '"'
+    if len(columnas) == 1:
+        return f"{columnas[0]} : {frase}"
+    return "{" + " ".join(columnas) + "} : " + frase
+
+
+# ============================================
+# FILTROS PARA CONSULTAS EXISTENTES
+# ============================================
+
+def filtro_clientes(texto, columnas=("placa",), alias="c"):
+    """
+    Condición para agregar a un WHERE que filtra clientes por fragmento.
+
+    Args:
+        texto: Fragmento buscado
+        columnas: Columnas de clientes donde buscar
+        alias: Alias de la tabla clientes en la consulta
+
+    Returns:
+        tuple: (" AND ...", params)
+    """
+    texto = texto.strip()
+    if _usar_fts(texto):
+        return (
+            f" AND {alias}.id IN (SELECT rowid FROM busqueda_clientes WHERE busqueda_clientes MATCH ?)",
+            [_frase(texto, columnas)]
+        )
+    condiciones = " OR ".join(f"{alias}.{columna} LIKE ?" for columna in columnas)
+    return f" AND ({condiciones})", [f"%{texto}%"] * len(columnas)
+
+
+# ============================================
+# BÚSQUEDA UNIFICADA
+# ============================================
+
+def buscar(texto, limite=20):
+    """
+    Busca `texto` en placa, nombre y celular de clientes y en las
+    observaciones de las entradas.
+
+    Returns:
+        dict: clientes (por relevancia) y entradas (las más recientes)
+    """
+    texto = texto.strip()
+    cursor = get_db().cursor()
+
+    if _usar_fts(texto):
+        cursor.execute("""
+            SELECT c.id, c.placa, c.nombre, c.celular, c.precio_dia
+            FROM busqueda_clientes b
+            JOIN clientes c ON c.id = b.rowid
+            WHERE busqueda_clientes MATCH ?
+            ORDER BY b.rank
+            LIMIT ?
+        """, (_frase(texto, ("placa", "nombre", "celular")), limite))
+        clientes = [dict(r) for r in cursor.fetchall()]
+
+        cursor.execute("""
+            SELECT e.id, c.placa, c.nombre as cliente, e.fecha_entrada,
+                   e.hora_entrada, e.salio, e.observaciones
+            FROM entradas e
+            JOIN clientes c ON e.cliente_id = c.id
+            WHERE e.id IN (
+                SELECT rowid FROM busqueda_entradas WHERE busqueda_entradas MATCH ?
+            )
+            ORDER BY e.id DESC
+            LIMIT ?
+        """, (_frase(texto, ("observaciones",)), limite))
+        entradas = [dict(r) for r in cursor.fetchall()]
+    else:
+        patron = f"%{texto}%"
+        cursor.execute("""
+            SELECT id, placa, nombre, celular, precio_dia
+            FROM clientes
+            WHERE placa LIKE ? OR nombre LIKE ? OR celular LIKE ?
+            ORDER BY placa
+            LIMIT ?
+        """, (patron, patron, patron, limite))
+        clientes = [dict(r) for r in cursor.fetchall()]
+
+        cursor.execute("""
+            SELECT e.id, c.placa, c.nombre as cliente, e.fecha_entrada,
+                   e.hora_entrada, e.salio, e.observaciones
+            FROM entradas e
+            JOIN clientes c ON e.cliente_id = c.id
+            WHERE e.observaciones LIKE ?
+            ORDER BY e.id DESC
+            LIMIT ?
+        """, (patron, limite))
+        entradas = [dict(r) for r in cursor.fetchall()]
+
+    return {"clientes": clientes, "entradas": entradas}
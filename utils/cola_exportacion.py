@@ -0,0 +1,280 @@
+"""
+Cola de Exportaciones
+=====================
+Las exportaciones pesadas se generan en segundo plano para no ocupar un
+hilo de gunicorn mientras se escribe el archivo:
+
+1. Pedir la exportación devuelve enseguida un id.
+2. Un pool acotado de hilos por proceso (EXPORTACIONES_HILOS) la genera
+   informando el progreso.
+3. El archivo terminado se descarga por id y se conserva
+   EXPORTACIONES_TTL_MINUTOS para pedidos iguales.
+
+El estado de cada trabajo vive en un JSON dentro de EXPORTACIONES_DIR, así
+todos los workers lo ven. El id es un hash del tipo, el formato y los
+filtros: un pedido idéntico a uno en curso o ya terminado recibe el mismo
+id y no se genera dos veces. El proceso que crea el JSON (O_EXCL) es el
+que lo genera. Si ese proceso muere, el trabajo se considera abandonado y
+el siguiente pedido lo vuelve a lanzar.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from models.database import get_db
+from .exportacion import EXPORTACIONES, FORMATOS, escribir_xlsx, generar_csv
+from .paginacion import contar
+
+
+# Cada cuánto se guarda el progreso como máximo
+_SEGUNDOS_ENTRE_AVANCES = 1
+
+_ID_VALIDO = re.compile(r"[0-9a-f]{20}")
+
+_pool = {"pid": None, "executor": None}
+_pool_lock = threading.Lock()
+
+
+def directorio_exportaciones(config):
+    directorio = config.get('EXPORTACIONES_DIR')
+    if not directorio:
+        db_path = config.get('DATABASE_PATH', 'database.db')
+        directorio = os.path.join(os.path.dirname(db_path) or '.', 'exports')
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def _executor(config):
+    """Pool de hilos del proceso actual (los workers no heredan hilos del maestro)"""
+    with _pool_lock:
+        if _pool["pid"] != os.getpid():
+            _pool["executor"] = ThreadPoolExecutor(
+                max_workers=config.get('EXPORTACIONES_HILOS', 1),
+                thread_name_prefix="exportacion"
+            )
+            _pool["pid"] = os.getpid()
+        return _pool["executor"]
+
+
+# ============================================
+# ESTADO DE LOS TRABAJOS
+# ============================================
+
+def _ahora():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _segundos_desde(fecha):
+    return (datetime.now() - datetime.strptime(fecha, "%Y-%m-%d %H:%M:%S")).total_seconds()
+
+
+def _ruta_estado(directorio, trabajo_id):
+    return os.path.join(directorio, f"{trabajo_id}.json")
+
+
+def ruta_resultado(directorio, estado):
+    """Ruta del archivo generado por el trabajo"""
+    return os.path.join(directorio, estado["id"] + FORMATOS[estado["formato"]][1])
+
+
+def leer_estado(directorio, trabajo_id):
+    """Estado del trabajo, o None si no existe"""
+    if not _ID_VALIDO.fullmatch(trabajo_id):
+        return None
+    try:
+        with open(_ruta_estado(directorio, trabajo_id), encoding="utf-8") as archivo:
+            return json.load(archivo)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _guardar_estado(directorio, estado):
+    # Escribir aparte y reemplazar: quien lee nunca ve un JSON a medias
+    ruta = _ruta_estado(directorio, estado["id"])
+    temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as archivo:
+        json.dump(estado, archivo)
+    os.replace(temporal, ruta)
+
+
+def _proceso_vivo(pid):
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        # os.kill en Windows termina el proceso; ahí corre el servidor de
+        # desarrollo, de un solo proceso: otro pid es una ejecución anterior
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _vigente(directorio, estado, ttl):
+    """True si el trabajo sigue en curso o su archivo todavía sirve"""
+    if estado["estado"] in ("pendiente", "en_proceso"):
+        return _proceso_vivo(estado["pid"])
+    if estado["estado"] == "listo":
+        return (_segundos_desde(estado["terminado"]) < ttl
+                and os.path.exists(ruta_resultado(directorio, estado)))
+    return False
+
+
+def _borrar(directorio, estado):
+    for ruta in (ruta_resultado(directorio, estado) + ".parcial",
+                 ruta_resultado(directorio, estado),
+                 _ruta_estado(directorio, estado["id"])):
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+
+
+def purgar(directorio, ttl):
+    """Borra los trabajos vencidos, fallidos o abandonados"""
+    borrados = 0
+    for nombre in os.listdir(directorio):
+        if not nombre.endswith(".json"):
+            continue
+        estado = leer_estado(directorio, nombre[:-5])
+        if estado and not _vigente(directorio, estado, ttl):
+            # Los errores se conservan un rato para poder mostrarlos
+            if estado["estado"] == "error" and _segundos_desde(estado["terminado"]) < ttl:
+                continue
+            _borrar(directorio, estado)
+            borrados += 1
+    return borrados
+
+
+# ============================================
+# PEDIR / CONSULTAR
+# ============================================
+
+def id_trabajo(tipo, formato, filtros):
+    clave = json.dumps([tipo, formato, filtros], sort_keys=True)
+    return hashlib.sha1(clave.encode()).hexdigest()[:20]
+
+
+def solicitar_exportacion(app, tipo, formato, filtros):
+    """
+    Pide una exportación. Si hay una igual en curso o terminada hace menos
+    del TTL devuelve esa; si no, la encola.
+
+    Args:
+        app: Aplicación Flask (el hilo abre su propio contexto)
+        filtros: {filtro: valor}; se ignoran los que el tipo no acepta
+
+    Returns:
+        dict: Estado del trabajo
+    """
+    definicion = EXPORTACIONES.get(tipo)
+    if not definicion:
+        raise ValueError(f"Exportación no válida: {tipo}")
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no válido: {formato}")
+
+    filtros = {
+        f: str(filtros[f]).strip()
+        for f in definicion["filtros"] if str(filtros.get(f) or "").strip()
+    }
+    directorio = directorio_exportaciones(app.config)
+    ttl = app.config.get('EXPORTACIONES_TTL_MINUTOS', 60) * 60
+    trabajo_id = id_trabajo(tipo, formato, filtros)
+
+    purgar(directorio, ttl)
+    estado = leer_estado(directorio, trabajo_id)
+    if estado and _vigente(directorio, estado, ttl):
+        return estado
+    if estado:
+        _borrar(directorio, estado)
+
+    estado = {
+        "id": trabajo_id,
+        "tipo": tipo,
+        "formato": formato,
+        "filtros": filtros,
+        "estado": "pendiente",
+        "pid": os.getpid(),
+        "creado": _ahora(),
+        "filas": 0,
+        "total": None,
+        "tamano": None,
+        "terminado": None,
+        "error": None,
+    }
+
+    # Solo un proceso crea el JSON; los demás devuelven el que ya existe
+    try:
+        descriptor = os.open(_ruta_estado(directorio, trabajo_id), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return leer_estado(directorio, trabajo_id) or estado
+    with os.fdopen(descriptor, "w", encoding="utf-8") as archivo:
+        json.dump(estado, archivo)
+
+    _executor(app.config).submit(_generar, app, directorio, estado)
+    print(f"[EXPORTACION] {trabajo_id} encolada: {tipo} {formato} {filtros}")
+    return estado
+
+
+def _generar(app, directorio, estado):
+    destino = ruta_resultado(directorio, estado)
+    parcial = destino + ".parcial"
+    definicion = EXPORTACIONES[estado["tipo"]]
+    inicio = time.time()
+    ultimo_avance = [0]
+
+    def avance(filas):
+        if time.time() - ultimo_avance[0] >= _SEGUNDOS_ENTRE_AVANCES:
+            estado["filas"] = filas
+            _guardar_estado(directorio, estado)
+            ultimo_avance[0] = time.time()
+
+    try:
+        estado["estado"] = "en_proceso"
+        _guardar_estado(directorio, estado)
+
+        with app.app_context():
+            cursor = get_db().cursor()
+            query, params = definicion["consulta"](**estado["filtros"])
+            estado["total"] = contar(cursor, query, params)
+            _guardar_estado(directorio, estado)
+
+            cursor.execute(query, params)
+            if estado["formato"] == "xlsx":
+                filas = escribir_xlsx(parcial, definicion["encabezados"], cursor,
+                                      definicion["titulo"], avance)
+            else:
+                filas = 0
+                with open(parcial, "wb") as archivo:
+                    def contar_filas(n):
+                        nonlocal filas
+                        filas = n
+                        avance(n)
+                    for trozo in generar_csv(definicion["encabezados"], cursor,
+                                             estado["formato"] == "csv.gz", contar_filas):
+                        archivo.write(trozo)
+
+        os.replace(parcial, destino)
+        estado.update({
+            "estado": "listo",
+            "filas": filas,
+            "tamano": os.path.getsize(destino),
+            "terminado": _ahora(),
+        })
+        print(f"[EXPORTACION] {estado['id']} lista: {filas} filas en {time.time() - inicio:.1f}s")
+    except ImportError:
+        estado.update({"estado": "error", "error": "Módulo openpyxl no instalado", "terminado": _ahora()})
+    except Exception as e:
+        estado.update({"estado": "error", "error": str(e), "terminado": _ahora()})
+        print(f"[EXPORTACION] {estado['id']} falló: {e}")
+        if os.path.exists(parcial):
+            os.remove(parcial)
+    _guardar_estado(directorio, estado)
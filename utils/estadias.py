@@ -0,0 +1,229 @@
+"""
+Índice de Estadías
+==================
+Qué autos había en la cochera en un momento pasado, sin recorrer el
+historial por rango de fechas.
+
+Cada entrada es un intervalo [entrada, salida). El índice vive en memoria
+y guarda:
+
+- Las estadías cerradas de hasta ESTADIA_CORTA, ordenadas por hora de
+  entrada. Un auto presente en T entró entre T - ESTADIA_CORTA y T: una
+  búsqueda binaria da ese tramo y solo se revisa su salida.
+- Las estadías cerradas más largas (mensuales, pocas), en una lista que
+  se revisa entera.
+- Las que siguen abiertas, por id.
+
+Se arma la primera vez que se consulta. Después cada consulta lo pone al
+día con dos lecturas por clave: las entradas nuevas (id mayor al último
+visto) y las que estaban abiertas, para ver si salieron. Editar o borrar
+estadías incrementa la versión compartida 'estadias' y el índice se
+rearma en la siguiente consulta.
+"""
+import bisect
+import threading
+from array import array
+
+from models.database import get_db
+from models.fechas import a_epoch
+from models.versiones import leer_version, incrementar_version
+
+
+ESTADIA_CORTA = 7 * 24 * 3600
+
+# Clave ordenable: segundo de entrada en los bits altos, id en los bajos
+_BITS_ID = 32
+_MASCARA_ID = (1 << _BITS_ID) - 1
+
+_BLOQUE_IDS = 500
+
+# Entrada y salida en segundos, con la hora local tratada como UTC
+# (columnas *_epoch, models/fechas.py). Entrada sin fecha: epoch 0 → None
+_SEGUNDOS = "id, NULLIF(entrada_epoch, 0), salida_epoch"
+_CONSULTA = f"SELECT {_SEGUNDOS}, salio FROM entradas"
+
+_DETALLE = """
+    SELECT
+        e.id,
+        c.placa,
+        c.nombre as cliente,
+        c.celular,
+        e.fecha_entrada,
+        e.hora_entrada,
+        e.fecha_salida,
+        e.salio,
+        e.dias,
+        e.precio_dia,
+        e.monto,
+        e.adelanto,
+        e.penalidad,
+        e.descuento,
+        e.metodo_pago,
+        e.pagado,
+        t1.nombre as trabajador_entrada,
+        t2.nombre as trabajador_salida,
+        (SELECT IFNULL(SUM(m.monto_centimos), 0) FROM movimientos_caja m
+         WHERE m.entrada_id = e.id AND m.movimiento_epoch <= ?) / 100.0 as pagado_al_momento
+    FROM entradas e
+    JOIN clientes c ON e.cliente_id = c.id
+    LEFT JOIN trabajadores t1 ON e.trabajador_id = t1.id
+    LEFT JOIN trabajadores t2 ON e.trabajador_salida_id = t2.id
+"""
+
+_indice = {
+    "version": None,
+    "ultimo_id": 0,
+    "claves": array('q'),
+    "salidas": array('q'),
+    "largas": [],
+    "abiertas": {},
+}
+_lock = threading.Lock()
+
+
+def _bloques(ids):
+    ids = list(ids)
+    for i in range(0, len(ids), _BLOQUE_IDS):
+        yield ids[i:i + _BLOQUE_IDS]
+
+
+# ============================================
+# ÍNDICE
+# ============================================
+
+def _agregar(entrada_id, inicio, salida, salio):
+    """Ubica una estadía en su estructura (o la descarta si no tiene intervalo)"""
+    if inicio is None:
+        return
+    if salida is None:
+        # Salidas sin fecha (datos antiguos) no cuentan
+        if salio == 0:
+            _indice["abiertas"][entrada_id] = inicio
+        return
+    if salida <= inicio:
+        return
+    if salida - inicio > ESTADIA_CORTA:
+        _indice["largas"].append((inicio, salida, entrada_id))
+        return
+    clave = (inicio << _BITS_ID) | entrada_id
+    i = bisect.bisect_left(_indice["claves"], clave)
+    _indice["claves"].insert(i, clave)
+    _indice["salidas"].insert(i, salida)
+
+
+def _reconstruir(version):
+    # Una sola sentencia (una sola foto de la base): las cerradas recorren
+    # idx_entradas_fecha (el rango entrada_epoch > 0 hace que el plan lo
+    # use), así llegan ordenadas por entrada y ordenarlas es lineal
+    cursor = get_db().cursor()
+    cursor.execute(f"""
+        SELECT {_SEGUNDOS}, 1 FROM entradas
+        WHERE entrada_epoch > 0 AND salida_epoch IS NOT NULL
+        UNION ALL
+        {_CONSULTA} WHERE salio = 0 AND fecha_salida IS NULL
+    """)
+    cortas = []
+    agregar = cortas.append
+    ultimo_id = 0
+    _indice.update({"largas": [], "abiertas": {}})
+    for entrada_id, inicio, salida, salio in cursor:
+        if entrada_id > ultimo_id:
+            ultimo_id = entrada_id
+        if inicio is not None and salida is not None and 0 < salida - inicio <= ESTADIA_CORTA:
+            agregar(((inicio << _BITS_ID) | entrada_id, salida))
+        else:
+            _agregar(entrada_id, inicio, salida, salio)
+    cortas.sort()
+    _indice["claves"] = array('q', [clave for clave, _ in cortas])
+    _indice["salidas"] = array('q', [salida for _, salida in cortas])
+    _indice["ultimo_id"] = ultimo_id
+    _indice["version"] = version
+    print(f"[ESTADIAS] Índice armado: {len(cortas)} cortas, "
+          f"{len(_indice['largas'])} largas, {len(_indice['abiertas'])} abiertas")
+
+
+def _sincronizar():
+    """Rearma el índice si se editaron estadías; si no, agrega lo nuevo"""
+    version = leer_version('estadias')
+    if _indice["version"] != version:
+        _reconstruir(version)
+        return
+
+    cursor = get_db().cursor()
+    cursor.execute(f"{_CONSULTA} WHERE id > ?", (_indice["ultimo_id"],))
+    for entrada_id, inicio, salida, salio in cursor.fetchall():
+        _indice["ultimo_id"] = max(_indice["ultimo_id"], entrada_id)
+        _agregar(entrada_id, inicio, salida, salio)
+
+    abiertas = _indice["abiertas"]
+    for bloque in _bloques(abiertas):
+        cursor.execute(f"{_CONSULTA} WHERE id IN ({','.join('?' * len(bloque))})", bloque)
+        vistas = set()
+        for entrada_id, inicio, salida, salio in cursor.fetchall():
+            vistas.add(entrada_id)
+            del abiertas[entrada_id]
+            _agregar(entrada_id, inicio, salida, salio)
+        for entrada_id in set(bloque) - vistas:
+            del abiertas[entrada_id]
+
+
+def _presentes(momento):
+    """Ids de las entradas dentro de la cochera en el segundo `momento`"""
+    claves = _indice["claves"]
+    salidas = _indice["salidas"]
+    desde = bisect.bisect_left(claves, (momento - ESTADIA_CORTA) << _BITS_ID)
+    hasta = bisect.bisect_right(claves, (momento << _BITS_ID) | _MASCARA_ID)
+    ids = [claves[i] & _MASCARA_ID for i in range(desde, hasta) if salidas[i] > momento]
+    ids.extend(i for inicio, salida, i in _indice["largas"] if inicio <= momento < salida)
+    ids.extend(i for i, inicio in _indice["abiertas"].items() if inicio <= momento)
+    return ids
+
+
+def invalidar_estadias():
+    """Avisa a todos los workers que se editaron o borraron entradas (llamar después del commit)"""
+    incrementar_version('estadias')
+
+
+# ============================================
+# CONSULTA
+# ============================================
+
+def autos_en_momento(momento):
+    """
+    Autos que estaban en la cochera en `momento` (datetime, hora local),
+    con quién los recibió y cuánto habían pagado hasta ese momento.
+
+    Returns:
+        list: dicts del más antiguo al más reciente
+    """
+    segundo = a_epoch(momento)
+    with _lock:
+        _sincronizar()
+        ids = _presentes(segundo)
+
+    cursor = get_db().cursor()
+    autos = []
+    for bloque in _bloques(ids):
+        cursor.execute(
+            f"{_DETALLE} WHERE e.id IN ({','.join('?' * len(bloque))})",
+            [segundo] + bloque
+        )
+        autos.extend(dict(fila) for fila in cursor.fetchall())
+    autos.sort(key=lambda a: (a["fecha_entrada"] or "", a["hora_entrada"] or "", a["id"]))
+    return autos
+
+
+def turno_en_momento(momento):
+    """Turno en curso en `momento` (con el nombre del trabajador), o None"""
+    texto = momento.strftime("%Y-%m-%d %H:%M:%S")
+    cursor = get_db().cursor()
+    cursor.execute("""
+        SELECT t.id, t.fecha_inicio, t.fecha_fin, t.tipo_turno, tr.nombre as trabajador
+        FROM turnos t
+        JOIN trabajadores tr ON t.trabajador_id = tr.id
+        WHERE t.inicio_epoch <= ? AND (t.fecha_fin IS NULL OR t.fecha_fin > ?)
+        ORDER BY t.inicio_epoch DESC
+        LIMIT 1
+    """, (a_epoch(momento), texto))
+    turno = cursor.fetchone()
+    return dict(turno) if turno else None
@@ -0,0 +1,215 @@
+"""
+Eventos en Vivo
+===============
+Canal de Server-Sent Events (SSE) para los dashboards.
+
+Las rutas que escriben publican un evento en la tabla `eventos` después de
+su commit e incrementan la versión compartida 'eventos'. Cada conexión a
+/eventos revisa esa versión una vez por segundo (lectura en memoria) y
+solo consulta SQLite cuando cambió. La conexión se cierra al minuto; el
+navegador reconecta solo y envía Last-Event-ID, así que no se pierden
+eventos.
+
+Cada conexión abierta ocupa un hilo del worker (gthread). Para que los
+dashboards no dejen sin hilos a las entradas y salidas, cada worker acepta
+a lo sumo EVENTOS_MAX_CONEXIONES a la vez; los demás reciben un evento
+'polling' y siguen con el polling (ETag) hasta volver a intentar.
+"""
+import json
+import threading
+import time
+
+from models.database import get_db
+from models.versiones import leer_version, incrementar_version
+from .helpers import formato_movimiento
+
+
+# Eventos que se conservan para reconexiones (los más viejos se borran)
+CONSERVAR = 1000
+
+# Segundos que espera el navegador sin lugar antes de volver a intentar
+REINTENTO_SIN_LUGAR = 60
+
+_conexiones = {"activas": 0}
+_conexiones_lock = threading.Lock()
+
+
+def _tomar_lugar(maximo):
+    with _conexiones_lock:
+        if _conexiones["activas"] >= maximo:
+            return False
+        _conexiones["activas"] += 1
+        return True
+
+
+def _soltar_lugar():
+    with _conexiones_lock:
+        _conexiones["activas"] -= 1
+
+
+# ============================================
+# PUBLICAR (llamar después del commit)
+# ============================================
+
+def publicar_evento(tipo, datos, turno_id=None):
+    """
+    Publica un evento para todos los dashboards conectados.
+
+    Args:
+        tipo: 'entrada', 'entradas_lote', 'entrada_editada', 'salida',
+              'salidas_lote', 'caja' o 'turno_cerrado'
+        datos: dict serializable a JSON
+        turno_id: Turno al que pertenece (para que cada dashboard filtre)
+    """
+    publicar_eventos([(tipo, datos, turno_id)])
+
+
+def publicar_eventos(eventos):
+    """Publica varios eventos (tipo, datos, turno_id) en un solo commit"""
+    if not eventos:
+        return
+    try:
+        db = get_db()
+        cursor = db.cursor()
+        cursor.executemany(
+            "INSERT INTO eventos (tipo, turno_id, datos) VALUES (?, ?, ?)",
+            [(tipo, turno_id, json.dumps(datos)) for tipo, datos, turno_id in eventos]
+        )
+        cursor.execute("SELECT MAX(id) FROM eventos")
+        cursor.execute("DELETE FROM eventos WHERE id <= ?", (cursor.fetchone()[0] - CONSERVAR,))
+        db.commit()
+        incrementar_version('eventos')
+    except Exception as e:
+        # El cambio ya está guardado: sin evento los dashboards se
+        # actualizan igual al reconectar o con el polling
+        print(f"[EVENTOS] No se pudieron publicar {len(eventos)} evento(s): {e}")
+
+
+def publicar_movimientos(movimiento_ids):
+    """Publica movimientos de caja con el mismo formato de /ingresos_turno"""
+    movimiento_ids = list(movimiento_ids)
+    if not movimiento_ids:
+        return
+    try:
+        cursor = get_db().cursor()
+        cursor.execute(f"""
+            SELECT
+                m.id,
+                m.turno_id,
+                m.tipo,
+                m.monto,
+                m.metodo_pago,
+                m.descripcion,
+                m.fecha_movimiento,
+                m.entrada_id,
+                c.placa,
+                c.nombre AS cliente
+            FROM movimientos_caja m
+            LEFT JOIN entradas e ON m.entrada_id = e.id
+            LEFT JOIN clientes c ON e.cliente_id = c.id
+            WHERE m.id IN ({','.join('?' * len(movimiento_ids))})
+            ORDER BY m.id
+        """, movimiento_ids)
+        filas = cursor.fetchall()
+    except Exception as e:
+        print(f"[EVENTOS] No se pudieron leer los movimientos: {e}")
+        return
+    publicar_eventos([
+        ('caja', formato_movimiento(fila), fila["turno_id"])
+        for fila in filas
+    ])
+
+
+# ============================================
+# FLUJO SSE
+# ============================================
+
+def _mensaje(tipo, datos, evento_id=None):
+    lineas = []
+    if evento_id is not None:
+        lineas.append(f"id: {evento_id}")
+    lineas.append(f"event: {tipo}")
+    lineas.append(f"data: {json.dumps(datos)}")
+    return "\n".join(lineas) + "\n\n"
+
+
+def _marca_alertas():
+    # Las alertas cambian con la configuración y con el reloj (días de
+    # exceso); las de entradas y salidas ya llegan con sus propios eventos
+    return leer_version('configuracion'), int(time.time() // 3600)
+
+
+def flujo_eventos(pool, ultimo_id=None, duracion=60, intervalo=1.0, latido=15,
+                  max_conexiones=2):
+    """
+    Generador del stream text/event-stream.
+
+    Args:
+        pool: PoolConexiones del worker (se toma una conexión solo al consultar)
+        ultimo_id: Last-Event-ID del navegador; None para empezar desde ahora
+        duracion: Segundos antes de cerrar para que el navegador reconecte
+        intervalo: Segundos entre revisiones de la versión
+        latido: Segundos sin enviar nada antes de mandar un comentario
+        max_conexiones: Streams abiertos a la vez en este worker
+    """
+    # El lugar se toma dentro del generador: si la respuesta se descarta
+    # sin empezar, no queda ocupado
+    if not _tomar_lugar(max_conexiones):
+        yield _mensaje('polling', {"reintentar": REINTENTO_SIN_LUGAR})
+        return
+    try:
+        yield from _flujo(pool, ultimo_id, duracion, intervalo, latido)
+    finally:
+        _soltar_lugar()
+
+
+def _flujo(pool, ultimo_id, duracion, intervalo, latido):
+    def consultar(sql, params=()):
+        conn = pool.obtener()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            pool.devolver(conn)
+
+    yield "retry: 3000\n\n"
+
+    minimo, maximo = consultar("SELECT IFNULL(MIN(id), 1), IFNULL(MAX(id), 0) FROM eventos")[0]
+    if ultimo_id is None:
+        ultimo_id = maximo
+    elif not minimo - 1 <= ultimo_id <= maximo:
+        # Los eventos perdidos ya se borraron: que recargue todo
+        yield _mensaje('recargar', {}, maximo)
+        ultimo_id = maximo
+
+    version = None
+    alertas = _marca_alertas()
+    ultimo_envio = time.monotonic()
+    fin = ultimo_envio + duracion
+
+    while time.monotonic() < fin:
+        # Leer la versión antes de consultar: lo que llegue en medio se
+        # verá en la siguiente vuelta
+        actual = leer_version('eventos')
+        if actual != version:
+            version = actual
+            for fila in consultar(
+                "SELECT id, tipo, turno_id, datos FROM eventos WHERE id > ? ORDER BY id",
+                (ultimo_id,)
+            ):
+                ultimo_id = fila["id"]
+                datos = json.loads(fila["datos"] or "{}")
+                datos["turno_id"] = fila["turno_id"]
+                yield _mensaje(fila["tipo"], datos, fila["id"])
+                ultimo_envio = time.monotonic()
+
+        marca = _marca_alertas()
+        if marca != alertas:
+            alertas = marca
+            yield _mensaje('alertas', {})
+            ultimo_envio = time.monotonic()
+
+        if time.monotonic() - ultimo_envio >= latido:
+            yield ": latido\n\n"
+            ultimo_envio = time.monotonic()
+
+        time.sleep(intervalo)
@@ -0,0 +1,340 @@
+"""
+Exportación del Historial
+=========================
+Exportaciones sin cargar todo el historial en memoria: las filas se leen
+del cursor en bloques (fetchmany) y se escriben a medida que llegan.
+
+- Excel: openpyxl en modo write-only (cada fila se escribe directo al XML
+  de la hoja, sin un objeto por celda). Un .xlsx es un zip que se cierra
+  al final, así que se arma en un archivo temporal y después se envía por
+  partes. El ancho de las columnas se calcula con las primeras filas.
+- CSV / CSV.gz: se genera y se envía fila a fila, sin archivo intermedio.
+  Conviene para rangos muy grandes.
+
+EXPORTACIONES describe lo que se puede exportar (historial, reportes de
+turnos y clientes); utils/cola_exportacion.py las genera en segundo plano.
+"""
+import csv
+import io
+import os
+import tempfile
+import zlib
+
+from models.fechas import filtro_fechas
+from .busqueda import filtro_clientes
+
+
+PREFIJO = "cochera_export_"
+FILAS_POR_BLOQUE = 1000
+FILAS_MUESTRA = 200
+ANCHO_MAXIMO = 30
+
+FORMATOS = {
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", ".xlsx"),
+    "csv": ("text/csv; charset=utf-8", ".csv"),
+    "csv.gz": ("application/gzip", ".csv.gz"),
+}
+
+ENCABEZADOS_HISTORIAL = [
+    'Placa', 'Cliente', 'Celular', 'F. Entrada', 'H. Entrada',
+    'F. Salida', 'H. Salida', 'Días', 'Precio/Día', 'Monto Total',
+    'Adelanto', 'Penalidad', 'Descuento', 'Método Pago', 'Salió',
+    'Pagado', 'Trabajador Entrada', 'Trabajador Salida', 'Observaciones'
+]
+
+
+def consulta_historial(placa="", fecha_desde="", fecha_hasta="", estado=""):
+    """
+    Consulta del historial exportable con los mismos filtros que la pantalla.
+
+    Returns:
+        tuple: (query, params), columnas en el orden de ENCABEZADOS_HISTORIAL
+    """
+    query = """
+        SELECT
+            c.placa,
+            c.nombre as cliente,
+            c.celular,
+            e.fecha_entrada,
+            e.hora_entrada,
+            e.fecha_salida,
+            e.hora_salida_real as hora_salida,
+            e.dias,
+            e.precio_dia,
+            e.monto,
+            e.adelanto,
+            e.penalidad,
+            e.descuento,
+            e.metodo_pago,
+            CASE WHEN e.salio = 1 THEN 'Sí' ELSE 'No' END as salio,
+            CASE WHEN e.pagado = 1 THEN 'Sí' ELSE 'No' END as pagado,
+            t1.nombre as trabajador_entrada,
+            t2.nombre as trabajador_salida,
+            e.observaciones
+        FROM entradas e
+        JOIN clientes c ON e.cliente_id = c.id
+        LEFT JOIN trabajadores t1 ON e.trabajador_id = t1.id
+        LEFT JOIN trabajadores t2 ON e.trabajador_salida_id = t2.id
+        WHERE 1=1
+    """
+    params = []
+
+    if placa:
+        condicion, valores = filtro_clientes(placa.upper())
+        query += condicion
+        params.extend(valores)
+    condicion, valores = filtro_fechas("e.entrada_epoch", fecha_desde, fecha_hasta)
+    query += condicion
+    params.extend(valores)
+    if estado == 'en_cochera':
+        query += " AND e.salio = 0"
+    elif estado == 'salieron':
+        query += " AND e.salio = 1"
+
+    query += " ORDER BY e.entrada_epoch DESC, e.id DESC"
+    return query, params
+
+
+ENCABEZADOS_TURNOS = [
+    'Turno', 'Trabajador', 'Tipo', 'Inicio', 'Fin', 'Estado', 'Efectivo', 'Yape',
+    'Total', 'Efectivo Declarado', 'Yape Declarado', 'Diferencia', 'Movimientos',
+    'Observaciones'
+]
+
+
+def consulta_reportes_turnos(trabajador_id="", fecha_desde="", fecha_hasta=""):
+    """Turnos con sus totales, con los filtros de la pestaña Reportes"""
+    query = """
+        SELECT
+            t.id,
+            tr.nombre as trabajador,
+            t.tipo_turno,
+            t.fecha_inicio,
+            t.fecha_fin,
+            t.estado,
+            IFNULL(t.total_efectivo_centimos, 0) / 100.0 as total_efectivo,
+            IFNULL(t.total_yape_centimos, 0) / 100.0 as total_yape,
+            (IFNULL(t.total_efectivo_centimos, 0) + IFNULL(t.total_yape_centimos, 0)) / 100.0 as total,
+            t.efectivo_declarado,
+            t.yape_declarado,
+            (IFNULL(t.efectivo_declarado_centimos, 0) - IFNULL(t.total_efectivo_centimos, 0)) / 100.0 as diferencia,
+            IFNULL(tt.num_movimientos, 0) as num_movimientos,
+            t.observaciones
+        FROM turnos t
+        JOIN trabajadores tr ON t.trabajador_id = tr.id
+        LEFT JOIN turno_totales tt ON tt.turno_id = t.id
+        WHERE 1=1
+    """
+    params = []
+
+    if trabajador_id:
+        query += " AND t.trabajador_id = ?"
+        params.append(int(trabajador_id))
+    condicion, valores = filtro_fechas("t.inicio_epoch", fecha_desde, fecha_hasta)
+    query += condicion
+    params.extend(valores)
+
+    query += " ORDER BY t.inicio_epoch DESC, t.id DESC"
+    return query, params
+
+
+ENCABEZADOS_CLIENTES = [
+    'Placa', 'Nombre', 'Celular', 'Precio/Día', 'Visitas', 'Última Visita',
+    'En Cochera', 'Total Gastado', 'Deuda', 'Actualizado'
+]
+
+
+def consulta_clientes(busqueda=""):
+    """Clientes con sus estadísticas (cliente_stats)"""
+    query = """
+        SELECT
+            c.placa,
+            c.nombre,
+            c.celular,
+            c.precio_dia,
+            IFNULL(s.total_visitas, 0) as total_visitas,
+            s.ultima_visita,
+            IFNULL(s.entradas_activas, 0) as entradas_activas,
+            IFNULL(s.total_gastado_centimos, 0) / 100.0 as total_gastado,
+            IFNULL(s.deuda_actual_centimos, 0) / 100.0 as deuda_actual,
+            c.fecha_actualizacion
+        FROM clientes c
+        LEFT JOIN cliente_stats s ON s.cliente_id = c.id
+        WHERE 1=1
+    """
+    params = []
+
+    if busqueda:
+        filtro, params = filtro_clientes(busqueda.strip().upper(), ("placa", "nombre"))
+        query += filtro
+
+    query += " ORDER BY c.fecha_actualizacion DESC, c.id DESC"
+    return query, params
+
+
+# {tipo: titulo de la hoja, encabezados, consulta, filtros que acepta y si
+#  es solo para el administrador}
+EXPORTACIONES = {
+    "historial": {
+        "titulo": "Historial",
+        "encabezados": ENCABEZADOS_HISTORIAL,
+        "consulta": consulta_historial,
+        "filtros": ("placa", "fecha_desde", "fecha_hasta", "estado"),
+        "solo_admin": False,
+    },
+    "reportes_turnos": {
+        "titulo": "Turnos",
+        "encabezados": ENCABEZADOS_TURNOS,
+        "consulta": consulta_reportes_turnos,
+        "filtros": ("trabajador_id", "fecha_desde", "fecha_hasta"),
+        "solo_admin": True,
+    },
+    "clientes": {
+        "titulo": "Clientes",
+        "encabezados": ENCABEZADOS_CLIENTES,
+        "consulta": consulta_clientes,
+        "filtros": ("busqueda",),
+        "solo_admin": True,
+    },
+}
+
+
+def filas_en_bloques(cursor, primeras=()):
+    """Filas ya leídas (`primeras`) y luego el resto del cursor, en bloques"""
+    if primeras:
+        yield list(primeras)
+    while True:
+        bloque = cursor.fetchmany(FILAS_POR_BLOQUE)
+        if not bloque:
+            return
+        yield bloque
+
+
+# ============================================
+# EXCEL
+# ============================================
+
+def _anchos(encabezados, muestra):
+    anchos = [len(str(h)) for h in encabezados]
+    for fila in muestra:
+        for i, valor in enumerate(fila):
+            if valor is not None:
+                anchos[i] = max(anchos[i], len(str(valor)))
+    return [min(ancho + 2, ANCHO_MAXIMO) for ancho in anchos]
+
+
+def escribir_xlsx(destino, encabezados, cursor, titulo="Historial", progreso=None):
+    """
+    Escribe las filas pendientes de `cursor` en un .xlsx (ruta o archivo).
+    Requiere openpyxl (ImportError si no está instalado).
+
+    Args:
+        progreso: Función opcional que recibe las filas escritas hasta ahora
+
+    Returns:
+        int: Filas escritas
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    from openpyxl.utils import get_column_letter
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(titulo)
+
+    # Los anchos deben fijarse antes de la primera fila
+    muestra = cursor.fetchmany(FILAS_MUESTRA)
+    for i, ancho in enumerate(_anchos(encabezados, muestra), 1):
+        ws.column_dimensions[get_column_letter(i)].width = ancho
+
+    header_font = Font(bold=True, color="FFFFFF")
+    header_fill = PatternFill(start_color="1F2937", end_color="1F2937", fill_type="solid")
+    lado = Side(style='thin')
+    thin_border = Border(left=lado, right=lado, top=lado, bottom=lado)
+
+    fila_encabezados = []
+    for encabezado in encabezados:
+        cell = WriteOnlyCell(ws, value=encabezado)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.alignment = Alignment(horizontal='center')
+        cell.border = thin_border
+        fila_encabezados.append(cell)
+    ws.append(fila_encabezados)
+
+    total = 0
+    for bloque in filas_en_bloques(cursor, muestra):
+        for fila in bloque:
+            ws.append(tuple(fila))
+        total += len(bloque)
+        if progreso:
+            progreso(total)
+
+    wb.save(destino)
+    return total
+
+
+def xlsx_temporal(encabezados, cursor, titulo="Historial"):
+    """Escribe el .xlsx en un archivo temporal y devuelve su ruta (quien la pida la borra)"""
+    fd, ruta = tempfile.mkstemp(suffix=".xlsx", prefix=PREFIJO)
+    os.close(fd)
+    try:
+        escribir_xlsx(ruta, encabezados, cursor, titulo)
+    except Exception:
+        os.remove(ruta)
+        raise
+    return ruta
+
+
+# ============================================
+# CSV
+# ============================================
+
+def generar_csv(encabezados, cursor, comprimir=False, progreso=None):
+    """
+    Genera el CSV (UTF-8 con BOM, para que Excel respete los acentos) en
+    trozos de bytes, un trozo por bloque de filas del cursor.
+
+    Args:
+        comprimir: Comprimir con gzip a medida que se genera
+        progreso: Función opcional que recibe las filas escritas hasta ahora
+    """
+    texto = io.StringIO()
+    escritor = csv.writer(texto)
+    compresor = zlib.compressobj(wbits=31) if comprimir else None
+
+    def vaciar():
+        datos = texto.getvalue().encode("utf-8")
+        texto.seek(0)
+        texto.truncate()
+        return compresor.compress(datos) if compresor else datos
+
+    texto.write("\ufeff")
+    escritor.writerow(encabezados)
+    yield vaciar()
+
+    total = 0
+    for bloque in filas_en_bloques(cursor):
+        escritor.writerows(tuple(fila) for fila in bloque)
+        total += len(bloque)
+        if progreso:
+            progreso(total)
+        trozo = vaciar()
+        if trozo:
+            yield trozo
+
+    if compresor:
+        yield compresor.flush()
+
+
+def leer_y_borrar(ruta, tamano=256 * 1024):
+    """Lee un archivo temporal por partes y lo borra al terminar (o cortarse) la descarga"""
+    try:
+        with open(ruta, 'rb') as archivo:
+            while True:
+                bloque = archivo.read(tamano)
+                if not bloque:
+                    break
+                yield bloque
+    finally:
+        os.remove(ruta)
@@ -3,10 +3,16 @@ Utilidades y Funciones Auxiliares
 =================================
 Funciones comunes usadas en toda la aplicación.
 """
-from datetime import datetime, timedelta
+import hashlib
+import time
+from datetime import datetime
 from functools import wraps
-from flask import session, redirect, jsonify
+from flask import session, redirect, jsonify, request, make_response
 from models.database import get_db
+from models.versiones import leer_version, incrementar_version
+from models.dinero import a_soles
+from models.resumenes import COLUMNAS_TURNO
+from .tarifas import calcular_cobros
 
 
 # ============================================
@@ -24,11 +30,7 @@ def login_required(f):
         # Para trabajadores (no admin), verificar que su turno siga abierto
         turno_id = session.get("turno_id")
         if turno_id and not session.get("es_admin"):
-            db = get_db()
-            cursor = db.cursor()
-            cursor.execute("SELECT estado FROM turnos WHERE id = ?", (turno_id,))
-            turno = cursor.fetchone()
-            if not turno or turno["estado"] != "abierto":
+            if estado_turno(turno_id) != "abierto":
                 session.clear()
                 return redirect("/")
 
@@ -51,10 +53,187 @@ def admin_required(f):
     return decorated_function
 
 
+def _es_error(respuesta):
+    """Las vistas JSON devuelven los errores con status 200 y "error" u ok=False"""
+    datos = respuesta.get_json(silent=True) if respuesta.is_json else None
+    return isinstance(datos, dict) and ("error" in datos or datos.get("ok") is False)
+
+
+def respuesta_versionada(*contadores, segundos=None):
+    """Responde 304 si los datos no cambiaron desde la última consulta.
+
+    El ETag se arma con la URL, el turno de la sesión, las versiones de
+    `contadores` y, si se indica, el tramo de `segundos` actual (para datos
+    que cambian con el reloj, como penalidades). Si coincide con
+    If-None-Match no se ejecuta la vista."""
+    def decorador(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            partes = [
+                request.full_path,
+                str(session.get("trabajador_id")),
+                str(session.get("turno_id")),
+            ]
+            partes += [f"{c}={leer_version(c)}" for c in contadores]
+            if segundos:
+                partes.append(str(int(time.time() // segundos)))
+            etag = hashlib.sha1("|".join(partes).encode()).hexdigest()[:24]
+
+            if request.if_none_match.contains(etag):
+                respuesta = make_response("", 304)
+                respuesta.set_etag(etag)
+                return respuesta
+
+            respuesta = make_response(f(*args, **kwargs))
+            if respuesta.status_code == 200 and not _es_error(respuesta):
+                respuesta.set_etag(etag)
+                respuesta.headers["Cache-Control"] = "no-cache"
+            return respuesta
+        return decorated_function
+    return decorador
+
+
 # ============================================
 # FUNCIONES DE TURNO
 # ============================================
 
+# Estado de los turnos ya consultados ({turno_id: estado}). Se descarta
+# cuando cambia la versión 'turnos', es decir, cuando cualquier worker
+# cierra un turno.
+_estado_turnos = (None, {})
+
+
+def estado_turno(turno_id):
+    """Estado de un turno ('abierto', 'cerrado' o None si no existe)"""
+    global _estado_turnos
+
+    # Leer la versión antes de consultar: si el cierre ocurre en medio,
+    # la siguiente llamada verá la versión nueva y volverá a consultar
+    version = leer_version('turnos')
+    version_cache, estados = _estado_turnos
+    if version_cache != version:
+        estados = {}
+        _estado_turnos = (version, estados)
+
+    if turno_id not in estados:
+        db = get_db()
+        cursor = db.cursor()
+        cursor.execute("SELECT estado FROM turnos WHERE id = ?", (turno_id,))
+        turno = cursor.fetchone()
+        if not turno:
+            return None
+        estados[turno_id] = turno["estado"]
+
+    return estados[turno_id]
+
+
+def invalidar_turnos():
+    """Avisa a todos los workers que el estado de algún turno cambió"""
+    incrementar_version('turnos')
+
+
+def invalidar_caja():
+    """Avisa a todos los workers que hubo movimientos de caja"""
+    incrementar_version('caja')
+
+
+def totales_turno(turno_id):
+    """
+    Totales acumulados del turno (tabla turno_totales, mantenida por
+    triggers): cobrado, efectivo, yape, adelantos, cobros, penalidades,
+    movimientos y autos ingresados/salidos.
+
+    Los montos vienen en soles (total_cobrado, ...) y también en céntimos
+    tal como se guardan (total_cobrado_centimos, ...) para cuentas exactas.
+    """
+    db = get_db()
+    cursor = db.cursor()
+    cursor.execute("SELECT * FROM turno_totales WHERE turno_id = ?", (turno_id,))
+    fila = cursor.fetchone()
+    totales = {columna: fila[columna] if fila else 0 for columna in COLUMNAS_TURNO}
+    for columna in COLUMNAS_TURNO:
+        if columna.endswith("_centimos"):
+            totales[columna.removesuffix("_centimos")] = a_soles(totales[columna])
+    return totales
+
+
+# ============================================
+# INGRESOS POR FECHA
+# ============================================
+
+# Sumas enteras en céntimos; se pasan a soles al final
+_SUMAS_INGRESOS = """
+    IFNULL(SUM(CASE WHEN metodo_pago = 'efectivo' THEN total_centimos ELSE 0 END), 0) / 100.0 as efectivo,
+    IFNULL(SUM(CASE WHEN metodo_pago = 'yape' THEN total_centimos ELSE 0 END), 0) / 100.0 as yape,
+    IFNULL(SUM(total_centimos), 0) / 100.0 as total,
+    IFNULL(SUM(num_movimientos), 0) as movimientos
+"""
+
+_PERIODOS = {
+    "dia": "fecha",
+    "mes": "substr(fecha, 1, 7)",
+}
+
+
+def _rango_fechas(desde, hasta):
+    condiciones, params = [], []
+    if desde:
+        condiciones.append("fecha >= ?")
+        params.append(desde)
+    if hasta:
+        condiciones.append("fecha <= ?")
+        params.append(hasta)
+    return (" WHERE " + " AND ".join(condiciones) if condiciones else ""), params
+
+
+def ingresos_rango(desde=None, hasta=None):
+    """
+    Ingresos entre dos fechas inclusive (YYYY-MM-DD; None = sin límite),
+    desde la tabla ingresos_diarios.
+
+    Returns:
+        dict: efectivo, yape, total y movimientos
+    """
+    filtro, params = _rango_fechas(desde, hasta)
+    cursor = get_db().cursor()
+    cursor.execute(f"SELECT {_SUMAS_INGRESOS} FROM ingresos_diarios{filtro}", params)
+    return dict(cursor.fetchone())
+
+
+def ingresos_por_periodo(desde=None, hasta=None, agrupar="dia"):
+    """
+    Ingresos agrupados por día ('dia') o por mes ('mes'), en orden.
+
+    Returns:
+        list: dicts con periodo, efectivo, yape, total y movimientos
+    """
+    periodo = _PERIODOS.get(agrupar)
+    if not periodo:
+        raise ValueError(f"Agrupación no válida: {agrupar}")
+    filtro, params = _rango_fechas(desde, hasta)
+    cursor = get_db().cursor()
+    cursor.execute(f"""
+        SELECT {periodo} as periodo, {_SUMAS_INGRESOS}
+        FROM ingresos_diarios{filtro}
+        GROUP BY periodo
+        ORDER BY periodo
+    """, params)
+    return [dict(fila) for fila in cursor.fetchall()]
+
+
+def ingresos_por_tipo(desde=None, hasta=None):
+    """Total y cantidad de movimientos por tipo entre dos fechas inclusive"""
+    filtro, params = _rango_fechas(desde, hasta)
+    cursor = get_db().cursor()
+    cursor.execute(f"""
+        SELECT tipo, IFNULL(SUM(total_centimos), 0) / 100.0 as total, IFNULL(SUM(num_movimientos), 0) as movimientos
+        FROM ingresos_diarios{filtro}
+        GROUP BY tipo
+        ORDER BY total DESC
+    """, params)
+    return [dict(fila) for fila in cursor.fetchall()]
+
+
 def obtener_turno_activo(trabajador_id):
     """Obtiene el turno activo de un trabajador"""
     db = get_db()
@@ -106,13 +285,30 @@ def obtener_turno_trabajador_activo():
 # FUNCIONES DE CONFIGURACIÓN
 # ============================================
 
+# Copia en memoria de la tabla configuracion. Se recarga completa cuando
+# otro worker (o este) incrementa la versión 'configuracion'.
+_config_cache = (None, {})
+
+
 def obtener_configuracion(clave, default=None):
-    """Obtiene un valor de configuración de la base de datos"""
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute("SELECT valor FROM configuracion WHERE clave = ?", (clave,))
-    result = cursor.fetchone()
-    return result['valor'] if result else default
+    """Obtiene un valor de configuración (desde la caché del proceso)"""
+    global _config_cache
+
+    version = leer_version('configuracion')
+    version_cache, valores = _config_cache
+    if version_cache != version:
+        db = get_db()
+        cursor = db.cursor()
+        cursor.execute("SELECT clave, valor FROM configuracion")
+        valores = {r['clave']: r['valor'] for r in cursor.fetchall()}
+        _config_cache = (version, valores)
+    valor = valores.get(clave)
+    return valor if valor is not None else default
+
+
+def invalidar_configuracion():
+    """Avisa a todos los workers que la configuración cambió"""
+    incrementar_version('configuracion')
 
 
 # ============================================
@@ -134,29 +330,20 @@ def calcular_penalidad(fecha_entrada, hora_entrada, fecha_salida_esperada,
     Returns:
         float: Monto de penalidad (0 si está dentro del tiempo)
     """
-    try:
-        tolerancia = int(obtener_configuracion('tolerancia_minutos', 60))
-        
-        salida_esperada = datetime.strptime(
-            f"{fecha_salida_esperada} {hora_salida_esperada}", 
-            "%Y-%m-%d %H:%M"
-        )
-        ahora = datetime.now()
-        salida_con_tolerancia = salida_esperada + timedelta(minutes=tolerancia)
-        
-        if ahora <= salida_con_tolerancia:
-            return 0
-        
-        diferencia = ahora - salida_con_tolerancia
-        horas_exceso = diferencia.total_seconds() / 3600
-        precio_hora = float(precio_dia) / 24
-        penalidad = round(horas_exceso * precio_hora, 2)
-        
-        return penalidad
-        
-    except Exception as e:
-        print(f"Error calculando penalidad: {e}")
-        return 0
+    tolerancia = int(obtener_configuracion('tolerancia_minutos', 60))
+    cobro = calcular_cobros([{
+        "fecha_entrada": fecha_entrada,
+        "fecha_hasta": fecha_salida_esperada,
+        "hora_salida_esperada": hora_salida_esperada,
+        "precio_dia": precio_dia,
+    }], tolerancia)[0]
+    return cobro["penalidad"]
+
+
+def calcular_cobros_activos(entradas, ahora=None):
+    """calcular_cobros con la tolerancia configurada"""
+    tolerancia = int(obtener_configuracion('tolerancia_minutos', 60))
+    return calcular_cobros(entradas, tolerancia, ahora)
 
 
 # ============================================
@@ -184,3 +371,20 @@ def formato_hora(hora_str):
     if not hora_str:
         return ""
     return hora_str[:5] if len(hora_str) >= 5 else hora_str
+
+
+def formato_movimiento(fila):
+    """Movimiento de caja (con placa y cliente) tal como lo muestra el dashboard"""
+    fecha_movimiento = fila["fecha_movimiento"]
+    return {
+        "id": fila["id"],
+        "entrada_id": fila["entrada_id"],
+        "tipo": fila["tipo"],
+        "hora": fecha_movimiento.split(" ")[1][:5] if fecha_movimiento else "",
+        "fecha": fecha_movimiento.split(" ")[0] if fecha_movimiento else "",
+        "placa": fila["placa"] or "-",
+        "cliente": fila["cliente"] or "-",
+        "monto": float(fila["monto"] or 0),
+        "metodo_pago": fila["metodo_pago"],
+        "descripcion": fila["descripcion"]
+    }
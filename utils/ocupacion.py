@@ -0,0 +1,147 @@
+"""
+Índice de Ocupación
+===================
+Vehículos actualmente en la cochera, en memoria, por id de entrada y placa.
+
+Se carga una vez desde la base y se mantiene con cada entrada, salida o
+edición. Cada escritura incrementa la versión compartida 'ocupacion'; si
+este worker estaba al día aplica el cambio leyendo solo las filas tocadas,
+y si otro worker escribió en el medio se recarga completo en la siguiente
+lectura.
+"""
+import threading
+
+from models.database import get_db
+from models.versiones import leer_version, incrementar_version
+
+
+_CONSULTA = """
+    SELECT
+        e.id,
+        e.cliente_id,
+        c.placa,
+        c.nombre as cliente,
+        c.celular,
+        e.fecha_entrada,
+        e.hora_entrada,
+        e.fecha_hasta,
+        e.hora_salida_esperada,
+        e.dias as dias_pactados,
+        e.precio_dia,
+        e.monto,
+        e.adelanto,
+        e.metodo_pago,
+        e.dejo_llave,
+        e.pagado,
+        e.pago_completo_adelantado,
+        e.observaciones,
+        t.nombre as trabajador_entrada
+    FROM entradas e
+    JOIN clientes c ON e.cliente_id = c.id
+    LEFT JOIN trabajadores t ON e.trabajador_id = t.id
+    WHERE e.salio = 0
+"""
+
+_indice = {"version": None, "por_id": {}, "por_placa": {}}
+_lock = threading.Lock()
+
+
+def _agregar(auto):
+    _indice["por_id"][auto["id"]] = auto
+    _indice["por_placa"][auto["placa"]] = auto["id"]
+
+
+def _quitar(entrada_id):
+    auto = _indice["por_id"].pop(entrada_id, None)
+    if auto and _indice["por_placa"].get(auto["placa"]) == entrada_id:
+        del _indice["por_placa"][auto["placa"]]
+
+
+def _sincronizar():
+    """Recarga el índice completo si otro worker lo modificó"""
+    version = leer_version('ocupacion')
+    if _indice["version"] == version:
+        return
+    cursor = get_db().cursor()
+    cursor.execute(_CONSULTA)
+    _indice["por_id"] = {}
+    _indice["por_placa"] = {}
+    for fila in cursor.fetchall():
+        _agregar(dict(fila))
+    _indice["version"] = version
+
+
+# ============================================
+# CONSULTAS
+# ============================================
+
+def autos_activos():
+    """Autos en cochera, del ingreso más reciente al más antiguo"""
+    with _lock:
+        _sincronizar()
+        autos = list(_indice["por_id"].values())
+    autos.sort(
+        key=lambda a: (a["fecha_entrada"] or "", a["hora_entrada"] or "", a["id"]),
+        reverse=True
+    )
+    return autos
+
+
+def total_ocupados():
+    """Cantidad de autos en cochera"""
+    with _lock:
+        _sincronizar()
+        return len(_indice["por_id"])
+
+
+def placa_en_cochera(placa):
+    """Id de la entrada activa de `placa`, o None"""
+    with _lock:
+        _sincronizar()
+        return _indice["por_placa"].get(placa)
+
+
+# ============================================
+# ACTUALIZACIÓN (llamar después del commit)
+# ============================================
+
+def actualizar_ocupacion(entrada_ids=(), cliente_id=None, recargar=False):
+    """
+    Registra un cambio en las entradas activas.
+
+    Args:
+        entrada_ids: Entradas insertadas, editadas o que salieron
+        cliente_id: Cliente cuyos datos cambiaron
+        recargar: Forzar recarga completa en todos los workers
+    """
+    entrada_ids = [int(i) for i in entrada_ids]
+    with _lock:
+        anterior = _indice["version"]
+        nueva = incrementar_version('ocupacion')
+        if recargar or anterior is None or nueva != anterior + 1:
+            return
+
+        condiciones, params = [], []
+        if entrada_ids:
+            condiciones.append(f"e.id IN ({','.join('?' * len(entrada_ids))})")
+            params.extend(entrada_ids)
+        if cliente_id is not None:
+            condiciones.append("e.cliente_id = ?")
+            params.append(cliente_id)
+
+        if condiciones:
+            cursor = get_db().cursor()
+            cursor.execute(f"{_CONSULTA} AND ({' OR '.join(condiciones)})", params)
+            activos = {fila["id"]: dict(fila) for fila in cursor.fetchall()}
+
+            tocados = set(entrada_ids)
+            if cliente_id is not None:
+                tocados.update(
+                    i for i, a in _indice["por_id"].items() if a["cliente_id"] == cliente_id
+                )
+            for entrada_id in tocados | set(activos):
+                _quitar(entrada_id)
+            for auto in activos.values():
+                _agregar(auto)
+
+        _indice["version"] = nueva
@@ -0,0 +1,267 @@
+"""
+Ocupación Histórica
+===================
+Cuántos autos hubo en la cochera hora por hora, a partir de los
+intervalos entrada → salida de la tabla entradas.
+
+En vez de contar los autos de cada hora por separado (un recorrido de la
+tabla por hora), cada entrada y cada salida se convierte en un evento +1 /
+-1. Con los eventos ordenados por tiempo, una sola pasada (línea de
+barrido) da la ocupación en cada instante y de ahí el promedio (ponderado
+por tiempo) y el pico de cada hora.
+
+Un día cerrado solo cambia si se edita o borra una entrada, así que su
+resultado se guarda en ocupacion_horaria (24 filas por día). Los triggers
+de la migración 10 borran los días que toca cada cambio y la siguiente
+consulta los vuelve a calcular. El día de hoy se calcula siempre en vivo,
+hasta la hora actual.
+"""
+import calendar
+from datetime import date, datetime, timedelta
+
+from models.database import get_db
+
+
+SEGUNDOS_HORA = 3600
+SEGUNDOS_DIA = 24 * SEGUNDOS_HORA
+
+AGRUPACIONES = ("hora", "dia", "dia_semana")
+
+# Entrada y salida en segundos (columnas *_epoch, models/fechas.py). Las
+# fechas se guardan en hora local y se tratan igual en todo el módulo, así
+# que cada día tiene 24 horas exactas. Tres partes: las que salieron y
+# entraron en el rango, las que entraron antes y salieron dentro o después
+# (las dos son tramos de idx_entradas_fecha, que tiene las dos columnas)
+# y las que siguen en la cochera (idx_entradas_activas). Las entradas sin
+# fecha (epoch 0) y las salidas sin fecha (datos antiguos) no cuentan
+_CONSULTA_INTERVALOS = """
+    SELECT entrada_epoch, salida_epoch
+    FROM entradas
+    WHERE entrada_epoch >= ? AND entrada_epoch < ? AND salida_epoch IS NOT NULL
+    UNION ALL
+    SELECT entrada_epoch, salida_epoch
+    FROM entradas
+    WHERE entrada_epoch > 0 AND entrada_epoch < ? AND salida_epoch >= ?
+    UNION ALL
+    SELECT entrada_epoch, NULL
+    FROM entradas
+    WHERE salio = 0 AND fecha_entrada <= ? AND fecha_salida IS NULL AND entrada_epoch > 0
+"""
+
+
+def _segundos(momento):
+    return calendar.timegm(momento.timetuple())
+
+
+def _dias(desde, hasta):
+    dia = date.fromisoformat(desde)
+    fin = date.fromisoformat(hasta)
+    while dia <= fin:
+        yield dia.isoformat()
+        dia += timedelta(days=1)
+
+
+# ============================================
+# LÍNEA DE BARRIDO
+# ============================================
+
+def _eventos(cursor, inicio, fin, hasta):
+    """
+    Entradas y salidas que afectan a [inicio, fin) (segundos; `hasta` es el
+    último día, para los autos en cochera), ordenadas por tiempo.
+
+    Cada evento es un entero: segundo * 2 + 1 para una entrada y segundo * 2
+    para una salida. Ordenar enteros es mucho más rápido que ordenar tuplas,
+    y a igual segundo la salida queda antes que la entrada (no infla el pico).
+    """
+    cursor.execute(_CONSULTA_INTERVALOS, (inicio, fin, inicio, inicio, hasta))
+    eventos = []
+    agregar = eventos.append
+    for entrada, salida in cursor:
+        if salida is not None:
+            # Salida anterior a la entrada (dato mal editado)
+            if salida <= entrada:
+                continue
+            agregar(salida * 2)
+        agregar(entrada * 2 + 1)
+    eventos.sort()
+    return eventos
+
+
+def _barrer(eventos, inicio, fin):
+    """
+    Recorre los eventos una vez y devuelve (promedio, pico) de cada hora
+    desde `inicio` hasta `fin` (segundos; la última hora puede quedar a
+    medias si `fin` es ahora).
+    """
+    ocupados = 0
+    i = 0
+    total = len(eventos)
+
+    # Autos que ya estaban dentro al empezar
+    limite = inicio * 2
+    while i < total and eventos[i] < limite:
+        ocupados += 1 if eventos[i] & 1 else -1
+        i += 1
+
+    horas = []
+    desde_hora = inicio
+    while desde_hora < fin:
+        hasta_hora = min(desde_hora + SEGUNDOS_HORA, fin)
+        limite = hasta_hora * 2
+        area = 0
+        pico = 0
+        t = desde_hora
+        while i < total and eventos[i] < limite:
+            evento = eventos[i]
+            momento = evento >> 1
+            # El pico solo cuenta tramos con duración: un auto que sale
+            # justo a la hora en punto ya no está en la hora siguiente
+            if momento > t:
+                area += ocupados * (momento - t)
+                if ocupados > pico:
+                    pico = ocupados
+                t = momento
+            ocupados += 1 if evento & 1 else -1
+            i += 1
+        if hasta_hora > t:
+            area += ocupados * (hasta_hora - t)
+            if ocupados > pico:
+                pico = ocupados
+        horas.append((area / (hasta_hora - desde_hora), pico))
+        desde_hora += SEGUNDOS_HORA
+    return horas
+
+
+def _calcular(cursor, desde, hasta, ahora):
+    """{fecha: [(promedio, pico) por hora]} de desde a hasta, sin pasar de `ahora`"""
+    inicio = _segundos(date.fromisoformat(desde))
+    fin_dia = _segundos(date.fromisoformat(hasta)) + SEGUNDOS_DIA
+    fin = min(fin_dia, ahora)
+    horas = _barrer(_eventos(cursor, inicio, fin_dia, hasta), inicio, fin)
+    return {
+        fecha: horas[n * 24:(n + 1) * 24]
+        for n, fecha in enumerate(_dias(desde, hasta))
+        if horas[n * 24:(n + 1) * 24]
+    }
+
+
+# ============================================
+# CACHÉ DE DÍAS CERRADOS
+# ============================================
+
+def ocupacion_por_hora(desde, hasta):
+    """
+    Ocupación de cada hora entre dos fechas inclusive (hasta la hora actual).
+
+    Returns:
+        dict: {fecha: [(promedio, pico), ...]}, en orden; 24 horas por día
+              salvo hoy
+    """
+    ahora = datetime.now()
+    hoy = ahora.date().isoformat()
+    hasta = min(hasta, hoy)
+    if desde > hasta:
+        return {}
+
+    db = get_db()
+    cursor = db.cursor()
+    cursor.execute("""
+        SELECT fecha, promedio, pico
+        FROM ocupacion_horaria
+        WHERE fecha BETWEEN ? AND ?
+        ORDER BY fecha, hora
+    """, (desde, hasta))
+    por_dia = {}
+    for fila in cursor.fetchall():
+        por_dia.setdefault(fila["fecha"], []).append((fila["promedio"], fila["pico"]))
+
+    faltan = [d for d in _dias(desde, hasta) if d == hoy or len(por_dia.get(d, ())) != 24]
+    if faltan:
+        cerrados = [d for d in faltan if d < hoy]
+        if cerrados and not db.in_transaction:
+            # Calcular y guardar con el lock de escritura tomado: una edición
+            # no puede colarse entre la lectura y el guardado y dejar en la
+            # caché un día ya invalidado
+            cursor.execute("BEGIN IMMEDIATE")
+        try:
+            # Un solo barrido del primer al último día faltante; los días
+            # cerrados del medio que ya estaban se guardan otra vez
+            calculados = _calcular(cursor, faltan[0], faltan[-1], _segundos(ahora))
+            if cerrados:
+                cursor.execute("DELETE FROM ocupacion_horaria WHERE fecha BETWEEN ? AND ?",
+                               (faltan[0], cerrados[-1]))
+                cursor.executemany("""
+                    INSERT INTO ocupacion_horaria (fecha, hora, promedio, pico)
+                    VALUES (?, ?, ?, ?)
+                """, [
+                    (fecha, hora, promedio, pico)
+                    for fecha, horas in calculados.items() if fecha < hoy
+                    for hora, (promedio, pico) in enumerate(horas)
+                ])
+                db.commit()
+                print(f"[OCUPACION] Días {faltan[0]} a {cerrados[-1]} calculados")
+        except Exception:
+            db.rollback()
+            raise
+        por_dia.update(calculados)
+
+    return {fecha: por_dia[fecha] for fecha in sorted(por_dia)}
+
+
+# ============================================
+# SERIES
+# ============================================
+
+def _resumen(valores):
+    promedios = [p for p, _ in valores]
+    return {
+        "promedio": round(sum(promedios) / len(promedios), 2) if promedios else 0,
+        "pico": max((pico for _, pico in valores), default=0),
+    }
+
+
+def serie_ocupacion(desde, hasta, agrupar="dia"):
+    """
+    Ocupación entre dos fechas inclusive agrupada por hora ('hora'), por
+    día ('dia') o por día de la semana y hora ('dia_semana', 0 = lunes).
+
+    Returns:
+        dict: serie (promedio y pico por periodo) y resumen del rango
+              (promedio, pico y cuándo fue el pico)
+    """
+    if agrupar not in AGRUPACIONES:
+        raise ValueError(f"Agrupación no válida: {agrupar}")
+    date.fromisoformat(desde)
+    date.fromisoformat(hasta)
+
+    por_dia = ocupacion_por_hora(desde, hasta)
+
+    if agrupar == "hora":
+        serie = [
+            {"periodo": f"{fecha} {hora:02d}:00", "promedio": round(promedio, 2), "pico": pico}
+            for fecha, horas in por_dia.items()
+            for hora, (promedio, pico) in enumerate(horas)
+        ]
+    elif agrupar == "dia":
+        serie = [dict(periodo=fecha, **_resumen(horas)) for fecha, horas in por_dia.items()]
+    else:
+        celdas = {}
+        for fecha, horas in por_dia.items():
+            dia_semana = date.fromisoformat(fecha).weekday()
+            for hora, valor in enumerate(horas):
+                celdas.setdefault((dia_semana, hora), []).append(valor)
+        serie = [
+            dict(dia_semana=dia_semana, hora=hora, **_resumen(valores))
+            for (dia_semana, hora), valores in sorted(celdas.items())
+        ]
+
+    resumen = _resumen([valor for horas in por_dia.values() for valor in horas])
+    resumen["momento_pico"] = next((
+        f"{fecha} {hora:02d}:00"
+        for fecha, horas in por_dia.items()
+        for hora, (_, pico) in enumerate(horas)
+        if pico == resumen["pico"]
+    ), None) if resumen["pico"] else None
+
+    return {"serie": serie, "resumen": resumen}
@@ -0,0 +1,106 @@
+"""
+Paginación por Cursor
+=====================
+Paginación keyset: en vez de LIMIT/OFFSET, cada página pide las filas que
+vienen después de la última fila de la página anterior según las columnas
+de orden (la última debe ser única, normalmente el id). Con un índice
+sobre esas columnas la página 500 cuesta lo mismo que la primera.
+
+El cursor que viaja al navegador es opaco (los valores de orden de la
+última fila en base64). Las expresiones de orden no deben dar NULL (una
+comparación con NULL no es verdadera y la fila se saltaría): una columna
+que puede ser NULL se ordena por IFNULL(columna, '').
+"""
+import base64
+import json
+
+
+POR_PAGINA_MAXIMO = 200
+
+
+def codificar_cursor(valores):
+    texto = json.dumps(list(valores), separators=(",", ":"))
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor):
+    """Valores de orden del cursor; ValueError si no es válido"""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except Exception:
+        raise ValueError("Cursor de paginación inválido")
+    if not isinstance(valores, list):
+        raise ValueError("Cursor de paginación inválido")
+    return valores
+
+
+def leer_paginacion(args, por_pagina=50):
+    """
+    Parámetros de paginación de la petición.
+
+    Args:
+        args: request.args (despues, por_pagina, contar)
+
+    Returns:
+        tuple: (por_pagina, valores del cursor o None, contar)
+    """
+    try:
+        por_pagina = int(args.get("por_pagina", por_pagina))
+    except ValueError:
+        pass
+    por_pagina = max(1, min(por_pagina, POR_PAGINA_MAXIMO))
+
+    despues = args.get("despues")
+    valores = decodificar_cursor(despues) if despues else None
+    return por_pagina, valores, args.get("contar") == "1"
+
+
+def pagina_keyset(cursor, query, params, orden, por_pagina, despues=None):
+    """
+    Ejecuta `query` (terminada en un WHERE) ordenada de forma descendente
+    por `orden` y devuelve una página.
+
+    Args:
+        cursor: Cursor de la base de datos
+        query: SELECT ... WHERE ... sin ORDER BY ni LIMIT
+        params: Parámetros de `query`
+        orden: [(expresión SQL, columna del resultado)]; la última única
+        por_pagina: Filas por página
+        despues: Valores de orden de la última fila de la página anterior
+
+    Returns:
+        tuple: (filas, cursor de la página siguiente o None)
+    """
+    expresiones = ", ".join(e for e, _ in orden)
+    params = list(params)
+
+    if despues is not None:
+        if len(despues) != len(orden):
+            raise ValueError("Cursor de paginación inválido")
+        # La primera condición sobra (la implica la segunda) pero deja usar
+        # el índice como rango cuando la primera columna es una expresión
+        # como IFNULL(...): SQLite no lo hace con la comparación de filas
+        query += f" AND {orden[0][0]} <= ?"
+        query += f" AND ({expresiones}) < ({', '.join('?' * len(orden))})"
+        params.append(despues[0])
+        params.extend(despues)
+
+    query += " ORDER BY " + ", ".join(f"{e} DESC" for e, _ in orden)
+    query += " LIMIT ?"
+    params.append(por_pagina + 1)
+
+    cursor.execute(query, params)
+    filas = cursor.fetchall()
+
+    siguiente = None
+    if len(filas) > por_pagina:
+        filas = filas[:por_pagina]
+        siguiente = codificar_cursor(filas[-1][columna] for _, columna in orden)
+    return filas, siguiente
+
+
+def contar(cursor, query, params):
+    """Total de filas de `query` (solo cuando el cliente lo pide)"""
+    cursor.execute(f"SELECT COUNT(*) FROM ({query})", list(params))
+    return cursor.fetchone()[0]
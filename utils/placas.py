@@ -0,0 +1,143 @@
+"""
+Autocompletado de Placas
+========================
+Todas las placas de clientes en memoria, en una lista ordenada, para
+sugerir coincidencias por prefijo mientras se escribe sin consultar SQLite.
+
+Se carga al arrancar (con --preload los workers la heredan) y se mantiene
+con cada alta, edición o baja de clientes. Cada escritura incrementa la
+versión compartida 'clientes'; si este worker estaba al día aplica solo
+las filas tocadas, y si otro worker escribió en el medio se recarga
+completa en la siguiente lectura.
+"""
+import bisect
+import threading
+
+from models.database import get_db
+from models.versiones import leer_version, incrementar_version
+
+
+_CONSULTA = """
+    SELECT id, placa, nombre, celular, precio_dia
+    FROM clientes
+"""
+
+_indice = {"version": None, "placas": [], "por_placa": {}, "por_id": {}}
+_lock = threading.Lock()
+
+
+def _agregar(cliente):
+    placa = cliente["placa"]
+    if placa not in _indice["por_placa"]:
+        bisect.insort(_indice["placas"], placa)
+    _indice["por_placa"][placa] = cliente
+    _indice["por_id"][cliente["id"]] = placa
+
+
+def _quitar(cliente_id):
+    placa = _indice["por_id"].pop(cliente_id, None)
+    if placa is None or _indice["por_placa"].get(placa, {}).get("id") != cliente_id:
+        return
+    del _indice["por_placa"][placa]
+    posicion = bisect.bisect_left(_indice["placas"], placa)
+    del _indice["placas"][posicion]
+
+
+def _cargar(version):
+    cursor = get_db().cursor()
+    cursor.execute(_CONSULTA)
+    por_placa = {fila["placa"]: dict(fila) for fila in cursor.fetchall()}
+    _indice["placas"] = sorted(por_placa)
+    _indice["por_placa"] = por_placa
+    _indice["por_id"] = {c["id"]: placa for placa, c in por_placa.items()}
+    _indice["version"] = version
+
+
+def _sincronizar():
+    """Recarga el índice completo si otro worker lo modificó"""
+    version = leer_version('clientes')
+    if _indice["version"] != version:
+        _cargar(version)
+
+
+def cargar_placas():
+    """Carga el índice (al arrancar la aplicación)"""
+    with _lock:
+        _sincronizar()
+        return len(_indice["placas"])
+
+
+# ============================================
+# CONSULTAS
+# ============================================
+
+def sugerir_placas(prefijo, limite=8):
+    """
+    Clientes cuya placa empieza con `prefijo`, en orden alfabético.
+
+    Returns:
+        list: dicts con id, placa, nombre, celular y precio_dia
+    """
+    prefijo = prefijo.upper().strip()
+    if not prefijo:
+        return []
+    with _lock:
+        _sincronizar()
+        placas = _indice["placas"]
+        inicio = bisect.bisect_left(placas, prefijo)
+        sugerencias = []
+        for placa in placas[inicio:inicio + limite]:
+            if not placa.startswith(prefijo):
+                break
+            sugerencias.append(dict(_indice["por_placa"][placa]))
+    return sugerencias
+
+
+def datos_placa(placa):
+    """Datos del cliente con esa placa exacta, o None"""
+    with _lock:
+        _sincronizar()
+        cliente = _indice["por_placa"].get(placa.upper().strip())
+        return dict(cliente) if cliente else None
+
+
+# ============================================
+# ACTUALIZACIÓN (llamar después del commit)
+# ============================================
+
+def actualizar_placas(cliente_ids=(), placas=(), recargar=False):
+    """
+    Registra altas, ediciones o bajas de clientes.
+
+    Args:
+        cliente_ids: Clientes creados, editados o eliminados
+        placas: Placas de clientes creados o editados (cuando no se tiene el id)
+        recargar: Forzar recarga completa en todos los workers
+    """
+    cliente_ids = [int(i) for i in cliente_ids]
+    placas = [p.upper().strip() for p in placas]
+    with _lock:
+        anterior = _indice["version"]
+        nueva = incrementar_version('clientes')
+        if recargar or anterior is None or nueva != anterior + 1:
+            return
+
+        condiciones, params = [], []
+        if cliente_ids:
+            condiciones.append(f"id IN ({','.join('?' * len(cliente_ids))})")
+            params.extend(cliente_ids)
+        if placas:
+            condiciones.append(f"placa IN ({','.join('?' * len(placas))})")
+            params.extend(placas)
+
+        if condiciones:
+            cursor = get_db().cursor()
+            cursor.execute(f"{_CONSULTA} WHERE {' OR '.join(condiciones)}", params)
+            actuales = [dict(fila) for fila in cursor.fetchall()]
+
+            for cliente_id in set(cliente_ids) | {c["id"] for c in actuales}:
+                _quitar(cliente_id)
+            for cliente in actuales:
+                _agregar(cliente)
+
+        _indice["version"] = nueva
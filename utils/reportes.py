@@ -0,0 +1,225 @@
+"""
+Archivo de Reportes de Turno
+============================
+Un turno cerrado ya no cambia, así que al cerrarlo se congela su reporte
+en la tabla reportes_turno (una fila por turno):
+
+- datos: turno, estadísticas y movimientos en JSON comprimido (zlib),
+  lo que leen detalle_turno y detalle_mi_turno
+- html / html_admin: reporte_turno.html ya renderizado y comprimido con
+  gzip (solo cambia el botón "Volver"), con su ETag fuerte
+
+Ver un turno cerrado es entonces leer una fila por clave primaria; las
+lecturas nunca escriben. Los turnos abiertos, y los que se cerraron antes
+de existir la tabla, se arman en vivo. Para archivar estos últimos:
+
+    python -m utils.reportes [database.db]
+"""
+import gzip
+import hashlib
+import json
+import os
+import sys
+import zlib
+from datetime import datetime
+
+from flask import render_template, request, make_response
+
+from models.database import get_db
+from models.dinero import a_soles
+from .helpers import totales_turno
+from .ocupacion import total_ocupados
+
+
+# ============================================
+# ARMADO DEL REPORTE
+# ============================================
+
+def datos_reporte(cursor, turno_id):
+    """
+    Reporte completo de un turno a partir de las tablas.
+
+    Returns:
+        dict: turno (con el nombre del trabajador), stats (totales,
+              desglose y cuadre) y movimientos; None si no existe
+    """
+    cursor.execute("""
+        SELECT t.*, tr.nombre as trabajador
+        FROM turnos t
+        JOIN trabajadores tr ON t.trabajador_id = tr.id
+        WHERE t.id = ?
+    """, (turno_id,))
+    turno = cursor.fetchone()
+    if not turno:
+        return None
+
+    totales = totales_turno(turno_id)
+    stats = dict(totales)
+    stats.update({
+        "autos_en_cochera": total_ocupados(),
+        "efectivo_declarado": turno["efectivo_declarado"],
+        "yape_declarado": turno["yape_declarado"],
+        "dif_efectivo": a_soles((turno["efectivo_declarado_centimos"] or 0) - totales["total_efectivo_centimos"]),
+        "dif_yape": a_soles((turno["yape_declarado_centimos"] or 0) - totales["total_yape_centimos"]),
+    })
+
+    cursor.execute("""
+        SELECT
+            m.*,
+            c.placa,
+            c.nombre as cliente,
+            e.fecha_entrada,
+            e.fecha_salida
+        FROM movimientos_caja m
+        LEFT JOIN entradas e ON m.entrada_id = e.id
+        LEFT JOIN clientes c ON e.cliente_id = c.id
+        WHERE m.turno_id = ?
+        ORDER BY m.fecha_movimiento DESC
+    """, (turno_id,))
+
+    return {
+        "turno": dict(turno),
+        "stats": stats,
+        "movimientos": [dict(m) for m in cursor.fetchall()]
+    }
+
+
+def renderizar_reporte(datos, es_admin, generado=None):
+    """HTML de reporte_turno.html para `datos` (ver datos_reporte)"""
+    turno = datos["turno"]
+    ahora = datetime.now()
+    return render_template(
+        "reporte_turno.html",
+        turno_id=turno["id"],
+        trabajador=turno["trabajador"],
+        es_admin=es_admin,
+        inicio_turno=turno["fecha_inicio"],
+        fin_turno=turno["fecha_fin"] or ahora.strftime("%Y-%m-%d %H:%M:%S"),
+        estado_turno=turno["estado"],
+        stats=datos["stats"],
+        detalles=datos["movimientos"],
+        observaciones=turno["observaciones"] or "",
+        now=generado or ahora.strftime("%Y-%m-%d %H:%M")
+    )
+
+
+# ============================================
+# ARCHIVO
+# ============================================
+
+def _etag(html):
+    return hashlib.sha1(html).hexdigest()[:24]
+
+
+def archivar_reporte(cursor, turno_id):
+    """
+    Congela el reporte del turno (llamar con el turno ya cerrado, dentro
+    de la misma transacción; el commit lo hace quien llama).
+
+    Returns:
+        dict: los datos archivados, o None si el turno no existe
+    """
+    datos = datos_reporte(cursor, turno_id)
+    if datos is None:
+        return None
+
+    generado = datetime.now().strftime("%Y-%m-%d %H:%M")
+    html = renderizar_reporte(datos, False, generado).encode()
+    html_admin = renderizar_reporte(datos, True, generado).encode()
+
+    cursor.execute("""
+        INSERT OR REPLACE INTO reportes_turno
+            (turno_id, fecha_generacion, etag, etag_admin, datos, html, html_admin)
+        VALUES (?, datetime('now', 'localtime'), ?, ?, ?, ?, ?)
+    """, (
+        turno_id,
+        _etag(html),
+        _etag(html_admin),
+        zlib.compress(json.dumps(datos, separators=(",", ":")).encode()),
+        gzip.compress(html, mtime=0),
+        gzip.compress(html_admin, mtime=0)
+    ))
+    return datos
+
+
+def archivar_pendientes(db):
+    """
+    Archiva los turnos cerrados que no tienen reporte (los cerrados antes
+    de la migración 8), cada uno en su propia transacción.
+
+    Returns:
+        int: Turnos archivados
+    """
+    cursor = db.cursor()
+    cursor.execute("""
+        SELECT t.id FROM turnos t
+        WHERE t.estado = 'cerrado'
+          AND NOT EXISTS (SELECT 1 FROM reportes_turno r WHERE r.turno_id = t.id)
+        ORDER BY t.id
+    """)
+    pendientes = [fila[0] for fila in cursor.fetchall()]
+    for turno_id in pendientes:
+        archivar_reporte(cursor, turno_id)
+        db.commit()
+        print(f"[REPORTES] Turno {turno_id} archivado")
+    return len(pendientes)
+
+
+def _archivado(cursor, turno_id, columnas):
+    """Fila archivada del turno, o None si no está archivado"""
+    cursor.execute(f"SELECT {columnas} FROM reportes_turno WHERE turno_id = ?", (turno_id,))
+    return cursor.fetchone()
+
+
+def reporte_archivado(turno_id):
+    """Datos archivados de un turno cerrado, o None si no está archivado"""
+    cursor = get_db().cursor()
+    fila = _archivado(cursor, turno_id, "datos")
+    return json.loads(zlib.decompress(fila["datos"])) if fila else None
+
+
+def respuesta_reporte(turno_id, es_admin):
+    """
+    Respuesta HTTP con el reporte archivado: 304 si el navegador ya tiene
+    esa versión y, si acepta gzip, los bytes guardados tal cual. Cada
+    codificación lleva su propio ETag (son bytes distintos).
+
+    Returns:
+        Response, o None si el turno no está archivado
+    """
+    sufijo = "_admin" if es_admin else ""
+    cursor = get_db().cursor()
+    fila = _archivado(cursor, turno_id, f"etag{sufijo} AS etag")
+    if not fila:
+        return None
+
+    con_gzip = "gzip" in request.accept_encodings
+    etag = f"{fila['etag']}-gzip" if con_gzip else fila["etag"]
+    if request.if_none_match.contains(etag):
+        respuesta = make_response("", 304)
+    else:
+        cursor.execute(f"SELECT html{sufijo} AS html FROM reportes_turno WHERE turno_id = ?", (turno_id,))
+        html = cursor.fetchone()["html"]
+        if con_gzip:
+            respuesta = make_response(html)
+            respuesta.headers["Content-Encoding"] = "gzip"
+        else:
+            respuesta = make_response(gzip.decompress(html))
+        respuesta.mimetype = "text/html"
+
+    respuesta.set_etag(etag)
+    respuesta.headers["Cache-Control"] = "no-cache"
+    respuesta.vary.update(("Cookie", "Accept-Encoding"))
+    return respuesta
+
+
+def _main(db_path):
+    # El reporte se renderiza con las plantillas: hace falta la aplicación
+    os.environ["DATABASE_PATH"] = db_path
+    from app import app
+    with app.app_context():
+        print(f"[REPORTES] {archivar_pendientes(get_db())} turno(s) archivado(s)")
+
+
+if __name__ == "__main__":
+    _main(sys.argv[1] if len(sys.argv) > 1 else "database.db")
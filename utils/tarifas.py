@@ -0,0 +1,146 @@
+"""
+Motor de Tarifas
+================
+Calcula días reales, penalidad, total y saldo pendiente de muchas entradas
+en una sola pasada y con un único "ahora", para que la lista de autos, el
+cobro, las alertas y el historial muestren siempre las mismas cifras.
+
+Usa NumPy si está instalado; si no, la misma fórmula en Python puro.
+"""
+from datetime import datetime
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+_EPOCA = datetime(1970, 1, 1)
+_DIA = 86400.0
+
+
+def _segundos(momento):
+    """Segundos desde 1970 de un datetime local (sin zona horaria)"""
+    return (momento - _EPOCA).total_seconds()
+
+
+@lru_cache(maxsize=4096)
+def _medianoche(fecha):
+    """'YYYY-MM-DD' -> segundos; None si la fecha es inválida"""
+    try:
+        return _segundos(datetime.strptime(fecha, "%Y-%m-%d"))
+    except (TypeError, ValueError):
+        return None
+
+
+@lru_cache(maxsize=4096)
+def _salida_esperada(fecha, hora):
+    """'YYYY-MM-DD', 'HH:MM' -> segundos; None si falta o es inválida"""
+    if not fecha or not hora:
+        return None
+    try:
+        return _segundos(datetime.strptime(f"{fecha} {hora}", "%Y-%m-%d %H:%M"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _valor(fila, campo):
+    try:
+        return fila[campo]
+    except (KeyError, IndexError):
+        return None
+
+
+# ============================================
+# CÁLCULO POR LOTES
+# ============================================
+
+def calcular_cobros(entradas, tolerancia_minutos, ahora=None):
+    """
+    Calcula el cobro de varias entradas a la vez.
+
+    Args:
+        entradas: Filas (dict o sqlite3.Row) con fecha_entrada, fecha_hasta,
+                  hora_salida_esperada, precio_dia y adelanto
+        tolerancia_minutos: Minutos de gracia antes de cobrar penalidad
+        ahora: Momento de referencia (por defecto datetime.now())
+
+    Returns:
+        list: Un dict por entrada con dias_reales, penalidad, monto_dias,
+              monto_total y pendiente
+    """
+    if not entradas:
+        return []
+
+    ahora_s = _segundos(ahora or datetime.now())
+    tolerancia_s = int(tolerancia_minutos) * 60
+
+    entrada_s, salida_s, precios, adelantos = [], [], [], []
+    for e in entradas:
+        entrada_s.append(_medianoche(_valor(e, "fecha_entrada")))
+        salida_s.append(_salida_esperada(_valor(e, "fecha_hasta"), _valor(e, "hora_salida_esperada")))
+        precios.append(float(_valor(e, "precio_dia") or 0))
+        adelantos.append(float(_valor(e, "adelanto") or 0))
+
+    if np is not None:
+        return _calcular_numpy(ahora_s, tolerancia_s, entrada_s, salida_s, precios, adelantos)
+    return _calcular_python(ahora_s, tolerancia_s, entrada_s, salida_s, precios, adelantos)
+
+
+def _calcular_python(ahora_s, tolerancia_s, entrada_s, salida_s, precios, adelantos):
+    resultados = []
+    for entrada, salida, precio, adelanto in zip(entrada_s, salida_s, precios, adelantos):
+        dias = 1 if entrada is None else max(1, int((ahora_s - entrada) / _DIA + 0.5))
+
+        penalidad = 0
+        if salida is not None and ahora_s > salida + tolerancia_s:
+            horas_exceso = (ahora_s - salida - tolerancia_s) / 3600
+            penalidad = round(horas_exceso * (precio / 24), 2)
+
+        monto_dias = dias * precio
+        monto_total = monto_dias + penalidad
+        resultados.append({
+            "dias_reales": dias,
+            "penalidad": penalidad,
+            "monto_dias": monto_dias,
+            "monto_total": monto_total,
+            "pendiente": max(0, monto_total - adelanto),
+        })
+    return resultados
+
+
+def _calcular_numpy(ahora_s, tolerancia_s, entrada_s, salida_s, precios, adelantos):
+    entrada = np.array([np.nan if v is None else v for v in entrada_s])
+    salida = np.array([np.nan if v is None else v for v in salida_s])
+    precio = np.array(precios)
+    adelanto = np.array(adelantos)
+
+    dias = np.trunc((ahora_s - entrada) / _DIA + 0.5)
+    dias = np.where(np.isnan(dias), 1, np.maximum(1, dias)).astype(np.int64)
+
+    exceso = np.nan_to_num(ahora_s - salida - tolerancia_s, nan=0.0)
+    penalidad = np.where(exceso > 0, np.round(exceso / 3600 * (precio / 24), 2), 0.0)
+
+    monto_dias = dias * precio
+    monto_total = monto_dias + penalidad
+    pendiente = np.maximum(0, monto_total - adelanto)
+
+    return [
+        {
+            "dias_reales": int(d),
+            "penalidad": float(p),
+            "monto_dias": float(md),
+            "monto_total": float(mt),
+            "pendiente": float(pe),
+        }
+        for d, p, md, mt, pe in zip(dias, penalidad, monto_dias, monto_total, pendiente)
+    ]
+
+
+def calcular_dias_reales(fecha_entrada, ahora=None):
+    """Días cobrables desde `fecha_entrada` (mínimo 1)"""
+    entrada = _medianoche(fecha_entrada)
+    if entrada is None:
+        return 1
+    return max(1, int((_segundos(ahora or datetime.now()) - entrada) / _DIA + 0.5))